@@ -0,0 +1,220 @@
+"""
+Camada de renderização dos gráficos dos dashboards Streamlit.
+
+- reduz séries temporais à resolução da tela mantendo a forma (min/max por
+  balde de pixel ou LTTB), então o navegador recebe poucos milhares de pontos
+  mesmo com milhões no período
+- usa traces WebGL (Scattergl) quando a série é grande
+- atualiza os traces de uma figura existente em vez de recriá-la, com
+  `uirevision` fixo para o zoom/pan do usuário sobreviver aos refreshes
+"""
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+# ~2 pontos por pixel de um gráfico de largura comum
+DEFAULT_MAX_POINTS = 2000
+# A partir daqui o SVG fica lento e vale usar WebGL
+WEBGL_THRESHOLD = 1000
+
+QUALITY_COLORS = {"good": "green", "warning": "orange", "error": "red"}
+
+
+def _as_float(x) -> np.ndarray:
+    """Eixo x como float (datetime → ns), só para calcular baldes/áreas."""
+    arr = np.asarray(x)
+    if np.issubdtype(arr.dtype, np.datetime64):
+        return arr.astype("datetime64[ns]").astype(np.int64).astype(np.float64)
+    return arr.astype(np.float64)
+
+
+def _pixel_buckets(xf: np.ndarray, n_buckets: int) -> np.ndarray:
+    span = xf[-1] - xf[0]
+    if span <= 0:
+        return np.zeros(len(xf), dtype=np.int64)
+    return np.minimum(((xf - xf[0]) / span * n_buckets).astype(np.int64), n_buckets - 1)
+
+
+def minmax_indices(x, y, n_buckets: int) -> np.ndarray:
+    """
+    Índices do mínimo e do máximo de `y` em cada balde de largura igual em x
+    (x crescente), mais o primeiro e o último ponto. Preserva picos e vales,
+    que é o que o olho vê numa linha densa. O(n), vetorizado.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n <= 2 * n_buckets:
+        return np.arange(n)
+    bucket = _pixel_buckets(_as_float(x), n_buckets)
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    y_min = np.minimum.reduceat(y, starts)
+    y_max = np.maximum.reduceat(y, starts)
+    group = np.cumsum(np.r_[False, bucket[1:] != bucket[:-1]])
+    # Primeira ocorrência do mínimo/máximo de cada balde
+    _, first_min = np.unique(group[y == y_min[group]], return_index=True)
+    _, first_max = np.unique(group[y == y_max[group]], return_index=True)
+    idx_min = np.flatnonzero(y == y_min[group])[first_min]
+    idx_max = np.flatnonzero(y == y_max[group])[first_max]
+    return np.unique(np.concatenate([[0, n - 1], idx_min, idx_max]))
+
+
+def lttb_indices(x, y, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: escolhe em cada balde o ponto que forma o
+    maior triângulo com o ponto escolhido antes e a média do balde seguinte.
+    Mantém a forma da série com `n_out` pontos; laço só sobre os baldes.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    xf = _as_float(x)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    prev = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        nlo, nhi = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        if nhi <= nlo:
+            nhi = nlo + 1
+        avg_x, avg_y = xf[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((xf[prev] - avg_x) * (y[lo:hi] - y[prev]) - (xf[prev] - xf[lo:hi]) * (avg_y - y[prev]))
+        prev = lo + int(area.argmax())
+        out[i + 1] = prev
+    return out
+
+
+def category_indices(x, codes, n_buckets: int) -> np.ndarray:
+    """Um ponto por (balde de pixel, categoria): para faixas categóricas, pontos sobrepostos na tela somem."""
+    codes = np.asarray(codes)
+    n = len(codes)
+    if n <= n_buckets:
+        return np.arange(n)
+    n_cat = int(codes.max()) + 1 if n else 0
+    key = _pixel_buckets(_as_float(x), n_buckets) * n_cat + codes
+    # Primeiro índice de cada chave: na atribuição invertida, vence o menor índice
+    first = np.full(n_buckets * n_cat, -1, dtype=np.int64)
+    first[key[::-1]] = np.arange(n - 1, -1, -1)
+    return np.sort(first[first >= 0])
+
+
+def downsample(x, y, max_points: int = DEFAULT_MAX_POINTS, method: str = "minmax") -> np.ndarray:
+    """Índices a manter para desenhar (x, y) com no máximo ~`max_points` pontos."""
+    if len(y) <= max_points:
+        return np.arange(len(y))
+    if method == "lttb":
+        return lttb_indices(x, y, max_points)
+    if method == "minmax":
+        return minmax_indices(x, y, max(1, max_points // 2))
+    raise ValueError(f"Método de downsampling inválido: {method}. Use 'minmax' ou 'lttb'")
+
+
+def _scatter_cls(n: int):
+    return go.Scattergl if n > WEBGL_THRESHOLD else go.Scatter
+
+
+def line_trace(
+    x,
+    y,
+    name: str,
+    max_points: int = DEFAULT_MAX_POINTS,
+    method: str = "minmax",
+    n_total: Optional[int] = None,
+    **kwargs,
+):
+    """Linha reduzida à resolução da tela; WebGL quando a série original é grande."""
+    x, y = np.asarray(x), np.asarray(y)
+    idx = downsample(x, y, max_points, method)
+    cls = _scatter_cls(n_total if n_total is not None else len(y))
+    kwargs.setdefault("mode", "lines")
+    return cls(x=x[idx], y=y[idx], name=name, uid=name, **kwargs)
+
+
+def quality_marker_traces(x, y, quality, name: str, max_points: int = DEFAULT_MAX_POINTS) -> List:
+    """
+    Marcadores só para leituras fora de `good`, um trace por qualidade com cor
+    fixa (em vez de um array de cor por ponto na série inteira).
+    """
+    x, y, quality = np.asarray(x), np.asarray(y), np.asarray(quality).astype(str)
+    traces = []
+    for q, color in QUALITY_COLORS.items():
+        if q == "good":
+            continue
+        mask = quality == q
+        if not mask.any():
+            continue
+        xq, yq = x[mask], y[mask]
+        idx = downsample(xq, yq, max_points)
+        traces.append(
+            _scatter_cls(int(mask.sum()))(
+                x=xq[idx],
+                y=yq[idx],
+                mode="markers",
+                name=f"{name} ({q})",
+                uid=f"{name}-{q}",
+                marker=dict(color=color, size=7),
+                hovertemplate=f"%{{x}}<br>{name}: %{{y}}<br>Qualidade: {q}<extra></extra>",
+            )
+        )
+    return traces
+
+
+def category_traces(x, labels, order: Optional[Sequence[str]] = None, max_points: int = DEFAULT_MAX_POINTS, colors: Optional[Dict[str, str]] = None) -> List:
+    """Faixa categórica (ex.: severidade ao longo do tempo): um trace por categoria, sem `px` sobre strings."""
+    x = np.asarray(x)
+    codes, uniques = pd.factorize(pd.Series(labels), sort=True)
+    idx = category_indices(x, codes, max_points)
+    cls = _scatter_cls(len(codes))
+    x, codes = x[idx], codes[idx]
+    names = [str(u) for u in uniques]
+    if order is not None:
+        # Rótulos fora de `order` (ex.: critico+++ com k alto) vão ao fim, em ordem alfabética
+        order = [label for label in order if label in names] + [label for label in names if label not in order]
+    else:
+        order = names
+    traces = []
+    for label in order:
+        mask = codes == names.index(label)
+        marker = dict(color=colors[label]) if colors and label in colors else None
+        traces.append(cls(x=x[mask], y=np.full(int(mask.sum()), label, dtype=object), mode="markers", name=label, uid=label, marker=marker))
+    return traces
+
+
+def sync_figure(fig: Optional[go.Figure], traces: Sequence, uirevision: str, **layout) -> go.Figure:
+    """
+    Atualiza a figura no lugar: traces com o mesmo `uid` só trocam x/y, os novos
+    são anexados e os que sumiram são removidos; o layout é aplicado uma vez.
+    Com `uirevision` igual entre refreshes, o Plotly mantém zoom/pan e legenda.
+    """
+    if fig is None:
+        fig = go.Figure()
+        fig.update_layout(uirevision=uirevision, **layout)
+    wanted = {t.uid: t for t in traces}
+    fig.data = [t for t in fig.data if t.uid in wanted and type(t) is type(wanted[t.uid])]
+    existing = {t.uid: t for t in fig.data}
+    with fig.batch_update():
+        for uid, trace in wanted.items():
+            if uid in existing:
+                existing[uid].update(x=trace.x, y=trace.y)
+            else:
+                fig.add_trace(trace)
+        fig.layout.uirevision = uirevision
+    return fig
+
+
+def reduction_note(n_total: int, n_drawn: int) -> Optional[str]:
+    if n_drawn >= n_total:
+        return None
+    return f"{n_total:,} pontos no período; {n_drawn:,} desenhados (forma preservada)".replace(",", ".")
+
+
+def drawn_points(fig: go.Figure) -> int:
+    return int(sum(len(t.x) for t in fig.data if t.x is not None))
+
+
+def sorted_series(df, x_col: str, y_col: str):
+    """Linhas válidas ordenadas por x (o downsampling supõe x crescente)."""
+    return df.dropna(subset=[x_col, y_col]).sort_values(x_col)
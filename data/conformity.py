@@ -0,0 +1,149 @@
+"""
+Análises de não conformidade em uma passada, compartilhadas pelo dashboard
+(`data/dashboard.py`) e pelo servidor (`GET /analytics/conformity`).
+
+Entrada: linhas agregadas no formato de `GET /sensors/aggregate` (uma por
+bucket × tipo × dispositivo × qualidade, com n, soma, soma dos quadrados,
+mínimo, máximo e contagens abaixo/acima da faixa ideal). As linhas são
+reduzidas uma vez por (tipo, bucket, qualidade); totais por tipo, qualidade,
+séries e médias por hora saem desse resultado menor, sem refiltrar por tipo.
+"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Faixa ideal por tipo (fonte única: o servidor usa nos CASE do SQL, o dashboard nos alertas)
+IDEAL_RANGES: Dict[str, Tuple[float, float]] = {
+    "temperature": (18.0, 25.0),
+    "humidity": (30.0, 70.0),
+    "vibration": (0, 0),
+    "luminosity": (300, 3500),
+}
+
+SUM_COLS = ["n", "sum_value", "sumsq_value", "n_below", "n_above"]
+
+
+def _mean_std(g: pd.DataFrame) -> pd.DataFrame:
+    """Média e desvio padrão amostral a partir de n, soma e soma dos quadrados."""
+    n = g["n"].astype(float)
+    g["mean"] = g["sum_value"] / n
+    var = (g["sumsq_value"] - n * g["mean"] ** 2) / (n - 1)
+    g["std"] = np.sqrt(var.clip(lower=0)).where(n > 1)
+    return g
+
+
+@dataclass
+class ConformityReport:
+    """
+    Resultado compacto das análises de um período.
+
+    - `by_type`: por tipo (índice) n, mean, std, min, max, n_below, n_above, n_out
+      e n_events (soma dos valores: eventos para a vibração 0/1)
+    - `quality`: contagem por tipo (índice) × qualidade (colunas)
+    - `series`: média por (sensor_type, bucket_start); `series_quality` idem por qualidade
+    - `hourly`: n, soma e média por (sensor_type, hora)
+    - `pairs`: temperatura × umidade médias no mesmo (bucket_start, device_name)
+    """
+
+    ranges: Dict[str, Tuple[float, float]]
+    by_type: pd.DataFrame
+    quality: pd.DataFrame
+    series: pd.DataFrame
+    series_quality: pd.DataFrame
+    hourly: pd.DataFrame
+    pairs: pd.DataFrame
+    devices: List[str] = field(default_factory=list)
+
+    @property
+    def total(self) -> int:
+        return int(self.by_type["n"].sum()) if not self.by_type.empty else 0
+
+    @property
+    def quality_totals(self) -> Dict[str, int]:
+        return {q: int(v) for q, v in self.quality.sum().items()}
+
+    def out_of_range(self, sensor_type: str):
+        """Leituras fora da faixa ideal do tipo, ou None se o tipo não aparece no período."""
+        if sensor_type not in self.by_type.index:
+            return None
+        return int(self.by_type.at[sensor_type, "n_out"])
+
+    def events(self, sensor_type: str) -> int:
+        if sensor_type not in self.by_type.index:
+            return 0
+        return int(round(self.by_type.at[sensor_type, "n_events"]))
+
+    def of(self, frame: str, sensor_type: str) -> pd.DataFrame:
+        """Fatia de `series`/`series_quality`/`hourly` de um tipo."""
+        df = getattr(self, frame)
+        return df[df["sensor_type"] == sensor_type]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Versão JSON (NaN → None) para a API."""
+        def records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+            out = df.copy()
+            for col in out.columns:
+                if pd.api.types.is_datetime64_any_dtype(out[col]):
+                    out[col] = out[col].dt.strftime("%Y-%m-%dT%H:%M:%S")
+            return out.astype(object).where(out.notna(), None).to_dict("records")
+
+        by_type = self.by_type.reset_index()
+        return {
+            "ranges": {t: list(r) for t, r in self.ranges.items()},
+            "total": self.total,
+            "quality": self.quality_totals,
+            "devices": self.devices,
+            "by_type": records(by_type),
+            "quality_by_type": {t: {q: int(v) for q, v in row.items()} for t, row in self.quality.iterrows()},
+            "hourly": records(self.hourly[["sensor_type", "hora", "n", "mean"]]),
+        }
+
+
+def build_report(agg: pd.DataFrame, ranges: Dict[str, Tuple[float, float]] = IDEAL_RANGES) -> ConformityReport:
+    """Monta o relatório a partir das linhas de `/sensors/aggregate` (`bucket_start` já como datetime)."""
+    if agg.empty:
+        def empty(*cols):
+            return pd.DataFrame(columns=list(cols))
+        return ConformityReport(
+            dict(ranges),
+            empty("n", "mean", "std", "min", "max", "n_below", "n_above", "n_out", "n_events"),
+            empty(),
+            empty("sensor_type", "bucket_start", "n", "sum_value", "mean"),
+            empty("sensor_type", "bucket_start", "quality", "n", "mean"),
+            empty("sensor_type", "hora", "n", "sum_value", "mean"),
+            empty("bucket_start", "device_name", "temperature", "humidity"),
+        )
+
+    # Única passada sobre as linhas de entrada (os dispositivos se somam)
+    base = agg.groupby(["sensor_type", "bucket_start", "quality"], sort=True, observed=True).agg(
+        **{c: (c, "sum") for c in SUM_COLS}, min_value=("min_value", "min"), max_value=("max_value", "max")
+    ).reset_index()
+
+    by_type = _mean_std(
+        base.groupby("sensor_type").agg(**{c: (c, "sum") for c in SUM_COLS}, min=("min_value", "min"), max=("max_value", "max"))
+    )
+    by_type["n_out"] = by_type["n_below"] + by_type["n_above"]
+    by_type["n_events"] = by_type["sum_value"]
+    by_type = by_type[["n", "mean", "std", "min", "max", "n_below", "n_above", "n_out", "n_events"]]
+
+    quality = base.pivot_table(index="sensor_type", columns="quality", values="n", aggfunc="sum", fill_value=0)
+    quality.columns.name = None
+
+    series_quality = base[["sensor_type", "bucket_start", "quality", "n"]].assign(mean=base["sum_value"] / base["n"])
+    series = base.groupby(["sensor_type", "bucket_start"], as_index=False)[["n", "sum_value"]].sum()
+    series["mean"] = series["sum_value"] / series["n"]
+
+    hourly = series.assign(hora=series["bucket_start"].dt.floor("h")).groupby(["sensor_type", "hora"], as_index=False)[["n", "sum_value"]].sum()
+    hourly["mean"] = hourly["sum_value"] / hourly["n"]
+
+    # Temperatura × umidade: médias no mesmo bucket/dispositivo, alinhadas por unstack (sem interseção de conjuntos)
+    th = agg[agg["sensor_type"].isin(["temperature", "humidity"])]
+    pairs = th.groupby(["bucket_start", "device_name", "sensor_type"])[["n", "sum_value"]].sum()
+    pairs = (pairs["sum_value"] / pairs["n"]).unstack("sensor_type")
+    pairs = pairs.reindex(columns=["temperature", "humidity"]).dropna().reset_index()
+    pairs.columns.name = None
+
+    devices = sorted(agg["device_name"].dropna().unique().tolist()) if "device_name" in agg.columns else []
+    return ConformityReport(dict(ranges), by_type, quality, series, series_quality, hourly, pairs, devices)
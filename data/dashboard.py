@@ -1,8 +1,24 @@
+import os
+
 import streamlit as st
 import pandas as pd
 import requests
 import plotly.express as px
 from datetime import datetime, timedelta
+from requests.adapters import HTTPAdapter
+
+from chart_render import (
+    QUALITY_COLORS,
+    WEBGL_THRESHOLD,
+    drawn_points,
+    line_trace,
+    quality_marker_traces,
+    reduction_note,
+    sorted_series,
+    sync_figure,
+)
+from conformity import IDEAL_RANGES, build_report
+from shared_cache import SharedCache
 
 st.set_page_config(page_title="Dashboard IoT - Sensores", layout="wide")
 
@@ -19,110 +35,208 @@ Acompanhe em tempo real as medições dos sensores conectados ao seu **ESP32**:
 **Dados armazenados automaticamente no Oracle Database com triggers automáticos!**
 """)
 
-API_URL = "http://localhost:8000/sensors?limit=1000"
+API_BASE = os.environ.get("SENSOR_API_URL", "http://localhost:8000").rstrip("/")
+API_TIMEOUT = 10
+
+# Período → (janela, bucket em segundos, TTL do cache em segundos). O filtro vai
+# para a API, que devolve um agregado por bucket: o tamanho da resposta depende
+# do período, não do número de leituras. O TTL acompanha o bucket (o único
+# bucket que ainda muda é o corrente), limitado para "Tudo" não ficar parado;
+# ingestão nova não recarrega o agregado antes do TTL (ver `fetch_aggregate`).
+PERIODOS = {
+    "Última hora": (timedelta(hours=1), 10, 10),
+    "Últimas 24h": (timedelta(hours=24), 60, 60),
+    "Tudo": (None, 3600, 300),
+}
+SENSOR_TYPES = ["temperature", "humidity", "vibration", "luminosity"]
+# Cache compartilhado: a marca d'água de ingestão é consultada no máximo a cada
+# WATERMARK_INTERVAL s (por processo); depois do TTL ou de ingestão nova (a
+# partir de `min_refresh` de idade) o valor antigo ainda é servido por
+# max(STALE_MIN, ttl * STALE_FACTOR) s enquanto recarrega
+WATERMARK_INTERVAL = float(os.environ.get("SENSOR_CACHE_WATERMARK_S", "2"))
+STALE_MIN = 30
+STALE_FACTOR = 5
+
+
+@st.cache_resource
+def get_session():
+    """Sessão HTTP compartilhada: conexões keep-alive reaproveitadas e respostas gzip."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=2)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Accept-Encoding": "gzip"})
+    return session
+
+
+def api_get(path, params=None):
+    resp = get_session().get(f"{API_BASE}{path}", params=params, timeout=API_TIMEOUT)
+    resp.raise_for_status()
+    return resp.json()["data"]
+
+
+def filtros_api(since, device, types):
+    params = {}
+    if since is not None:
+        params["since"] = since.isoformat()
+    if device != "Todos":
+        params["device_name"] = device
+    if types and set(types) != set(SENSOR_TYPES):
+        params["sensor_type"] = ",".join(types)
+    return params
+
+
+@st.cache_resource
+def get_shared_cache():
+    """Um cache por processo, compartilhado por todas as sessões (ver shared_cache.py)."""
+    return SharedCache(max_entries=64, watermark_interval=WATERMARK_INTERVAL)
+
 
-@st.cache_data(ttl=10)
-def get_sensor_data():
+def cached(key, loader, ttl, min_refresh=0.0):
+    """
+    Lê do cache compartilhado: chamadas iguais de várias sessões viram uma só, e
+    depois do TTL (ou de ingestão nova, se a entrada tem ao menos `min_refresh` s)
+    o valor anterior é servido enquanto recarrega. O valor é o mesmo objeto para
+    todas as sessões: não modificar.
+    """
+    cache = get_shared_cache()
+    cache.poll_watermark(lambda: get_session().get(f"{API_BASE}/sensors/watermark", timeout=API_TIMEOUT).json()["reading_id"])
+    return cache.get(key, loader, ttl=ttl, stale_ttl=max(STALE_MIN, ttl * STALE_FACTOR), min_refresh=min_refresh)
+
+
+def get_devices():
+    def load():
+        return sorted(d["device_name"] for d in api_get("/devices"))
     try:
-        resp = requests.get(API_URL)
-        resp.raise_for_status()
-        data = resp.json()["data"]
-        df = pd.DataFrame(data)
-        for col in ["timestamp", "created_at"]:
-            if col in df.columns:
-                df[col] = pd.to_datetime(df[col], errors="coerce")
+        # Leitura nova raramente traz dispositivo novo: só o TTL recarrega
+        return cached(("devices",), load, ttl=300, min_refresh=300)
+    except Exception:
+        return []
+
+
+def inicio_janela(janela):
+    """Início do período no momento da carga (None = todo o histórico)."""
+    return datetime.now() - janela if janela is not None else None
+
+
+def fetch_aggregate(janela, device, types, bucket, ttl):
+    """
+    Agregado por (bucket, tipo, dispositivo, qualidade) e o relatório de
+    conformidade dele. A chave do cache é só o filtro (o início da janela é
+    calculado na carga), então a expiração do TTL passa pelo caminho
+    stale-while-revalidate. Ingestão nova só recarrega depois de `ttl` s: com o
+    ESP32 enviando a cada poucos segundos, o GROUP BY do histórico inteiro
+    rodaria a cada consulta da marca d'água.
+    """
+    def load():
+        params = filtros_api(inicio_janela(janela), device, types)
+        params["bucket"] = bucket
+        agg = pd.DataFrame(api_get("/sensors/aggregate", params))
+        if not agg.empty:
+            agg["bucket_start"] = pd.to_datetime(agg["bucket_start"], errors="coerce")
+        # Análises calculadas uma vez por carga e compartilhadas com as outras sessões
+        return agg, build_report(agg, IDEAL_RANGES)
+    return cached(("aggregate", janela, device, types, bucket), load, ttl, min_refresh=ttl)
+
+
+def fetch_recent(janela, device, types, limit=200):
+    """Leituras brutas mais recentes (últimos valores e tabela "Dados Recentes"); recarrega a cada ingestão."""
+    def load():
+        params = filtros_api(inicio_janela(janela), device, types)
+        params["limit"] = limit
+        df = pd.DataFrame(api_get("/sensors", params))
+        if "timestamp" in df.columns:
+            df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce")
         return df
-    except Exception as e:
-        st.error(f"Erro ao buscar dados: {e}")
-        return pd.DataFrame()
+    return cached(("recent", janela, device, types, limit), load, ttl=10)
 
-df = get_sensor_data()
 
-# ====== Análises e Alertas de Não Conformidade ======
-st.subheader("Análises e Alertas de Não Conformidade")
-if not df.empty:
-    # Verificar qualidade dos dados
-    quality_counts = df['quality'].value_counts()
-    if 'error' in quality_counts:
-        st.error(f"🚨 {quality_counts['error']} registros com qualidade 'error'!")
-    if 'warning' in quality_counts:
-        st.warning(f"⚠️ {quality_counts['warning']} registros com qualidade 'warning'!")
-    
-    # Umidade fora da faixa ideal (30-70%)
-    df_hum = df[df["sensor_type"] == "humidity"]
-    if not df_hum.empty:
-        hum_out = df_hum[(df_hum["sensor_value"] < 30) | (df_hum["sensor_value"] > 70)]
-        if not hum_out.empty:
-            st.error(f"⚠️ {len(hum_out)} registros de umidade fora da faixa ideal (30-70%)!")
-        else:
-            st.success("✅ Todos os valores de umidade estão dentro da faixa ideal.")
-            
-    # Temperatura fora da faixa ideal (18-25°C)
-    df_temp = df[df["sensor_type"] == "temperature"]
-    if not df_temp.empty:
-        temp_out = df_temp[(df_temp["sensor_value"] < 18) | (df_temp["sensor_value"] > 25)]
-        if not temp_out.empty:
-            st.warning(f"⚠️ {len(temp_out)} registros de temperatura fora da faixa ideal (18-25°C)!")
-        else:
-            st.success("✅ Todos os valores de temperatura estão dentro da faixa ideal.")
-            
-    # Luminosidade fora da faixa recomendada (300-3500)
-    df_lux = df[df["sensor_type"] == "luminosity"]
-    if not df_lux.empty:
-        lux_out = df_lux[(df_lux["sensor_value"] < 300) | (df_lux["sensor_value"] > 3500)]
-        if not lux_out.empty:
-            st.warning(f"⚠️ {len(lux_out)} registros de luminosidade fora da faixa recomendada (300-3500)!")
-        else:
-            st.info("ℹ️ Luminosidade dentro da faixa recomendada.")
-            
-    # Vibração detectada
-    df_vib = df[(df["sensor_type"] == "vibration") & (df["sensor_value"] == 1)]
-    if not df_vib.empty:
-        st.error(f"🚨 {len(df_vib)} eventos de vibração detectados!")
-    else:
-        st.success("✅ Nenhum evento de vibração detectado.")
-
-# Filtros expandidos
-col1, col2 = st.columns(2)
+def faixa(sensor_type, unidade=""):
+    low, high = report.ranges[sensor_type]
+    return f"{low:g}-{high:g}{unidade}"
+
+
+# Filtros expandidos (vão para a consulta na API)
+alertas = st.container()
+col1, col2, col3 = st.columns(3)
 with col1:
-    periodo = st.selectbox("Período", ["Última hora", "Últimas 24h", "Tudo"])
+    periodo = st.selectbox("Período", list(PERIODOS))
 with col2:
-    if not df.empty and "device_name" in df.columns:
-        devices = ["Todos"] + sorted(df["device_name"].unique().tolist())
-        device_filter = st.selectbox("Dispositivo", devices)
-    else:
-        device_filter = "Todos"
-
-if not df.empty:
-    agora = datetime.now()
-    if periodo == "Última hora":
-        df = df[df["timestamp"] >= agora - timedelta(hours=1)]
-    elif periodo == "Últimas 24h":
-        df = df[df["timestamp"] >= agora - timedelta(hours=24)]
-    
-    # Aplicar filtro de dispositivo
-    if device_filter != "Todos":
-        df = df[df["device_name"] == device_filter]
-
-    # Cards de métricas rápidas
+    device_filter = st.selectbox("Dispositivo", ["Todos"] + get_devices())
+with col3:
+    tipos = tuple(st.multiselect("Sensores", SENSOR_TYPES, default=SENSOR_TYPES))
+
+janela, bucket, ttl = PERIODOS[periodo]
+
+try:
+    agg, report = fetch_aggregate(janela, device_filter, tipos, bucket, ttl)
+    df = fetch_recent(janela, device_filter, tipos)
+except Exception as e:
+    st.error(f"Erro ao buscar dados: {e}")
+    agg, df = pd.DataFrame(), pd.DataFrame()
+    report = build_report(agg, IDEAL_RANGES)
+
+# ====== Análises e Alertas de Não Conformidade ======
+with alertas:
+    st.subheader("Análises e Alertas de Não Conformidade")
+    if not agg.empty:
+        # Verificar qualidade dos dados
+        quality_counts = report.quality_totals
+        if quality_counts.get("error", 0):
+            st.error(f"🚨 {quality_counts['error']} registros com qualidade 'error'!")
+        if quality_counts.get("warning", 0):
+            st.warning(f"⚠️ {quality_counts['warning']} registros com qualidade 'warning'!")
+
+        # Umidade fora da faixa ideal
+        fora = report.out_of_range("humidity")
+        if fora is not None:
+            if fora:
+                st.error(f"⚠️ {fora} registros de umidade fora da faixa ideal ({faixa('humidity', '%')})!")
+            else:
+                st.success("✅ Todos os valores de umidade estão dentro da faixa ideal.")
+
+        # Temperatura fora da faixa ideal
+        fora = report.out_of_range("temperature")
+        if fora is not None:
+            if fora:
+                st.warning(f"⚠️ {fora} registros de temperatura fora da faixa ideal ({faixa('temperature', '°C')})!")
+            else:
+                st.success("✅ Todos os valores de temperatura estão dentro da faixa ideal.")
+
+        # Luminosidade fora da faixa recomendada
+        fora = report.out_of_range("luminosity")
+        if fora is not None:
+            if fora:
+                st.warning(f"⚠️ {fora} registros de luminosidade fora da faixa recomendada ({faixa('luminosity')})!")
+            else:
+                st.info("ℹ️ Luminosidade dentro da faixa recomendada.")
+
+        # Vibração detectada (leituras 0/1: a soma é o número de eventos)
+        eventos_vib = report.events("vibration")
+        if eventos_vib:
+            st.error(f"🚨 {eventos_vib} eventos de vibração detectados!")
+        else:
+            st.success("✅ Nenhum evento de vibração detectado.")
+
+if not agg.empty:
+    # Cards de métricas rápidas: última leitura de cada tipo num único agrupamento
+    ultimos = df.sort_values("timestamp").groupby("sensor_type").tail(1).set_index("sensor_type") if not df.empty else pd.DataFrame()
+
     def get_last_value(sensor_type):
-        d = df[df["sensor_type"] == sensor_type]
-        if not d.empty:
-            last_row = d.sort_values("timestamp").iloc[-1]
+        if sensor_type in ultimos.index:
+            last_row = ultimos.loc[sensor_type]
             return last_row["sensor_value"], last_row.get("quality", "unknown")
         return "-", "unknown"
 
     def get_device_info():
-        if not df.empty and "device_name" in df.columns:
-            devices = df["device_name"].unique()
-            return f"{len(devices)} dispositivo(s): {', '.join(devices[:3])}{'...' if len(devices) > 3 else ''}"
-        return "Dispositivo não identificado"
+        devices = report.devices
+        return f"{len(devices)} dispositivo(s): {', '.join(devices[:3])}{'...' if len(devices) > 3 else ''}"
 
     col1, col2 = st.columns(2)
     with col1:
         st.metric("Dispositivo", get_device_info())
     with col2:
-        total_readings = len(df) if not df.empty else 0
+        total_readings = report.total
         st.metric("Total de Leituras", f"{total_readings}")
 
     col1, col2, col3, col4 = st.columns(4)
@@ -147,43 +261,51 @@ if not df.empty:
 
     with tab1:
         st.subheader("Temperatura e Umidade ao longo do tempo")
-        df_temp = df[df["sensor_type"] == "temperature"]
-        df_hum = df[df["sensor_type"] == "humidity"]
-        fig = px.line()
-        
-        # Adicionar cores baseadas na qualidade
-        quality_colors = {"good": "green", "warning": "orange", "error": "red"}
-        
-        if not df_temp.empty:
-            # Criar coluna de cor baseada na qualidade
-            df_temp["color"] = df_temp["quality"].map(quality_colors).fillna("blue")
-            fig.add_scatter(x=df_temp["timestamp"], y=df_temp["sensor_value"], 
-                           mode="lines+markers", name="Temperatura", 
-                           marker=dict(color=df_temp["color"]),
-                           hovertemplate="%{x}<br>Temperatura: %{y}°C<br>Qualidade: %{customdata}<extra></extra>",
-                           customdata=df_temp["quality"])
-                           
-        if not df_hum.empty:
-            df_hum["color"] = df_hum["quality"].map(quality_colors).fillna("blue")
-            fig.add_scatter(x=df_hum["timestamp"], y=df_hum["sensor_value"], 
-                           mode="lines+markers", name="Umidade",
-                           marker=dict(color=df_hum["color"]),
-                           hovertemplate="%{x}<br>Umidade: %{y}%<br>Qualidade: %{customdata}<extra></extra>",
-                           customdata=df_hum["quality"])
-                           
-        fig.update_layout(xaxis_title="Data/Hora", yaxis_title="Valor", legend_title="Sensor")
-        st.plotly_chart(fig, use_container_width=True)
+        st.caption(f"Média por intervalo de {bucket} s")
+        # Média por bucket reduzida à resolução da tela; buckets com qualidade != good como marcadores à parte
+        traces = []
+        n_total = 0
+        for sensor_type, name, unit in (("temperature", "Temperatura", "°C"), ("humidity", "Umidade", "%")):
+            d = sorted_series(report.of("series", sensor_type), "bucket_start", "mean")
+            if d.empty:
+                continue
+            x, y = d["bucket_start"].to_numpy(), d["mean"].to_numpy()
+            n_total += len(d)
+            small = len(x) <= WEBGL_THRESHOLD
+            traces.append(
+                line_trace(
+                    x, y, name,
+                    mode="lines+markers" if small else "lines",
+                    marker=dict(color=QUALITY_COLORS["good"]) if small else None,
+                    hovertemplate=f"%{{x}}<br>{name}: %{{y:.2f}}{unit}<extra></extra>",
+                )
+            )
+            dq = sorted_series(report.of("series_quality", sensor_type), "bucket_start", "mean")
+            traces.extend(quality_marker_traces(dq["bucket_start"], dq["mean"], dq["quality"], name))
+
+        # Figura guardada na sessão e atualizada no lugar; uirevision muda só quando os filtros mudam
+        fig = sync_figure(
+            st.session_state.get("fig_temp_hum"),
+            traces,
+            uirevision=f"{periodo}|{device_filter}|{','.join(tipos)}",
+            xaxis_title="Data/Hora",
+            yaxis_title="Valor",
+            legend_title="Sensor",
+        )
+        st.session_state["fig_temp_hum"] = fig
+        note = reduction_note(n_total, drawn_points(fig))
+        if note:
+            st.caption(note)
+        st.plotly_chart(fig, use_container_width=True, key="temp-hum")
 
     with tab2:
         st.subheader("Luminosidade por Hora")
-        df_lux = df[df["sensor_type"] == "luminosity"].copy()
-        if not df_lux.empty:
-            df_lux["hora"] = df_lux["timestamp"].dt.floor("H")
-            df_lux_group = df_lux.groupby("hora")["sensor_value"].mean().reset_index()
-            fig2 = px.bar(df_lux_group, x="hora", y="sensor_value", 
-                     labels={"hora": "Hora", "sensor_value": "Luminosidade Média"}, 
+        df_lux_group = report.of("hourly", "luminosity")
+        if not df_lux_group.empty:
+            fig2 = px.bar(df_lux_group, x="hora", y="mean", 
+                     labels={"hora": "Hora", "mean": "Luminosidade Média"}, 
                      title="Luminosidade Média por Hora", 
-                     color="sensor_value", color_continuous_scale="YlOrBr")
+                     color="mean", color_continuous_scale="YlOrBr")
             fig2.update_traces(hovertemplate="Hora: %{x}<br>Luminosidade: %{y:.0f}<extra></extra>")
             st.plotly_chart(fig2, use_container_width=True)
         else:
@@ -191,41 +313,28 @@ if not df.empty:
 
     with tab3:
         st.subheader("Dispersão: Temperatura vs. Umidade")
-        df_temp = df[df["sensor_type"] == "temperature"]
-        df_hum = df[df["sensor_type"] == "humidity"]
-        
-        if not df_temp.empty and not df_hum.empty:
-            # Pegar timestamps comuns para alinhar os dados
-            temp_times = set(df_temp["timestamp"])
-            hum_times = set(df_hum["timestamp"])
-            common_times = temp_times & hum_times
+        if {"temperature", "humidity"} <= set(report.by_type.index):
+            # Médias do mesmo bucket e dispositivo, já alinhadas no relatório
+            df_disp = report.pairs
             
-            if common_times:
-                df_temp_common = df_temp[df_temp["timestamp"].isin(common_times)].copy()
-                df_hum_common = df_hum[df_hum["timestamp"].isin(common_times)].copy()
-                
-                # Merge dos dados
-                df_disp = pd.merge(df_temp_common[["timestamp", "sensor_value"]], 
-                                 df_hum_common[["timestamp", "sensor_value"]], 
-                                 on="timestamp", suffixes=("_temp", "_hum"))
-                
-                fig3 = px.scatter(df_disp, x="sensor_value_temp", y="sensor_value_hum", 
+            if not df_disp.empty:
+                fig3 = px.scatter(df_disp, x="temperature", y="humidity", 
                                 title="Dispersão: Temperatura vs. Umidade", 
-                                labels={"sensor_value_temp": "Temperatura (°C)", "sensor_value_hum": "Umidade (%)"}, 
-                                color="sensor_value_temp", color_continuous_scale="RdBu")
-                fig3.update_traces(hovertemplate="Temperatura: %{x}°C<br>Umidade: %{y}%<extra></extra>")
+                                labels={"temperature": "Temperatura (°C)", "humidity": "Umidade (%)"}, 
+                                color="temperature", color_continuous_scale="RdBu")
+                fig3.update_traces(hovertemplate="Temperatura: %{x:.2f}°C<br>Umidade: %{y:.2f}%<extra></extra>")
                 st.plotly_chart(fig3, use_container_width=True)
             else:
-                st.info("Nenhum timestamp comum encontrado para dispersão.")
+                st.info("Nenhum intervalo comum encontrado para dispersão.")
         else:
             st.info("Dados insuficientes para dispersão.")
 
     with tab4:
         st.subheader("Eventos de Vibração por Hora")
-        df_vib = df[(df["sensor_type"] == "vibration") & (df["sensor_value"] == 1)].copy()
+        df_vib = report.of("hourly", "vibration")
+        df_vib = df_vib[df_vib["sum_value"] > 0] if not df_vib.empty else df_vib
         if not df_vib.empty:
-            df_vib["hora"] = df_vib["timestamp"].dt.floor("H")
-            df_vib_group = df_vib.groupby("hora").size().reset_index(name="eventos_vibracao")
+            df_vib_group = df_vib.assign(eventos_vibracao=df_vib["sum_value"].round().astype(int))
             fig4 = px.bar(df_vib_group, x="hora", y="eventos_vibracao", 
                          labels={"hora": "Hora", "eventos_vibracao": "Eventos de Vibração"}, 
                          title="Contagem de Eventos de Vibração por Hora", 
@@ -240,28 +349,32 @@ if not df.empty:
     # Selecionar colunas mais relevantes para exibição
     display_cols = ["timestamp", "device_name", "sensor_name", "sensor_type", "sensor_value", "quality"]
     available_cols = [col for col in display_cols if col in df.columns]
-    st.dataframe(df[available_cols].sort_values("timestamp", ascending=False).head(20), use_container_width=True)
+    if available_cols:
+        st.dataframe(df[available_cols].sort_values("timestamp", ascending=False).head(20), use_container_width=True)
 
     # ====== Relatório e Exportação ======
     st.divider()
     st.subheader("Relatório e Exportação")
-    # Download dos dados em CSV
-    csv = df.to_csv(index=False).encode('utf-8')
+    # Download do agregado do período em CSV
+    csv = agg.to_csv(index=False).encode('utf-8')
     st.download_button(
-        label="Baixar dados em CSV",
+        label="Baixar dados agregados em CSV",
         data=csv,
-        file_name='dados_sensores.csv',
+        file_name='dados_sensores_agregados.csv',
         mime='text/csv',
     )
     # Resumo estatístico
     st.write("Resumo estatístico por tipo de sensor:")
-    stats_df = df.groupby("sensor_type")["sensor_value"].describe()
-    st.dataframe(stats_df, use_container_width=True)
+    st.dataframe(report.by_type[["n", "mean", "std", "min", "max"]].rename(columns={"n": "count"}), use_container_width=True)
 
     # Adicionar estatísticas de qualidade
-    if "quality" in df.columns:
-        st.write("Distribuição de Qualidade por Sensor:")
-        quality_stats = df.groupby(["sensor_type", "quality"]).size().reset_index(name="count")
-        st.dataframe(quality_stats.pivot(index="sensor_type", columns="quality", values="count").fillna(0), use_container_width=True)
+    st.write("Distribuição de Qualidade por Sensor:")
+    st.dataframe(report.quality, use_container_width=True)
 else:
-    st.warning("Nenhum dado encontrado.") 
\ No newline at end of file
+    st.warning("Nenhum dado encontrado.")
+
+cache_stats = get_shared_cache().stats
+st.caption(
+    f"Cache compartilhado: {cache_stats['hit']} acertos, {cache_stats['stale']} servidos enquanto recarregam, "
+    f"{cache_stats['coalesced']} coalescidos, {cache_stats['load']} consultas à API"
+)
@@ -0,0 +1,158 @@
+"""
+Cache compartilhado entre as sessões do dashboard (um por processo Streamlit).
+
+- coalescência (single-flight): N sessões pedindo a mesma chave ao mesmo tempo
+  geram uma única chamada à API; as demais esperam o resultado
+- stale-while-revalidate: depois do TTL a entrada ainda é servida por
+  `stale_ttl` segundos enquanto uma thread em segundo plano a recarrega
+- invalidação por ingestão: uma marca d'água (maior `reading_id` gravado) é
+  consultada no máximo a cada `watermark_interval`; quando avança, as entradas
+  passam a "velhas" e são recarregadas no próximo acesso, sem bloquear. Cada
+  chave pode limitar essas recargas com `min_refresh` (idade mínima para a
+  invalidação valer), para consultas caras não rodarem a cada ingestão
+
+Assim a carga na API/banco depende das chaves em uso e da taxa de ingestão,
+não do número de pessoas olhando o painel.
+"""
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+@dataclass
+class _Entry:
+    value: Any
+    loaded_at: float
+    generation: int
+
+
+class SharedCache:
+    """
+    Cache LRU thread-safe com single-flight e stale-while-revalidate.
+
+    `get(key, loader, ttl, stale_ttl, min_refresh)`:
+    - fresca (idade < ttl e, se houve ingestão nova, idade < min_refresh): devolve direto
+    - velha (expirada ou invalidada, idade < ttl + stale_ttl): devolve e agenda
+      uma recarga em segundo plano (uma por chave)
+    - ausente ou velha demais: quem chega primeiro chama `loader()`, os outros
+      esperam o mesmo resultado (ou a mesma exceção)
+    """
+
+    def __init__(self, max_entries: int = 128, max_workers: int = 2, watermark_interval: float = 2.0) -> None:
+        self.max_entries = max_entries
+        self.watermark_interval = watermark_interval
+        self.generation = 0
+        self.watermark: Any = None
+        self.stats: Counter = Counter()
+        self.last_error: Optional[str] = None
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._inflight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="shared-cache")
+        self._watermark_checked = 0.0
+        self._watermark_checking = False
+
+    def get(
+        self,
+        key: Hashable,
+        loader: Callable[[], Any],
+        ttl: float,
+        stale_ttl: float = 0.0,
+        min_refresh: float = 0.0,
+        timeout: Optional[float] = 30.0,
+    ) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry.loaded_at
+                if age < ttl and (entry.generation == self.generation or age < min_refresh):
+                    self._entries.move_to_end(key)
+                    self.stats["hit"] += 1
+                    return entry.value
+                if age < ttl + stale_ttl:
+                    self._entries.move_to_end(key)
+                    self.stats["stale"] += 1
+                    if key not in self._inflight:
+                        self._inflight[key] = self._executor.submit(self._load, key, loader)
+                    return entry.value
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+                self.stats["miss"] += 1
+            else:
+                self.stats["coalesced"] += 1
+
+        if leader:
+            try:
+                future.set_result(self._load(key, loader))
+            except BaseException as exc:
+                future.set_exception(exc)
+        return future.result(timeout=timeout)
+
+    def _load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        generation = self.generation
+        try:
+            value = loader()
+        except Exception as exc:
+            self.last_error = f"{type(exc).__name__}: {exc}"
+            self.stats["error"] += 1
+            with self._lock:
+                self._inflight.pop(key, None)
+            # Em segundo plano a entrada velha continua servida e a próxima leitura tenta de novo
+            raise
+        with self._lock:
+            self._entries[key] = _Entry(value, time.monotonic(), generation)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._inflight.pop(key, None)
+            self.stats["load"] += 1
+        return value
+
+    def invalidate(self) -> None:
+        """Marca as entradas como velhas (as com idade < `min_refresh` seguem frescas; todas servíveis dentro de `stale_ttl`)."""
+        with self._lock:
+            self.generation += 1
+            self.stats["invalidate"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+
+    def poll_watermark(self, fetch: Callable[[], Any]) -> Any:
+        """
+        Consulta a marca d'água de ingestão no máximo a cada `watermark_interval`
+        (uma chamada por processo, quem chega durante a consulta não espera) e
+        invalida o cache quando ela muda. Falha na consulta não invalida nada.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._watermark_checking or now - self._watermark_checked < self.watermark_interval:
+                return self.watermark
+            self._watermark_checking = True
+        try:
+            value = fetch()
+        except Exception as exc:
+            self.last_error = f"{type(exc).__name__}: {exc}"
+            self.stats["error"] += 1
+            value = self.watermark
+        finally:
+            with self._lock:
+                self._watermark_checking = False
+                self._watermark_checked = time.monotonic()
+        if value != self.watermark:
+            changed = self.watermark is not None
+            self.watermark = value
+            if changed:
+                self.invalidate()
+        return value
+
+    def __len__(self) -> int:
+        return len(self._entries)
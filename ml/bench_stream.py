@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from log_writer import PredictionLogWriter
+from stream_pipeline import OVERFLOW_POLICIES, ScoredReading, StreamPipeline
+from compiled_model import load_scorer
+from stream_serial_predict import make_batch_scorer
+from stream_sources import FakeSerialDevice, MultiSourceReader, ReplaySource, SerialSource
+
+
+def latency_percentiles(latencies: List[float]) -> Dict[str, float]:
+    if not latencies:
+        return {}
+    arr = np.asarray(latencies) * 1000.0
+    return {
+        "p50": round(float(np.percentile(arr, 50)), 3),
+        "p90": round(float(np.percentile(arr, 90)), 3),
+        "p99": round(float(np.percentile(arr, 99)), 3),
+        "max": round(float(arr.max()), 3),
+    }
+
+
+def run_benchmark(
+    base_dir: str,
+    input_path: str,
+    via: str = "replay",
+    rate: float = 0.0,
+    batch_size: int = 64,
+    queue_size: int = 10000,
+    overflow: str = "block",
+    write_log: bool = True,
+) -> Dict:
+    model = load_scorer(base_dir)
+    feature_cols = model.feature_cols
+
+    tmp_dir = tempfile.mkdtemp(prefix="bench_stream_")
+    log = None
+    if write_log:
+        log = PredictionLogWriter(
+            os.path.join(tmp_dir, "serial_predictions.csv"),
+            [*feature_cols, "cluster_id", "severity", "ts", "device"],
+        )
+
+    latencies: List[float] = []
+
+    def sink(batch: List[ScoredReading]) -> None:
+        if log is not None:
+            log.write_many([[*s.values, s.label, s.severity, s.ts, s.reading.source] for s in batch])
+        now = time.perf_counter()
+        latencies.extend(now - s.reading.t_read for s in batch)
+
+    fake = None
+    t0 = time.perf_counter()
+    if via == "pty":
+        fake = FakeSerialDevice(input_path, rate=rate or None, feature_cols=feature_cols)
+        source = SerialSource("bench", fake.path, 115200, exhausted=fake.finished)
+        fake.start()
+    else:
+        source = ReplaySource("bench", input_path, rate=rate or None, feature_cols=feature_cols)
+    reader = MultiSourceReader([source], timeout=0.2)
+    pipeline = StreamPipeline(
+        read_line=reader.read_line,
+        score_batch=make_batch_scorer(model),
+        sink=sink,
+        on_idle=log.maybe_flush if log is not None else None,
+        queue_size=queue_size,
+        batch_size=batch_size,
+        overflow=overflow,
+    ).start()
+    pipeline.join()
+    elapsed = time.perf_counter() - t0
+
+    if log is not None:
+        log.close()
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    reader.close()
+    if fake is not None:
+        fake.close()
+
+    return {
+        "input": os.path.abspath(input_path),
+        "via": via,
+        "rate": rate or "max",
+        "batch_size": batch_size,
+        "lines": len(latencies),
+        "seconds": round(elapsed, 4),
+        "lines_per_s": round(len(latencies) / elapsed, 1) if elapsed > 0 else None,
+        "latency_ms": latency_percentiles(latencies),
+        "stages": pipeline.stats(),
+    }
+
+
+def main() -> None:
+    base_dir = os.path.dirname(__file__)
+    parser = argparse.ArgumentParser(description="Benchmark do stream_serial_predict sem hardware")
+    parser.add_argument("--input", default=os.path.join(base_dir, "data", "sensors.csv"), help="CSV a reproduzir")
+    parser.add_argument("--via", choices=["replay", "pty"], default="replay", help="Fonte: pipe (replay) ou dispositivo serial falso (pty)")
+    parser.add_argument("--rate", type=float, default=0.0, help="Linhas/s (0 = máximo)")
+    parser.add_argument("--batch-size", type=int, default=64, help="Máximo de linhas por lote de scoring")
+    parser.add_argument("--queue-size", type=int, default=10000, help="Capacidade de cada fila do pipeline")
+    parser.add_argument("--overflow", choices=OVERFLOW_POLICIES, default="block", help="Política de fila cheia")
+    parser.add_argument("--no-log", action="store_true", help="Não gravar o log (mede só leitura + scoring)")
+    parser.add_argument("--json", default=None, help="Salvar o resultado em JSON")
+    args = parser.parse_args()
+
+    result = run_benchmark(
+        base_dir,
+        args.input,
+        via=args.via,
+        rate=args.rate,
+        batch_size=args.batch_size,
+        queue_size=args.queue_size,
+        overflow=args.overflow,
+        write_log=not args.no_log,
+    )
+
+    lat = result["latency_ms"]
+    print(
+        f"[OK] {result['lines']} linhas em {result['seconds']:.3f}s — {result['lines_per_s']} linhas/s | "
+        f"latência p50={lat.get('p50')}ms p90={lat.get('p90')}ms p99={lat.get('p99')}ms max={lat.get('max')}ms"
+    )
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"[OK] Resultado salvo em: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
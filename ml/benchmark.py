@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+Suíte de benchmark reproduzível do caminho de ML (treino e scoring).
+
+Para cada tamanho (10k/100k/1M/10M linhas, dados de `generate_data.py` com
+semente fixa, gerados uma vez e guardados em cache) mede:
+
+- `kselect`: seleção de k escalável (`choose_k_scalable`, MiniBatchKMeans + silhueta amostrada)
+- `kselect_exact`: seleção exata (KMeans + silhueta completa), só até `--exact-max-rows`
+- `fit`: ajuste do KMeans final (`fit_kmeans`), só até `--fit-max-rows`
+- `fit_minibatch`: ajuste do MiniBatchKMeans (`fit_minibatch_kmeans`)
+- `predict`: `predict.py` em chunks (leitura + predição + escrita) e predição em memória
+- `stream`: pipeline do `stream_serial_predict.py` (`bench_stream.py`), latência por linha
+
+Cada caso roda em um processo próprio, o que isola o pico de memória (RSS)
+medido. O resultado vai para `outputs/benchmarks/<commit>.json`; `compare`
+confronta dois resultados e sai com código 1 quando há regressão acima do limiar.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+SIZES = {"10k": 10_000, "100k": 100_000, "1M": 1_000_000, "10M": 10_000_000}
+DEFAULT_SIZES = ["10k", "100k", "1M"]
+CASES = ["kselect", "kselect_exact", "fit", "fit_minibatch", "predict", "stream"]
+
+# Direção de cada métrica na comparação (True = maior é melhor)
+METRICS = {
+    "seconds": False,
+    "rows_per_s": True,
+    "predict_rows_per_s": True,
+    "latency_p50_ms": False,
+    "latency_p99_ms": False,
+    "peak_rss_mb": False,
+}
+RSS_METRICS = {"peak_rss_mb"}
+
+
+def peak_rss_mb() -> float:
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux devolve KB, macOS bytes
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+# === Casos (rodam no processo filho) ===
+
+
+def _load_scaled(data_path: str):
+    import numpy as np
+    from sklearn.preprocessing import StandardScaler
+
+    from cluster_model import load_dataset, select_feature_columns
+
+    df = load_dataset(data_path)
+    feature_cols = select_feature_columns(df)
+    X_scaled = StandardScaler().fit_transform(df[feature_cols].to_numpy(dtype=np.float64))
+    return X_scaled, feature_cols
+
+
+def case_kselect(data_path: str, rows: int, opts: Dict[str, Any]) -> Dict[str, Any]:
+    from cluster_model import choose_k_scalable
+
+    X_scaled, _ = _load_scaled(data_path)
+    t0 = time.perf_counter()
+    result = choose_k_scalable(X_scaled, sample_size=opts["sample_size"], random_state=opts["seed"])
+    return {"seconds": time.perf_counter() - t0, "best_k": result.best_k, "method": result.method}
+
+
+def case_kselect_exact(data_path: str, rows: int, opts: Dict[str, Any]) -> Dict[str, Any]:
+    from cluster_model import choose_k_with_silhouette_and_fallback
+
+    X_scaled, _ = _load_scaled(data_path)
+    t0 = time.perf_counter()
+    result = choose_k_with_silhouette_and_fallback(X_scaled, n_init=opts["n_init"], random_state=opts["seed"])
+    return {"seconds": time.perf_counter() - t0, "best_k": result.best_k, "method": result.method}
+
+
+def case_fit(data_path: str, rows: int, opts: Dict[str, Any]) -> Dict[str, Any]:
+    from cluster_model import fit_kmeans
+
+    X_scaled, _ = _load_scaled(data_path)
+    t0 = time.perf_counter()
+    fit_kmeans(X_scaled, n_clusters=opts["k"])
+    return {"seconds": time.perf_counter() - t0}
+
+
+def case_fit_minibatch(data_path: str, rows: int, opts: Dict[str, Any]) -> Dict[str, Any]:
+    from cluster_model import fit_minibatch_kmeans
+
+    X_scaled, _ = _load_scaled(data_path)
+    t0 = time.perf_counter()
+    fit_minibatch_kmeans(X_scaled, opts["k"], random_state=opts["seed"])
+    return {"seconds": time.perf_counter() - t0}
+
+
+def _build_model_dir(data_path: str, opts: Dict[str, Any], tmp_dir: str) -> str:
+    """Modelo compilado pequeno (ajustado nas primeiras linhas) em `tmp_dir/artifacts`: só o custo do scoring importa."""
+    import numpy as np
+    from sklearn.preprocessing import StandardScaler
+
+    from cluster_model import fit_minibatch_kmeans, map_centroids_to_severity, select_feature_columns
+    from compiled_model import COMPILED_MODEL_FILE, CompiledModel
+    from dataset_io import iter_dataset_chunks
+
+    sample = next(iter_dataset_chunks(data_path, 50_000))
+    feature_cols = select_feature_columns(sample)
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(sample[feature_cols].to_numpy(dtype=np.float64))
+    km = fit_minibatch_kmeans(X_scaled, opts["k"], random_state=opts["seed"])
+    severity_map = map_centroids_to_severity(km.cluster_centers_, feature_cols)
+    artifacts = os.path.join(tmp_dir, "artifacts")
+    os.makedirs(artifacts)
+    CompiledModel.from_estimators(scaler, km, feature_cols, severity_map).save(os.path.join(artifacts, COMPILED_MODEL_FILE))
+    return tmp_dir
+
+
+def case_predict(data_path: str, rows: int, opts: Dict[str, Any]) -> Dict[str, Any]:
+    from compiled_model import load_scorer
+    from dataset_io import read_dataset
+    from predict import run_predict_chunked
+
+    tmp_dir = tempfile.mkdtemp(prefix="bench_predict_")
+    try:
+        base_dir = _build_model_dir(data_path, opts, tmp_dir)
+        t0 = time.perf_counter()
+        run_predict_chunked(data_path, os.path.join(tmp_dir, "pred.parquet"), base_dir, chunksize=opts["chunksize"])
+        seconds = time.perf_counter() - t0
+
+        # Só a predição vetorizada, sem E/S
+        scorer = load_scorer(base_dir)
+        X = read_dataset(data_path, columns=scorer.feature_cols).to_numpy()
+        t1 = time.perf_counter()
+        scorer.severity(scorer.predict(X))
+        predict_seconds = time.perf_counter() - t1
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return {"seconds": seconds, "predict_rows_per_s": rows / predict_seconds if predict_seconds > 0 else None}
+
+
+def case_stream(data_path: str, rows: int, opts: Dict[str, Any]) -> Dict[str, Any]:
+    from bench_stream import run_benchmark
+    from dataset_io import iter_dataset_chunks
+
+    tmp_dir = tempfile.mkdtemp(prefix="bench_stream_")
+    try:
+        base_dir = _build_model_dir(data_path, opts, tmp_dir)
+        # O replay lê CSV; linhas limitadas a --stream-rows (o custo por linha não depende do tamanho)
+        csv_path = os.path.join(tmp_dir, "stream.csv")
+        next(iter_dataset_chunks(data_path, min(rows, opts["stream_rows"]))).to_csv(csv_path, index=False)
+        result = run_benchmark(base_dir, csv_path, rate=opts["stream_rate"], batch_size=opts["batch_size"])
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    lat = result["latency_ms"]
+    return {
+        "seconds": result["seconds"],
+        "lines": result["lines"],
+        "rows_per_s": result["lines_per_s"],
+        "latency_p50_ms": lat.get("p50"),
+        "latency_p99_ms": lat.get("p99"),
+    }
+
+
+CASE_FUNCS: Dict[str, Callable[[str, int, Dict[str, Any]], Dict[str, Any]]] = {
+    "kselect": case_kselect,
+    "kselect_exact": case_kselect_exact,
+    "fit": case_fit,
+    "fit_minibatch": case_fit_minibatch,
+    "predict": case_predict,
+    "stream": case_stream,
+}
+
+
+def run_case_child(case: str, data_path: str, rows: int, opts: Dict[str, Any]) -> None:
+    baseline = peak_rss_mb()
+    # Saídas dos scripts chamados vão para o stderr; o stdout leva só o JSON
+    stdout = sys.stdout
+    sys.stdout = sys.stderr
+    try:
+        metrics = CASE_FUNCS[case](data_path, rows, opts)
+    finally:
+        sys.stdout = stdout
+    metrics["baseline_rss_mb"] = baseline
+    metrics["peak_rss_mb"] = peak_rss_mb()
+    print(json.dumps(metrics))
+
+
+# === Orquestração (processo pai) ===
+
+
+def ensure_dataset(cache_dir: str, size: str, seed: int) -> str:
+    """Gera (uma vez) o dataset do tamanho com `generate_data.py`; mesma semente → mesmos dados."""
+    from dataset_io import DatasetWriter
+    from generate_data import iter_synthetic_chunks
+
+    path = os.path.join(cache_dir, f"sensors_{size}_seed{seed}.parquet")
+    if os.path.exists(path):
+        return path
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = path + ".tmp"
+    t0 = time.perf_counter()
+    with DatasetWriter(tmp_path, "parquet") as writer:
+        for chunk in iter_synthetic_chunks(SIZES[size], random_state=seed, chunk_rows=1_000_000):
+            writer.write(chunk)
+    os.replace(tmp_path, path)
+    print(f"[INFO] Dataset {size} gerado em {time.perf_counter() - t0:.1f}s: {path}")
+    return path
+
+
+def case_applies(case: str, rows: int, opts: Dict[str, Any]) -> bool:
+    if case == "kselect_exact":
+        return rows <= opts["exact_max_rows"]
+    if case == "fit":
+        return rows <= opts["fit_max_rows"]
+    return True
+
+
+def run_case(case: str, data_path: str, rows: int, opts: Dict[str, Any], timeout: Optional[float]) -> Dict[str, Any]:
+    cmd = [sys.executable, os.path.abspath(__file__), "_case", case, data_path, str(rows), json.dumps(opts)]
+    proc = subprocess.run(
+        cmd,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        timeout=timeout,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"caso {case} falhou (código {proc.returncode}): {proc.stderr.strip()[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def summarize(runs: List[Dict[str, Any]], rows: int) -> Dict[str, Any]:
+    """Melhor execução (menor tempo) + mediana dos tempos e maior pico de memória entre as repetições."""
+    best = dict(min(runs, key=lambda r: r["seconds"]))
+    best["seconds_median"] = statistics.median(r["seconds"] for r in runs)
+    best["peak_rss_mb"] = max(r["peak_rss_mb"] for r in runs)
+    if "rows_per_s" not in best:
+        best["rows_per_s"] = rows / best["seconds"] if best["seconds"] > 0 else None
+    best["repeat"] = len(runs)
+    return {k: (round(v, 4) if isinstance(v, float) else v) for k, v in best.items()}
+
+
+def git_info(repo_dir: str) -> Tuple[str, bool]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short=12", "HEAD"], cwd=repo_dir, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(
+            subprocess.run(["git", "status", "--porcelain", "--", "."], cwd=repo_dir, capture_output=True, text=True).stdout.strip()
+        )
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+
+
+def environment_info() -> Dict[str, Any]:
+    import numpy
+    import pandas
+    import sklearn
+
+    return {
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "pandas": pandas.__version__,
+        "sklearn": sklearn.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run_suite(args) -> str:
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    opts = {
+        "seed": args.seed,
+        "k": args.k,
+        "n_init": args.n_init,
+        "sample_size": args.sample_size,
+        "chunksize": args.chunksize,
+        "stream_rows": args.stream_rows,
+        "stream_rate": args.stream_rate,
+        "batch_size": args.batch_size,
+        "exact_max_rows": args.exact_max_rows,
+        "fit_max_rows": args.fit_max_rows,
+    }
+    commit, dirty = git_info(base_dir)
+    results: List[Dict[str, Any]] = []
+    for size in args.sizes:
+        rows = SIZES[size]
+        data_path = ensure_dataset(args.cache_dir, size, args.seed)
+        for case in args.cases:
+            if not case_applies(case, rows, opts):
+                print(f"[INFO] {case}@{size}: ignorado (acima do limite do caso)")
+                continue
+            try:
+                runs = [run_case(case, data_path, rows, opts, args.timeout) for _ in range(args.repeat)]
+            except (RuntimeError, subprocess.TimeoutExpired) as e:
+                print(f"[WARN] {case}@{size}: {e}", file=sys.stderr)
+                results.append({"case": case, "size": size, "rows": rows, "error": str(e)[-500:]})
+                continue
+            summary = {"case": case, "size": size, "rows": rows, **summarize(runs, rows)}
+            results.append(summary)
+            extra = f" p50={summary['latency_p50_ms']}ms p99={summary['latency_p99_ms']}ms" if "latency_p50_ms" in summary else ""
+            print(
+                f"[OK] {case}@{size}: {summary['seconds']:.3f}s ({summary['rows_per_s'] or 0:,.0f} linhas/s) "
+                f"pico {summary['peak_rss_mb']} MB{extra}"
+            )
+
+    report = {
+        "commit": commit,
+        "dirty": dirty,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "environment": environment_info(),
+        "options": {**opts, "sizes": args.sizes, "cases": args.cases, "repeat": args.repeat},
+        "results": results,
+    }
+    out = args.out or os.path.join(base_dir, "outputs", "benchmarks", f"{commit}{'-dirty' if dirty else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"[OK] Resultado salvo em: {out}")
+    return out
+
+
+def compare(base_path: str, new_path: str, threshold: float, rss_threshold: float) -> int:
+    """Imprime a variação por caso/métrica e devolve o número de regressões acima do limiar."""
+    with open(base_path, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    with open(new_path, "r", encoding="utf-8") as f:
+        new = json.load(f)
+    base_rows = {(r["case"], r["size"]): r for r in base["results"] if "error" not in r}
+
+    print(f"[INFO] base {base['commit']} ({base['created_at']}) × novo {new['commit']} ({new['created_at']})")
+    if base.get("environment") != new.get("environment"):
+        print("[WARN] Ambientes diferentes (versões/máquina); compare com cautela", file=sys.stderr)
+
+    regressions = 0
+    print(f"{'caso':<22} {'métrica':<20} {'base':>12} {'novo':>12} {'variação':>9}")
+    for r in new["results"]:
+        key = (r["case"], r["size"])
+        label = f"{r['case']}@{r['size']}"
+        if "error" in r:
+            print(f"{label:<22} {'(erro)':<20}")
+            regressions += 1
+            continue
+        old = base_rows.get(key)
+        if old is None:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            a, b = old.get(metric), r.get(metric)
+            if not a or b is None:
+                continue
+            change = (b - a) / a
+            worse = -change if higher_is_better else change
+            limit = rss_threshold if metric in RSS_METRICS else threshold
+            flag = ""
+            if worse > limit:
+                flag = "  REGRESSÃO"
+                regressions += 1
+            elif worse < -limit:
+                flag = "  melhora"
+            print(f"{label:<22} {metric:<20} {a:>12.4g} {b:>12.4g} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main() -> None:
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    if len(sys.argv) > 1 and sys.argv[1] == "_case":
+        # Processo filho: _case <caso> <dataset> <linhas> <opções JSON>
+        _, _, case, data_path, rows, opts = sys.argv
+        run_case_child(case, data_path, int(rows), json.loads(opts))
+        return
+
+    parser = argparse.ArgumentParser(description="Benchmark reproduzível de treino e scoring (tempos, vazão, latência e pico de RSS)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_run = sub.add_parser("run", help="Rodar a suíte e salvar o JSON do commit atual")
+    p_run.add_argument("--sizes", nargs="+", choices=list(SIZES), default=DEFAULT_SIZES, help="Tamanhos (10M é opcional: minutos e GBs de RAM)")
+    p_run.add_argument("--cases", nargs="+", choices=CASES, default=CASES, help="Casos a medir")
+    p_run.add_argument("--repeat", type=int, default=3, help="Repetições por caso (guarda o menor tempo e a mediana)")
+    p_run.add_argument("--seed", type=int, default=42, help="Semente dos dados e dos ajustes")
+    p_run.add_argument("--k", type=int, default=4, help="Número de clusters em fit/predict/stream")
+    p_run.add_argument("--n-init", type=int, default=10, help="Inicializações do KMeans em kselect_exact")
+    p_run.add_argument("--sample-size", type=int, default=4000, help="Amostra da silhueta em kselect")
+    p_run.add_argument("--chunksize", type=int, default=200_000, help="Chunk do predict.py")
+    p_run.add_argument("--stream-rows", type=int, default=100_000, help="Máximo de linhas no caso stream")
+    p_run.add_argument("--stream-rate", type=float, default=0.0, help="Linhas/s no caso stream (0 = máximo, mede vazão)")
+    p_run.add_argument("--batch-size", type=int, default=64, help="Lote de scoring no caso stream")
+    p_run.add_argument("--exact-max-rows", type=int, default=20_000, help="Maior tamanho para kselect_exact (silhueta O(n²))")
+    p_run.add_argument("--fit-max-rows", type=int, default=1_000_000, help="Maior tamanho para fit (KMeans com n_init=20)")
+    p_run.add_argument("--timeout", type=float, default=None, help="Tempo máximo por execução de caso (s)")
+    p_run.add_argument("--cache-dir", default=os.path.join(base_dir, "outputs", "bench_data"), help="Cache dos datasets gerados")
+    p_run.add_argument("--out", default=None, help="JSON de saída (padrão: outputs/benchmarks/<commit>.json)")
+
+    p_cmp = sub.add_parser("compare", help="Comparar dois resultados; código 1 se houver regressão")
+    p_cmp.add_argument("base", help="JSON de referência (ex.: commit em produção)")
+    p_cmp.add_argument("new", help="JSON novo")
+    p_cmp.add_argument("--threshold", type=float, default=0.10, help="Piora tolerada em tempo/vazão/latência (fração)")
+    p_cmp.add_argument("--rss-threshold", type=float, default=0.20, help="Piora tolerada no pico de RSS (fração)")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run_suite(args)
+    else:
+        regressions = compare(args.base, args.new, args.threshold, args.rss_threshold)
+        if regressions:
+            print(f"[WARN] {regressions} regressão(ões) acima do limiar", file=sys.stderr)
+            sys.exit(1)
+        print("[OK] Sem regressões acima do limiar")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,23 @@
 #!/usr/bin/env python3
+import argparse
 import os
 import json
-from dataclasses import dataclass
-from typing import Dict, List, Tuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-import plotly.express as px
-import seaborn as sns
-from sklearn.cluster import KMeans
-from sklearn.decomposition import PCA
-from sklearn.metrics import calinski_harabasz_score, silhouette_score
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import calinski_harabasz_score, pairwise_distances, silhouette_score
 from sklearn.preprocessing import StandardScaler
 import joblib
 
+from compiled_model import COMPILED_MODEL_FILE, CompiledModel
+from data_sources import add_db_args, db_filters_from_args, load_wide_dataset
+from dataset_io import add_format_arg, find_dataset, read_dataset, with_format, write_dataset
+from model_registry import activate, current_version, new_version_name, publish_version
+
 
 @dataclass
 class ClusterSelectionResult:
@@ -24,7 +27,13 @@ class ClusterSelectionResult:
     k_grid: List[int]
     silhouette_scores: List[float]
     ch_scores: List[float]
+    # Modelos já ajustados na busca, reaproveitados no lugar de um novo ajuste do vencedor
+    models: Dict[int, Any] = field(default_factory=dict, repr=False)
+
 
+# none: só artefatos; summary: assignments + resumo/HTML sem gráficos;
+# sampled: gráficos com no máximo --max-plot-points pontos; full: gráficos com todos os pontos
+REPORT_POLICIES = ["none", "summary", "sampled", "full"]
 
 SEVERITY_LEVELS = [
     "bom",
@@ -53,13 +62,7 @@ def load_dataset(data_path: str) -> pd.DataFrame:
         raise FileNotFoundError(
             f"Dataset não encontrado em {data_path}. Rode primeiro: python generate_data.py"
         )
-    with open(data_path, "r", encoding="utf-8", errors="ignore") as fh:
-        first_line = fh.readline()
-    if "timestamp" in first_line:
-        df = pd.read_csv(data_path, parse_dates=["timestamp"])
-    else:
-        df = pd.read_csv(data_path)
-    return df
+    return read_dataset(data_path)
 
 
 def select_feature_columns(df: pd.DataFrame) -> List[str]:
@@ -75,21 +78,64 @@ def compute_risk_score_matrix(X_scaled: np.ndarray, feature_names: List[str]) ->
     return (X_scaled * weights).mean(axis=1)
 
 
+_GRID_X: np.ndarray = None
+
+
+def _init_grid_worker(X_scaled: np.ndarray, single_thread: bool = False) -> None:
+    global _GRID_X
+    _GRID_X = X_scaled
+    if single_thread:
+        # Um processo por k: evita disputa entre os threads do BLAS/OpenMP de cada worker
+        from threadpoolctl import threadpool_limits
+
+        threadpool_limits(limits=1)
+
+
+def run_k_grid(X_scaled: np.ndarray, task: Callable, k_grid: List[int], workers: int = 1, **kwargs) -> List[Dict[str, Any]]:
+    """Avalia cada k com `task(k, **kwargs)`; com workers > 1 usa um pool de processos (X enviado uma vez por worker)."""
+    if workers <= 1:
+        _init_grid_worker(X_scaled)
+        return [task(k, **kwargs) for k in k_grid]
+    with ProcessPoolExecutor(max_workers=min(workers, len(k_grid)), initializer=_init_grid_worker, initargs=(X_scaled, True)) as pool:
+        futures = [pool.submit(task, k, **kwargs) for k in k_grid]
+        return [f.result() for f in futures]
+
+
+def _evaluate_kmeans_candidate(k: int, n_init: int, random_state: int) -> Dict[str, Any]:
+    X_scaled = _GRID_X
+    km = KMeans(n_clusters=k, n_init=n_init, random_state=random_state)
+    labels = km.fit_predict(X_scaled)
+    return {
+        "k": k,
+        "model": km,
+        "silhouette": float(silhouette_score(X_scaled, labels)),
+        "ch": float(calinski_harabasz_score(X_scaled, labels)),
+    }
+
+
 def choose_k_with_silhouette_and_fallback(
-    X_scaled: np.ndarray, k_min: int = 2, k_max: int = 8, silhouette_threshold: float = 0.35
+    X_scaled: np.ndarray,
+    k_min: int = 2,
+    k_max: int = 8,
+    silhouette_threshold: float = 0.35,
+    n_init: int = 10,
+    random_state: int = 42,
+    workers: int = 1,
 ) -> ClusterSelectionResult:
     k_grid = list(range(k_min, k_max + 1))
-    silhouette_scores: List[float] = []
-    ch_scores: List[float] = []
+    evaluated = run_k_grid(X_scaled, _evaluate_kmeans_candidate, k_grid, workers, n_init=n_init, random_state=random_state)
+
+    silhouette_scores: List[float] = [e["silhouette"] for e in evaluated]
+    ch_scores: List[float] = [e["ch"] for e in evaluated]
 
-    for k in k_grid:
-        km = KMeans(n_clusters=k, n_init=10, random_state=42)
-        labels = km.fit_predict(X_scaled)
-        sil = silhouette_score(X_scaled, labels)
-        ch = calinski_harabasz_score(X_scaled, labels)
-        silhouette_scores.append(sil)
-        ch_scores.append(ch)
+    result = select_best_k(k_grid, silhouette_scores, ch_scores, silhouette_threshold)
+    result.models = {e["k"]: e["model"] for e in evaluated}
+    return result
 
+
+def select_best_k(
+    k_grid: List[int], silhouette_scores: List[float], ch_scores: List[float], silhouette_threshold: float
+) -> ClusterSelectionResult:
     best_k_sil = int(k_grid[int(np.nanargmax(silhouette_scores))])
     best_sil = float(np.nanmax(silhouette_scores))
 
@@ -111,6 +157,103 @@ def choose_k_with_silhouette_and_fallback(
     )
 
 
+def stratified_sample_indices(labels: np.ndarray, sample_size: int, random_state: int) -> np.ndarray:
+    # Amostra proporcional por cluster (mínimo de 2 por cluster para a silhueta ser definida)
+    n = len(labels)
+    if sample_size >= n:
+        return np.arange(n)
+    rng = np.random.default_rng(random_state)
+    parts = []
+    for cid in np.unique(labels):
+        members = np.flatnonzero(labels == cid)
+        take = min(len(members), max(2, int(round(sample_size * len(members) / n))))
+        parts.append(rng.choice(members, size=take, replace=False))
+    return np.sort(np.concatenate(parts))
+
+
+def simplified_silhouette(distances: np.ndarray, labels: np.ndarray) -> float:
+    # Silhueta baseada em centróides: a = distância ao próprio centróide, b = ao centróide vizinho mais próximo
+    idx = np.arange(len(labels))
+    a = distances[idx, labels]
+    masked = distances.copy()
+    masked[idx, labels] = np.inf
+    b = masked.min(axis=1)
+    denom = np.maximum(a, b)
+    s = np.where(denom > 0, (b - a) / np.where(denom > 0, denom, 1.0), 0.0)
+    return float(s.mean())
+
+
+def fit_minibatch_kmeans(X_scaled: np.ndarray, n_clusters: int, random_state: int = 42, batch_size: int = 4096) -> MiniBatchKMeans:
+    model = MiniBatchKMeans(n_clusters=n_clusters, n_init=3, batch_size=batch_size, random_state=random_state)
+    model.fit(X_scaled)
+    return model
+
+
+def choose_k_scalable(
+    X_scaled: np.ndarray,
+    k_min: int = 2,
+    k_max: int = 8,
+    silhouette_threshold: float = 0.35,
+    sample_size: int = 4000,
+    random_state: int = 42,
+    silhouette: str = "sampled",
+    batch_size: int = 4096,
+    workers: int = 1,
+) -> ClusterSelectionResult:
+    """
+    Seleção de k para bases grandes, sem silhueta O(n²) sobre todos os pontos.
+
+    Os candidatos são ajustados com MiniBatchKMeans; as distâncias ponto→centróide
+    de cada ajuste dão os rótulos e a silhueta simplificada. No modo `sampled`, a
+    silhueta exata é calculada em uma amostra estratificada (pelos clusters do maior
+    k), com a matriz de distâncias da amostra calculada uma única vez e reaproveitada
+    para todos os k. O CH usa todos os pontos (custo linear).
+    """
+    k_grid = list(range(k_min, k_max + 1))
+    evaluated = run_k_grid(
+        X_scaled,
+        _fit_scalable_candidate,
+        k_grid,
+        workers,
+        random_state=random_state,
+        batch_size=batch_size,
+        silhouette=silhouette,
+    )
+    labels_by_k = {e["k"]: e["labels"] for e in evaluated}
+    ch_scores = [e["ch"] for e in evaluated]
+
+    if silhouette == "simplified":
+        silhouette_scores = [e["silhouette"] for e in evaluated]
+    else:
+        sample = stratified_sample_indices(labels_by_k[k_max], sample_size, random_state)
+        pairwise = pairwise_distances(X_scaled[sample]).astype(np.float32)
+        silhouette_scores = []
+        for k in k_grid:
+            sample_labels = labels_by_k[k][sample]
+            if len(np.unique(sample_labels)) < 2:
+                silhouette_scores.append(float("nan"))
+                continue
+            silhouette_scores.append(float(silhouette_score(pairwise, sample_labels, metric="precomputed")))
+
+    result = select_best_k(k_grid, silhouette_scores, ch_scores, silhouette_threshold)
+    result.models = {e["k"]: e["model"] for e in evaluated}
+    return result
+
+
+def _fit_scalable_candidate(k: int, random_state: int, batch_size: int, silhouette: str) -> Dict[str, Any]:
+    X_scaled = _GRID_X
+    km = fit_minibatch_kmeans(X_scaled, k, random_state=random_state, batch_size=batch_size)
+    distances = km.transform(X_scaled)
+    labels = distances.argmin(axis=1).astype(np.int32)
+    return {
+        "k": k,
+        "model": km,
+        "labels": labels,
+        "ch": float(calinski_harabasz_score(X_scaled, labels)),
+        "silhouette": simplified_silhouette(distances, labels) if silhouette == "simplified" else None,
+    }
+
+
 def fit_kmeans(X_scaled: np.ndarray, n_clusters: int) -> KMeans:
     model = KMeans(n_clusters=n_clusters, n_init=20, random_state=42)
     model.fit(X_scaled)
@@ -125,6 +268,17 @@ def map_clusters_to_severity(
     cluster_risk = {
         cid: float(risk[cluster_labels == cid].mean()) for cid in cluster_ids
     }
+    return rank_clusters_by_risk(cluster_risk)
+
+
+def map_centroids_to_severity(centroids_scaled: np.ndarray, feature_names: List[str]) -> Dict[int, str]:
+    # O escore de risco é a média das features padronizadas, então o risco do centróide
+    # é igual ao risco médio dos pontos do cluster (mesma ordem que map_clusters_to_severity)
+    risk = compute_risk_score_matrix(centroids_scaled, feature_names)
+    return rank_clusters_by_risk({cid: float(r) for cid, r in enumerate(risk)})
+
+
+def rank_clusters_by_risk(cluster_risk: Dict[int, float]) -> Dict[int, str]:
     ranked = sorted(cluster_risk.items(), key=lambda kv: kv[1])
     levels = SEVERITY_LEVELS.copy()
     if len(levels) < len(ranked):
@@ -132,13 +286,39 @@ def map_clusters_to_severity(
             levels.append(f"critico+{len(levels) - 2}")
     mapping: Dict[int, str] = {}
     for i, (cid, _risk_value) in enumerate(ranked):
-        mapping[cid] = levels[i]
+        mapping[int(cid)] = levels[i]
     return mapping
 
 
+def compute_training_stats(model, X_scaled: np.ndarray) -> Dict[str, Any]:
+    # Estatísticas guardadas no metadata para atualização incremental e checagem de drift
+    distances = model.transform(X_scaled)
+    labels = distances.argmin(axis=1)
+    nearest = distances[np.arange(len(labels)), labels]
+    return {
+        "n_samples": int(len(X_scaled)),
+        "cluster_counts": np.bincount(labels, minlength=model.cluster_centers_.shape[0]).astype(int).tolist(),
+        "inertia_per_sample": float((nearest ** 2).mean()),
+        "distance_p95": float(np.percentile(nearest, 95)),
+    }
+
+
+def _pyplot():
+    # Importados só quando há gráficos: matplotlib/seaborn/plotly pesam mais que o treino em execuções headless
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    return plt
+
+
 def plot_and_save_scores(
     result: ClusterSelectionResult, outputs_dir: str
 ) -> Tuple[str, str]:
+    import seaborn as sns
+
+    plt = _pyplot()
     sns.set(style="whitegrid")
 
     plt.figure(figsize=(7, 4))
@@ -167,7 +347,10 @@ def plot_and_save_scores(
 def plot_pca_scatter(
     X_scaled: np.ndarray, labels: np.ndarray, outputs_dir: str
 ) -> Tuple[str, str]:
+    import plotly.express as px
     from sklearn.decomposition import PCA
+
+    plt = _pyplot()
     pca = PCA(n_components=2, random_state=42)
     X_2d = pca.fit_transform(X_scaled)
 
@@ -198,26 +381,64 @@ def save_report(
     severity_map: Dict[int, str],
     outputs_dir: str,
     reports_dir: str,
+    fmt: str = "parquet",
+    plots: Optional[Dict[str, Tuple[str, str]]] = None,
+    plotted_points: Optional[int] = None,
 ) -> str:
     assignments = df.copy()
     assignments["cluster_id"] = labels
     assignments["severity"] = assignments["cluster_id"].map(severity_map)
 
-    summary = assignments.groupby(["cluster_id", "severity"]).agg(
-        count=(assignments.columns[0], "count")
-    ).reset_index()
+    # Contagem por cluster direto dos rótulos (sem groupby sobre o DataFrame inteiro)
+    counts = np.bincount(labels, minlength=len(severity_map))
+    summary = pd.DataFrame(
+        {
+            "cluster_id": np.arange(len(counts)),
+            "severity": [severity_map.get(i) for i in range(len(counts))],
+            "count": counts,
+        }
+    )
+    summary = summary[summary["count"] > 0]
 
-    assignments_path = os.path.join(outputs_dir, "cluster_assignments.csv")
+    assignments_path = with_format(os.path.join(outputs_dir, "cluster_assignments.csv"), fmt)
     summary_path = os.path.join(outputs_dir, "cluster_summary.csv")
-    assignments.to_csv(assignments_path, index=False)
+    write_dataset(assignments, assignments_path, fmt)
     summary.to_csv(summary_path, index=False)
 
     summary_html = summary.to_html(index=False)
-
-    sil_path = os.path.join(outputs_dir, "silhouette_scores.png")
-    ch_path = os.path.join(outputs_dir, "ch_scores.png")
-    pca_png_path = os.path.join(outputs_dir, "pca_scatter.png")
-    pca_html_path = os.path.join(outputs_dir, "pca_scatter.html")
+    scores_html = pd.DataFrame(
+        {"k": result.k_grid, "silhouette": result.silhouette_scores, "calinski_harabasz": result.ch_scores}
+    ).to_html(index=False, float_format=lambda v: f"{v:.4f}")
+
+    plots = plots or {}
+    plot_sections = ""
+    if "scores" in plots:
+        sil_path, ch_path = plots["scores"]
+        plot_sections += f"""
+  <h2>Gráficos de seleção de k</h2>
+  <div class=\"grid\">
+    <div>
+      <img src=\"{os.path.relpath(sil_path, reports_dir)}\" alt=\"Silhouette vs k\" />
+    </div>
+    <div>
+      <img src=\"{os.path.relpath(ch_path, reports_dir)}\" alt=\"Calinski-Harabasz vs k\" />
+    </div>
+  </div>
+"""
+    if "pca" in plots:
+        pca_png_path, pca_html_path = plots["pca"]
+        sampled_note = f" — amostra de {plotted_points} pontos" if plotted_points and plotted_points < len(df) else ""
+        plot_sections += f"""
+  <h2>Projeção PCA (2D){sampled_note}</h2>
+  <div class=\"grid\">
+    <div>
+      <img src=\"{os.path.relpath(pca_png_path, reports_dir)}\" alt=\"PCA clusters\" />
+    </div>
+    <div>
+      <a href=\"{os.path.relpath(pca_html_path, reports_dir)}\">Versão interativa (HTML)</a>
+    </div>
+  </div>
+"""
 
     report_path = os.path.join(reports_dir, "report.html")
     with open(report_path, "w", encoding="utf-8") as f:
@@ -246,26 +467,9 @@ def save_report(
     <p><b>Amostras:</b> {len(df)}</p>
     <p><b>Features:</b> {', '.join(feature_cols)}</p>
   </div>
-
-  <h2>Gráficos de seleção de k</h2>
-  <div class=\"grid\">
-    <div>
-      <img src=\"{os.path.relpath(sil_path, reports_dir)}\" alt=\"Silhouette vs k\" />
-    </div>
-    <div>
-      <img src=\"{os.path.relpath(ch_path, reports_dir)}\" alt=\"Calinski-Harabasz vs k\" />
-    </div>
-  </div>
-
-  <h2>Projeção PCA (2D)</h2>
-  <div class=\"grid\">
-    <div>
-      <img src=\"{os.path.relpath(pca_png_path, reports_dir)}\" alt=\"PCA clusters\" />
-    </div>
-    <div>
-      <a href=\"{os.path.relpath(pca_html_path, reports_dir)}\">Versão interativa (HTML)</a>
-    </div>
-  </div>
+{plot_sections}
+  <h2>Scores por k</h2>
+  {scores_html}
 
   <h2>Resumo por cluster</h2>
   {summary_html}
@@ -278,6 +482,55 @@ def save_report(
     return report_path
 
 
+def write_reports(
+    policy: str,
+    df: pd.DataFrame,
+    feature_cols: List[str],
+    result: ClusterSelectionResult,
+    X_scaled: np.ndarray,
+    labels: np.ndarray,
+    severity_map: Dict[int, str],
+    dirs: Dict[str, str],
+    fmt: str = "parquet",
+    max_plot_points: int = 20000,
+    random_state: int = 42,
+) -> Optional[str]:
+    """
+    Etapa de relatório, separada do treino: não altera o modelo nem os artefatos,
+    então pode rodar em paralelo com `save_artifacts`.
+
+    Em `sampled` a PCA e os gráficos usam uma amostra estratificada por cluster de
+    no máximo `max_plot_points` pontos (o HTML do Plotly embute cada ponto).
+    """
+    if policy not in REPORT_POLICIES:
+        raise ValueError(f"Política de relatório inválida: {policy}. Use uma de {REPORT_POLICIES}")
+    if policy == "none":
+        return None
+
+    plots: Dict[str, Tuple[str, str]] = {}
+    plotted = None
+    if policy in ("sampled", "full"):
+        plots["scores"] = plot_and_save_scores(result, dirs["outputs"])
+        idx = np.arange(len(labels))
+        if policy == "sampled" and len(labels) > max_plot_points:
+            idx = stratified_sample_indices(labels, max_plot_points, random_state)
+        plotted = len(idx)
+        plots["pca"] = plot_pca_scatter(X_scaled[idx], labels[idx], dirs["outputs"])
+
+    return save_report(
+        df=df,
+        feature_cols=feature_cols,
+        result=result,
+        labels=labels,
+        severity_map=severity_map,
+        outputs_dir=dirs["outputs"],
+        reports_dir=dirs["reports"],
+        fmt=fmt,
+        plots=plots,
+        plotted_points=plotted,
+    )
+
+
 def save_artifacts(
     scaler: StandardScaler,
     model: KMeans,
@@ -285,10 +538,12 @@ def save_artifacts(
     severity_map: Dict[int, str],
     result: ClusterSelectionResult,
     artifacts_dir: str,
-) -> None:
-    joblib.dump(scaler, os.path.join(artifacts_dir, "scaler.pkl"))
-    joblib.dump(model, os.path.join(artifacts_dir, "kmeans.pkl"))
+    training_stats: Dict[str, Any] = None,
+) -> str:
+    """Grava os artefatos como nova versão do registro (`artifacts/versions/`) e a torna a atual."""
+    version = new_version_name("fit")
     metadata = {
+        "version": version,
         "feature_cols": feature_cols,
         "severity_map": {int(k): v for k, v in severity_map.items()},
         "model_selection": {
@@ -297,54 +552,117 @@ def save_artifacts(
             "best_score": result.best_score,
         },
     }
-    with open(os.path.join(artifacts_dir, "metadata.json"), "w", encoding="utf-8") as f:
-        json.dump(metadata, f, ensure_ascii=False, indent=2)
+    if training_stats:
+        metadata["training"] = training_stats
+
+    def write_files(out_dir: str) -> None:
+        joblib.dump(scaler, os.path.join(out_dir, "scaler.pkl"))
+        joblib.dump(model, os.path.join(out_dir, "kmeans.pkl"))
+        # Versão leve (só NumPy) usada por predict.py e stream_serial_predict.py
+        CompiledModel.from_estimators(scaler, model, feature_cols, severity_map).save(
+            os.path.join(out_dir, COMPILED_MODEL_FILE)
+        )
+        with open(os.path.join(out_dir, "metadata.json"), "w", encoding="utf-8") as f:
+            json.dump(metadata, f, ensure_ascii=False, indent=2)
+
+    publish_version(artifacts_dir, write_files, version=version, parent_version=current_version(artifacts_dir))
+    activate(artifacts_dir, version)
+    return version
 
 
 def main() -> None:
     base_dir = os.path.dirname(__file__)
+
+    parser = argparse.ArgumentParser(description="Treinar KMeans e escolher k (Silhueta com fallback CH)")
+    parser.add_argument(
+        "--selection",
+        choices=["exact", "scalable"],
+        default="exact",
+        help="exact: KMeans + silhueta completa; scalable: MiniBatchKMeans + silhueta amostrada/simplificada",
+    )
+    parser.add_argument("--silhouette", choices=["sampled", "simplified"], default="sampled", help="Silhueta no modo scalable")
+    parser.add_argument("--sample-size", type=int, default=4000, help="Tamanho da amostra estratificada da silhueta (modo scalable)")
+    parser.add_argument("--seed", type=int, default=42, help="Semente para amostragem e ajustes (modo scalable)")
+    parser.add_argument("--batch-size", type=int, default=4096, help="Batch do MiniBatchKMeans (modo scalable)")
+    parser.add_argument("--n-init", type=int, default=10, help="Inicializações do KMeans por k (modo exact)")
+    parser.add_argument("--workers", type=int, default=1, help="Processos para avaliar os k em paralelo")
+    parser.add_argument("--data", default=None, help="Dataset de treino (padrão: data/sensors.parquet, .arrow ou .csv)")
+    add_format_arg(parser, default="parquet", help_text="Formato de outputs/cluster_assignments")
+    parser.add_argument(
+        "--report",
+        choices=REPORT_POLICIES,
+        default="sampled",
+        help="none: só artefatos; summary: assignments + resumo sem gráficos; sampled: gráficos com amostra; full: gráficos com todos os pontos",
+    )
+    parser.add_argument("--max-plot-points", type=int, default=20000, help="Máximo de pontos na PCA/Plotly com --report sampled")
+    add_db_args(parser)
+    args = parser.parse_args()
+
     dirs = ensure_dirs(base_dir)
-    data_path = os.path.join(dirs["data"], "sensors.csv")
+    data_path = args.data or find_dataset(dirs["data"], "sensors")
 
-    df = load_dataset(data_path)
+    if args.db:
+        df = load_wide_dataset(args.db, bucket=args.bucket, batch_rows=args.db_batch_rows, **db_filters_from_args(args))
+    else:
+        df = load_dataset(data_path)
     feature_cols = select_feature_columns(df)
 
-    X = df[feature_cols].to_numpy()
+    # Parquet/Arrow guardam float32; o ajuste continua em float64
+    X = df[feature_cols].to_numpy(dtype=np.float64)
     scaler = StandardScaler()
     X_scaled = scaler.fit_transform(X)
 
-    result = choose_k_with_silhouette_and_fallback(X_scaled)
-
-    plot_and_save_scores(result, dirs["outputs"])
-
-    model = fit_kmeans(X_scaled, n_clusters=result.best_k)
+    if args.selection == "scalable":
+        result = choose_k_scalable(
+            X_scaled,
+            sample_size=args.sample_size,
+            random_state=args.seed,
+            silhouette=args.silhouette,
+            batch_size=args.batch_size,
+            workers=args.workers,
+        )
+    else:
+        result = choose_k_with_silhouette_and_fallback(X_scaled, n_init=args.n_init, workers=args.workers)
+
+    # O vencedor da busca já está ajustado; só reajusta se a busca não guardou o modelo
+    model = result.models.get(result.best_k)
+    if model is None and args.selection == "scalable":
+        model = fit_minibatch_kmeans(X_scaled, result.best_k, random_state=args.seed, batch_size=args.batch_size)
+    elif model is None:
+        model = fit_kmeans(X_scaled, n_clusters=result.best_k)
     labels = model.labels_
 
     severity_map = map_clusters_to_severity(X_scaled, labels, feature_cols)
 
-    plot_pca_scatter(X_scaled, labels, dirs["outputs"])
-
-    report_path = save_report(
-        df=df,
-        feature_cols=feature_cols,
-        result=result,
-        labels=labels,
-        severity_map=severity_map,
-        outputs_dir=dirs["outputs"],
-        reports_dir=dirs["reports"],
-    )
-
-    save_artifacts(
-        scaler=scaler,
-        model=model,
-        feature_cols=feature_cols,
-        severity_map=severity_map,
-        result=result,
-        artifacts_dir=dirs["artifacts"],
-    )
+    # Relatório em uma thread enquanto os artefatos são salvos (PNG/HTML e joblib/npz passam boa parte do tempo em I/O e C)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        report_future = pool.submit(
+            write_reports,
+            args.report,
+            df,
+            feature_cols,
+            result,
+            X_scaled,
+            labels,
+            severity_map,
+            dirs,
+            fmt=args.format,
+            max_plot_points=args.max_plot_points,
+            random_state=args.seed,
+        )
+        version = save_artifacts(
+            scaler=scaler,
+            model=model,
+            feature_cols=feature_cols,
+            severity_map=severity_map,
+            result=result,
+            artifacts_dir=dirs["artifacts"],
+            training_stats=compute_training_stats(model, X_scaled),
+        )
+        report_path = report_future.result()
 
     print(
-        f"[OK] k={result.best_k} via {result.method}. Relatório: {report_path}"
+        f"[OK] k={result.best_k} via {result.method}. Versão {version}. Relatório: {report_path or '(desativado, --report none)'}"
     )
 
 
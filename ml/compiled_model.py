@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+COMPILED_MODEL_FILE = "model.npz"
+COMPILED_FORMAT_VERSION = 1
+
+
+class CompiledModel:
+    """
+    Modelo "compilado": só o necessário para inferência, sem sklearn.
+
+    Guarda média/escala do StandardScaler, os centróides do KMeans, a ordem das
+    features e o mapa cluster → severidade em um `.npz` pequeno. `predict` faz
+    padronização + centróide mais próximo (mesmo critério do `KMeans.predict`).
+    """
+
+    def __init__(
+        self,
+        mean: np.ndarray,
+        scale: np.ndarray,
+        centroids: np.ndarray,
+        feature_cols: Sequence[str],
+        severity_map: Dict[int, str],
+    ) -> None:
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.centroids = np.asarray(centroids, dtype=np.float64)
+        self.feature_cols: List[str] = list(feature_cols)
+        self.severity_map: Dict[int, str] = {int(k): v for k, v in severity_map.items()}
+        self._centroid_sq = (self.centroids ** 2).sum(axis=1)
+        labels = [self.severity_map.get(i, str(i)) for i in range(len(self.centroids))]
+        self._severity_lookup = np.array(labels, dtype=object)
+
+    @classmethod
+    def from_estimators(cls, scaler, model, feature_cols: Sequence[str], severity_map: Dict[int, str]) -> "CompiledModel":
+        scale = scaler.scale_ if scaler.scale_ is not None else np.ones_like(scaler.mean_)
+        return cls(scaler.mean_, scale, model.cluster_centers_, feature_cols, severity_map)
+
+    @classmethod
+    def load(cls, path: str) -> "CompiledModel":
+        with np.load(path, allow_pickle=False) as data:
+            severity_map = {int(k): str(v) for k, v in zip(data["severity_ids"], data["severity_labels"])}
+            return cls(
+                data["mean"],
+                data["scale"],
+                data["centroids"],
+                [str(c) for c in data["feature_cols"]],
+                severity_map,
+            )
+
+    def save(self, path: str) -> str:
+        ids = sorted(self.severity_map)
+        np.savez(
+            path,
+            format_version=np.int64(COMPILED_FORMAT_VERSION),
+            mean=self.mean,
+            scale=self.scale,
+            centroids=self.centroids,
+            feature_cols=np.array(self.feature_cols),
+            severity_ids=np.array(ids, dtype=np.int64),
+            severity_labels=np.array([self.severity_map[i] for i in ids]),
+        )
+        return path
+
+    @property
+    def n_clusters(self) -> int:
+        return int(self.centroids.shape[0])
+
+    def transform(self, X: np.ndarray) -> np.ndarray:
+        return (np.asarray(X, dtype=np.float64) - self.mean) / self.scale
+
+    def predict_scaled(self, X_scaled: np.ndarray) -> np.ndarray:
+        # ||x - c||² = ||x||² - 2 x·c + ||c||²; ||x||² não muda o argmin
+        dist = self._centroid_sq - 2.0 * (X_scaled @ self.centroids.T)
+        return dist.argmin(axis=1)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.predict_scaled(self.transform(X))
+
+    def severity(self, labels: np.ndarray) -> np.ndarray:
+        return self._severity_lookup[np.asarray(labels, dtype=np.int64)]
+
+
+def load_scorer(base_dir: str) -> CompiledModel:
+    """
+    Carrega o modelo para inferência.
+
+    Usa a versão atual do registro (`artifacts/CURRENT`) ou, sem registro, os
+    arquivos soltos de `artifacts/`. Lê `model.npz` quando existe; senão cai para
+    os pickles do sklearn (scaler.pkl/kmeans.pkl) e compila em memória.
+    """
+    from model_registry import resolve_artifacts_dir
+
+    artifacts_dir = resolve_artifacts_dir(os.path.join(base_dir, "artifacts"))
+    compiled_path = os.path.join(artifacts_dir, COMPILED_MODEL_FILE)
+    if os.path.exists(compiled_path):
+        return CompiledModel.load(compiled_path)
+    return compile_from_pickles(artifacts_dir)
+
+
+def compile_from_pickles(artifacts_dir: str) -> CompiledModel:
+    import joblib
+
+    scaler = joblib.load(os.path.join(artifacts_dir, "scaler.pkl"))
+    model = joblib.load(os.path.join(artifacts_dir, "kmeans.pkl"))
+    with open(os.path.join(artifacts_dir, "metadata.json"), "r", encoding="utf-8") as f:
+        metadata = json.load(f)
+    feature_cols: List[str] = metadata["feature_cols"]
+    severity_map: Dict[int, str] = {int(k): v for k, v in metadata["severity_map"].items()}
+    return CompiledModel.from_estimators(scaler, model, feature_cols, severity_map)
+
+
+def main() -> None:
+    base_dir = os.path.dirname(__file__)
+    parser = argparse.ArgumentParser(description="Exportar o modelo compilado (.npz) a partir dos pickles do sklearn")
+    parser.add_argument("--artifacts", default=os.path.join(base_dir, "artifacts"), help="Diretório dos artefatos")
+    args = parser.parse_args()
+
+    compiled = compile_from_pickles(args.artifacts)
+    out = compiled.save(os.path.join(args.artifacts, COMPILED_MODEL_FILE))
+    print(f"[OK] Modelo compilado salvo em: {out} (k={compiled.n_clusters}, features={len(compiled.feature_cols)})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+import os
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from log_writer import FORMAT_EXTENSIONS
+
+DATASET_FORMATS = list(FORMAT_EXTENSIONS)
+
+# Colunas de texto com poucos valores distintos: viram categóricas (dictionary no Arrow/Parquet)
+CATEGORICAL_COLS = ("severity", "label_true", "device_id", "device", "sensor_id", "quality")
+INTEGER_COLS = {"cluster_id": "int32", "ts": "int64"}
+
+_EXTENSION_FORMATS = {
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+    ".ipc": "arrow",
+}
+
+
+def infer_format(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in _EXTENSION_FORMATS:
+        raise ValueError(f"Extensão não reconhecida: {path!r}. Use uma de {sorted(_EXTENSION_FORMATS)}")
+    return _EXTENSION_FORMATS[ext]
+
+
+def with_format(path: str, fmt: str) -> str:
+    """Troca a extensão de `path` pela do formato (`data/sensors.csv` + parquet → `data/sensors.parquet`)."""
+    stem, _ext = os.path.splitext(path)
+    return stem + FORMAT_EXTENSIONS[fmt]
+
+
+def find_dataset(directory: str, stem: str) -> str:
+    """
+    O mais recente (mtime) entre `stem.parquet`, `stem.arrow` e `stem.csv`; sem
+    nenhum, o caminho do CSV. Com mais de um formato presente, avisa qual foi usado.
+    """
+    candidates = [os.path.join(directory, stem + FORMAT_EXTENSIONS[fmt]) for fmt in ("parquet", "arrow", "csv")]
+    existing = [path for path in candidates if os.path.exists(path)]
+    if not existing:
+        return candidates[-1]
+    # max() mantém o primeiro em caso de empate: parquet > arrow > csv
+    chosen = max(existing, key=os.path.getmtime)
+    if len(existing) > 1:
+        others = ", ".join(os.path.basename(p) for p in existing if p != chosen)
+        print(f"[WARN] Vários formatos de {stem!r} em {directory}: usando o mais recente, {os.path.basename(chosen)} (ignorados: {others})")
+    return chosen
+
+
+def normalize_types(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Tipos compactos e estáveis para Parquet/Arrow: features numéricas em float32,
+    severidade/rótulos/dispositivo categóricos, `timestamp` em datetime64[ms]
+    (int64 em ms no arquivo), `cluster_id` int32 e `ts` int64. In-place.
+    Não se aplica ao CSV, que mantém os tipos padrão do pandas (sem perda de precisão).
+    """
+    for col in df.columns:
+        series = df[col]
+        if col == "timestamp":
+            if not pd.api.types.is_datetime64_any_dtype(series):
+                series = pd.to_datetime(series)
+            df[col] = series.astype("datetime64[ms]")
+        elif col in CATEGORICAL_COLS:
+            if not isinstance(series.dtype, pd.CategoricalDtype):
+                df[col] = series.astype("category")
+        elif col in INTEGER_COLS:
+            df[col] = series.astype(INTEGER_COLS[col])
+        elif pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            df[col] = series.astype(np.float32)
+    return df
+
+
+def dataset_columns(path: str) -> List[str]:
+    """Nomes das colunas sem ler os dados (schema do Parquet/Arrow ou cabeçalho do CSV)."""
+    fmt = infer_format(path)
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        return list(pq.read_schema(path).names)
+    if fmt == "arrow":
+        import pyarrow as pa
+
+        with pa.memory_map(path, "r") as source:
+            return list(pa.ipc.open_file(source).schema.names)
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def _csv_options(path: str, columns: Optional[Sequence[str]]):
+    available = dataset_columns(path)
+    usecols = list(columns) if columns is not None else None
+    parse_dates = ["timestamp"] if "timestamp" in (usecols or available) else None
+    return usecols, parse_dates
+
+
+def read_dataset(path: str, columns: Optional[Sequence[str]] = None, memory_map: bool = True) -> pd.DataFrame:
+    """
+    Lê CSV, Parquet ou Arrow IPC pelo sufixo do arquivo.
+
+    `columns` projeta só as colunas pedidas (no Parquet/Arrow as demais nem são
+    lidas do disco). Com `memory_map`, Parquet e Arrow são mapeados em memória;
+    no Arrow IPC sem compressão os buffers vêm direto do mapeamento, sem cópia.
+    CSV é lido com os tipos padrão do pandas (float64/int64), sem truncar valores.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Dataset não encontrado: {path}")
+    fmt = infer_format(path)
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(path, columns=list(columns) if columns is not None else None, memory_map=memory_map)
+        return table.to_pandas()
+    if fmt == "arrow":
+        import pyarrow as pa
+
+        source = pa.memory_map(path, "r") if memory_map else pa.OSFile(path, "rb")
+        with source:
+            table = pa.ipc.open_file(source).read_all()
+            if columns is not None:
+                table = table.select(list(columns))
+            return table.to_pandas()
+    usecols, parse_dates = _csv_options(path, columns)
+    return pd.read_csv(path, usecols=usecols, parse_dates=parse_dates)
+
+
+def iter_dataset_chunks(path: str, chunksize: int, columns: Optional[Sequence[str]] = None) -> Iterator[pd.DataFrame]:
+    """Mesmo que `read_dataset`, em blocos de até `chunksize` linhas (row groups/record batches no Parquet/Arrow)."""
+    fmt = infer_format(path)
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        pf = pq.ParquetFile(path, memory_map=True)
+        for batch in pf.iter_batches(batch_size=chunksize, columns=list(columns) if columns is not None else None):
+            yield batch.to_pandas()
+        return
+    if fmt == "arrow":
+        import pyarrow as pa
+
+        with pa.memory_map(path, "r") as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                if columns is not None:
+                    batch = batch.select(list(columns))
+                for start in range(0, batch.num_rows, chunksize):
+                    yield batch.slice(start, chunksize).to_pandas()
+        return
+    usecols, parse_dates = _csv_options(path, columns)
+    yield from pd.read_csv(path, usecols=usecols, parse_dates=parse_dates, chunksize=chunksize)
+
+
+def write_dataset(df: pd.DataFrame, path: str, fmt: Optional[str] = None, row_group_size: int = 128_000) -> str:
+    """
+    Grava `df` no formato pedido (ou inferido do sufixo); Parquet/Arrow com os tipos de `normalize_types`.
+
+    Parquet usa zstd e row groups de `row_group_size` linhas; Arrow IPC fica sem
+    compressão para poder ser lido por memory map sem cópia.
+    """
+    fmt = fmt or infer_format(path)
+    if fmt not in FORMAT_EXTENSIONS:
+        raise ValueError(f"Formato inválido: {fmt}. Use um de {DATASET_FORMATS}")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if fmt == "csv":
+        # CSV é só texto: grava os valores como estão, com precisão total
+        df.to_csv(path, index=False)
+        return path
+    df = normalize_types(df.copy())
+
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        pq.write_table(table, path, compression="zstd", row_group_size=row_group_size)
+    else:
+        with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=row_group_size)
+    return path
+
+
+def extend_categories(chunk: pd.DataFrame, seen: Dict[str, List[str]]) -> pd.DataFrame:
+    """
+    Categorias acumuladas entre chunks, na ordem em que aparecem: o dicionário
+    de cada coluna só cresce, como o Arrow IPC exige (deltas de dicionário).
+    """
+    for col in chunk.columns:
+        if isinstance(chunk[col].dtype, pd.CategoricalDtype):
+            known = seen.setdefault(col, [])
+            known.extend(c for c in chunk[col].cat.categories if c not in known)
+            chunk[col] = chunk[col].cat.set_categories(known)
+    return chunk
+
+
+class DatasetWriter:
+    """
+    Grava um dataset chunk a chunk, sem juntar tudo em memória.
+
+    Parquet: um row group por chunk; Arrow IPC: um record batch por chunk;
+    CSV: anexa com cabeçalho só no primeiro. O schema do primeiro chunk vale
+    para o arquivo inteiro. `categories` fixa a ordem inicial de colunas categóricas.
+    """
+
+    def __init__(self, path: str, fmt: Optional[str] = None, categories: Optional[Dict[str, List[str]]] = None) -> None:
+        self.path = path
+        self.fmt = fmt or infer_format(path)
+        if self.fmt not in FORMAT_EXTENSIONS:
+            raise ValueError(f"Formato inválido: {self.fmt}. Use um de {DATASET_FORMATS}")
+        self.rows = 0
+        self._categories: Dict[str, List[str]] = {k: list(v) for k, v in (categories or {}).items()}
+        self._schema = None
+        self._writer = None
+        self._sink = None
+        self._fh = None
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def write(self, chunk: pd.DataFrame) -> None:
+        if self.fmt == "csv":
+            if self._fh is None:
+                self._fh = open(self.path, "w", newline="", encoding="utf-8")
+            chunk.to_csv(self._fh, index=False, header=(self.rows == 0))
+            self.rows += len(chunk)
+            return
+
+        import pyarrow as pa
+
+        chunk = extend_categories(normalize_types(chunk), self._categories)
+        table = pa.Table.from_pandas(chunk, schema=self._schema, preserve_index=False)
+        if self._schema is None:
+            self._schema = table.schema
+            if self.fmt == "parquet":
+                import pyarrow.parquet as pq
+
+                self._writer = pq.ParquetWriter(self.path, self._schema, compression="zstd")
+            else:
+                self._sink = pa.OSFile(self.path, "wb")
+                options = pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+                self._writer = pa.ipc.new_file(self._sink, self._schema, options=options)
+        self._writer.write_table(table)
+        self.rows += len(chunk)
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._sink is not None:
+            self._sink.close()
+            self._sink = None
+
+    def __enter__(self) -> "DatasetWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def add_format_arg(parser, default: str = "parquet", help_text: str = "Formato de saída") -> None:
+    parser.add_argument("--format", choices=DATASET_FORMATS, default=default, help=f"{help_text} (csv, parquet ou arrow)")
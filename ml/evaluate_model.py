@@ -1,22 +1,17 @@
 #!/usr/bin/env python3
+import argparse
 import json
 import os
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, List, Tuple
 
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-import seaborn as sns
 from scipy.optimize import linear_sum_assignment
-from sklearn.metrics import (
-    adjusted_mutual_info_score,
-    adjusted_rand_score,
-    completeness_score,
-    confusion_matrix,
-    homogeneity_score,
-    normalized_mutual_info_score,
-    v_measure_score,
-)
+from scipy.special import gammaln
+
+from dataset_io import dataset_columns, find_dataset, iter_dataset_chunks
+
+EPS = np.finfo(np.float64).eps
 
 
 def ensure_dirs(base_dir: str) -> Dict[str, str]:
@@ -27,63 +22,225 @@ def ensure_dirs(base_dir: str) -> Dict[str, str]:
     return {"outputs": outputs_dir, "reports": reports_dir}
 
 
-def load_assignments(assignments_path: str) -> pd.DataFrame:
+def check_assignments(assignments_path: str) -> None:
     if not os.path.exists(assignments_path):
         raise FileNotFoundError(
             f"Arquivo não encontrado: {assignments_path}. Rode antes: python cluster_model.py"
         )
-    df = pd.read_csv(assignments_path)
-    if "label_true" not in df.columns or "cluster_id" not in df.columns:
+    columns = dataset_columns(assignments_path)
+    if "label_true" not in columns or "cluster_id" not in columns:
         raise ValueError(
             "O arquivo de assignments precisa conter as colunas 'label_true' e 'cluster_id'."
         )
-    return df
 
 
-def encode_labels(series: pd.Series) -> Tuple[np.ndarray, Dict[int, str]]:
-    categories = series.astype(str).unique().tolist()
-    categories.sort()
-    mapping = {label: idx for idx, label in enumerate(categories)}
-    encoded = series.astype(str).map(mapping).to_numpy()
-    inv_mapping = {v: k for k, v in mapping.items()}
-    return encoded, inv_mapping
+class ContingencyAccumulator:
+    """
+    Tabela de contingência rótulo verdadeiro × cluster construída em uma passada,
+    chunk a chunk (memória proporcional a nº de rótulos × nº de clusters).
+    """
+
+    def __init__(self) -> None:
+        self._class_index: Dict[str, int] = {}
+        self._table = np.zeros((0, 0), dtype=np.int64)
+
+    def update(self, labels_true: pd.Series, cluster_ids: np.ndarray) -> None:
+        uniques, local = np.unique(labels_true.astype(str).to_numpy(), return_inverse=True)
+        for name in uniques:
+            self._class_index.setdefault(str(name), len(self._class_index))
+        lookup = np.array([self._class_index[str(name)] for name in uniques], dtype=np.int64)
+        rows = lookup[local]
+        cols = np.asarray(cluster_ids, dtype=np.int64)
+        n_rows = len(self._class_index)
+        n_cols = max(self._table.shape[1], int(cols.max()) + 1 if len(cols) else 0)
+        counts = np.bincount(rows * n_cols + cols, minlength=n_rows * n_cols).reshape(n_rows, n_cols)
+        grown = np.zeros((n_rows, n_cols), dtype=np.int64)
+        grown[: self._table.shape[0], : self._table.shape[1]] = self._table
+        self._table = grown + counts
+
+    def result(self) -> Tuple[np.ndarray, List[str]]:
+        """(tabela com linhas em ordem alfabética dos rótulos e colunas = cluster_id, nomes dos rótulos)."""
+        names = sorted(self._class_index)
+        order = [self._class_index[name] for name in names]
+        return self._table[order], names
+
+
+def contingency_from_chunks(chunks: Iterable[pd.DataFrame]) -> Tuple[np.ndarray, List[str]]:
+    acc = ContingencyAccumulator()
+    for chunk in chunks:
+        acc.update(chunk["label_true"], chunk["cluster_id"].to_numpy())
+    return acc.result()
+
 
+def optimal_mapping_from_contingency(table: np.ndarray) -> Tuple[Dict[int, int], np.ndarray]:
+    """
+    Mapeamento cluster → rótulo (Hungarian) e a tabela de consulta `lookup[cluster_id]`.
 
-def optimal_label_mapping(y_true: np.ndarray, y_pred: np.ndarray) -> Tuple[np.ndarray, Dict[int, int]]:
-    # Constrói matriz de confusão entre rótulos inteiros
-    labels_true = np.unique(y_true)
-    labels_pred = np.unique(y_pred)
-    cm = confusion_matrix(y_true, y_pred, labels=labels_true)
+    Mesma regra de antes: a matriz do Hungarian usa só as colunas cujo cluster_id
+    coincide com um código de rótulo (0..n_rótulos-1), como
+    `confusion_matrix(y_true, y_pred, labels=labels_true)`; clusters não mapeados
+    mantêm o próprio id.
+    """
+    n_true, n_cols = table.shape
+    labels_true = np.arange(n_true)
+    labels_pred = np.flatnonzero(table.sum(axis=0) > 0)
+
+    cm = np.zeros((n_true, n_true), dtype=np.int64)
+    shared = min(n_true, n_cols)
+    cm[:, :shared] = table[:, :shared]
 
     # Hungarian para maximizar o acerto (minimizando o custo negativo)
-    cost = -cm
-    row_ind, col_ind = linear_sum_assignment(cost)
+    row_ind, col_ind = linear_sum_assignment(-cm)
 
     mapping: Dict[int, int] = {}
     for r, c in zip(row_ind, col_ind):
-        mapping[labels_pred[c] if c < len(labels_pred) else c] = labels_true[r]
+        mapping[int(labels_pred[c]) if c < len(labels_pred) else int(c)] = int(labels_true[r])
+
+    lookup = np.arange(max(n_cols, n_true, max(mapping, default=0) + 1), dtype=np.int64)
+    lookup[list(mapping)] = list(mapping.values())
+    return mapping, lookup
+
+
+def remap_columns(table: np.ndarray, lookup: np.ndarray) -> np.ndarray:
+    """Soma as colunas da contingência pelo id mapeado (equivale a recontar com `lookup[y_pred]`)."""
+    mapped = np.zeros((table.shape[0], int(lookup.max()) + 1), dtype=np.int64)
+    np.add.at(mapped.T, lookup[: table.shape[1]], table.T)
+    return mapped
+
+
+def _entropy(counts: np.ndarray) -> float:
+    counts = counts[counts > 0].astype(np.float64)
+    if counts.size <= 1:
+        return 0.0
+    total = counts.sum()
+    return float(-np.sum((counts / total) * (np.log(counts) - np.log(total))))
+
 
-    y_pred_mapped = np.array([mapping.get(p, p) for p in y_pred])
-    return y_pred_mapped, mapping
+def _mutual_info(table: np.ndarray) -> float:
+    a = table.sum(axis=1)
+    b = table.sum(axis=0)
+    if (a > 0).sum() <= 1 or (b > 0).sum() <= 1:
+        return 0.0
+    n = float(table.sum())
+    i, j = np.nonzero(table)
+    nij = table[i, j].astype(np.float64)
+    outer = a[i].astype(np.float64) * b[j].astype(np.float64)
+    mi = (nij / n) * (np.log(nij) - np.log(n) - np.log(outer) + 2.0 * np.log(n))
+    mi = np.where(np.abs(mi) < EPS, 0.0, mi)
+    return float(max(mi.sum(), 0.0))
 
 
-def compute_metrics(y_true: np.ndarray, y_pred: np.ndarray) -> Dict[str, float]:
+def expected_mutual_info(table: np.ndarray, block: int = 1_000_000) -> float:
+    """
+    MI esperada sob o modelo hipergeométrico (termo de correção do AMI).
+
+    Mesma fórmula do sklearn, com os fatoriais em log via `gammaln` e a soma em
+    nij vetorizada por par (rótulo, cluster), em blocos de até `block` valores.
+    """
+    a = table.sum(axis=1)
+    b = table.sum(axis=0)
+    a = a[a > 0].astype(np.int64)
+    b = b[b > 0].astype(np.int64)
+    if a.size == 1 or b.size == 1:
+        return 0.0
+    n = int(a.sum())
+    gln_n = gammaln(n + 1)
+    emi = 0.0
+    for ai in a:
+        for bj in b:
+            start = max(1, ai - n + bj)
+            end = min(ai, bj) + 1
+            base = gammaln(ai + 1) + gammaln(bj + 1) + gammaln(n - ai + 1) + gammaln(n - bj + 1) - gln_n
+            for lo in range(start, end, block):
+                nij = np.arange(lo, min(lo + block, end), dtype=np.float64)
+                gln = base - gammaln(nij + 1) - gammaln(ai - nij + 1) - gammaln(bj - nij + 1) - gammaln(n - ai - bj + nij + 1)
+                term2 = np.log(n) + np.log(nij) - np.log(ai) - np.log(bj)
+                emi += float(np.sum((nij / n) * term2 * np.exp(gln)))
+    return emi
+
+
+def metrics_from_contingency(table: np.ndarray) -> Dict[str, float]:
+    """ARI, AMI, NMI, homogeneidade, completude e V-measure a partir só da contingência."""
+    table = table[table.sum(axis=1) > 0][:, table.sum(axis=0) > 0].astype(np.int64)
+    n = int(table.sum())
+    n_classes, n_clusters = table.shape
+    a = table.sum(axis=1)
+    b = table.sum(axis=0)
+
+    # ARI pela matriz de pares (inteiros Python para não estourar)
+    sum_squares = int((table.astype(object) ** 2).sum())
+    tp = sum_squares - n
+    fp = int((table.astype(object) * b.astype(object)).sum()) - sum_squares
+    fn = int((table.astype(object).T * a.astype(object)).sum()) - sum_squares
+    tn = n * n - fp - fn - sum_squares
+    if fn == 0 and fp == 0:
+        ari = 1.0
+    else:
+        ari = 2.0 * (tp * tn - fn * fp) / ((tp + fn) * (fn + tn) + (tp + fp) * (fp + tn))
+
+    h_true, h_pred = _entropy(a), _entropy(b)
+    mi = _mutual_info(table)
+    normalizer = (h_true + h_pred) / 2.0
+
+    if n_classes == n_clusters == 1 or n == 0:
+        nmi = ami = 1.0
+    else:
+        nmi = 0.0 if mi == 0 else mi / normalizer
+        if n_classes == 1 or n_clusters == 1:
+            ami = 0.0
+        else:
+            emi = expected_mutual_info(table)
+            denominator = normalizer - emi
+            denominator = min(denominator, -EPS) if denominator < 0 else max(denominator, EPS)
+            numerator = mi - emi
+            numerator = min(numerator, -EPS) if numerator < 0 else max(numerator, EPS)
+            ami = numerator / denominator
+
+    homogeneity = mi / h_true if h_true else 1.0
+    completeness = mi / h_pred if h_pred else 1.0
+    v_measure = 0.0 if homogeneity + completeness == 0 else 2.0 * homogeneity * completeness / (homogeneity + completeness)
+
     return {
-        "ARI": float(adjusted_rand_score(y_true, y_pred)),
-        "AMI": float(adjusted_mutual_info_score(y_true, y_pred)),
-        "NMI": float(normalized_mutual_info_score(y_true, y_pred)),
-        "Homogeneity": float(homogeneity_score(y_true, y_pred)),
-        "Completeness": float(completeness_score(y_true, y_pred)),
-        "VMeasure": float(v_measure_score(y_true, y_pred)),
-        "Accuracy_opt_map": float((y_true == y_pred).mean()),
+        "ARI": float(ari),
+        "AMI": float(ami),
+        "NMI": float(nmi),
+        "Homogeneity": float(homogeneity),
+        "Completeness": float(completeness),
+        "VMeasure": float(v_measure),
     }
 
 
+def accuracy_from_contingency(mapped: np.ndarray) -> float:
+    # Acertos = diagonal da contingência já mapeada (id mapeado == código do rótulo)
+    shared = min(mapped.shape)
+    total = mapped.sum()
+    return float(np.trace(mapped[:shared, :shared]) / total) if total else 0.0
+
+
+def evaluate_contingency(table: np.ndarray, class_names: List[str]) -> Tuple[Dict[str, float], np.ndarray, Dict[int, int]]:
+    """Métricas, matriz de confusão (rótulos × rótulos mapeados) e mapeamento a partir da contingência bruta."""
+    mapping, lookup = optimal_mapping_from_contingency(table)
+    mapped = remap_columns(table, lookup)
+    metrics = {**metrics_from_contingency(mapped), "Accuracy_opt_map": accuracy_from_contingency(mapped)}
+
+    n_true = len(class_names)
+    cm = np.zeros((n_true, n_true), dtype=np.int64)
+    shared = min(n_true, mapped.shape[1])
+    cm[:, :shared] = mapped[:, :shared]
+    return metrics, cm, mapping
+
+
 def save_confusion(cm: np.ndarray, labels_true: List[str], labels_pred: List[str], outputs_dir: str) -> Tuple[str, str]:
     df_cm = pd.DataFrame(cm, index=labels_true, columns=labels_pred)
     csv_path = os.path.join(outputs_dir, "confusion_matrix.csv")
     df_cm.to_csv(csv_path)
 
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     plt.figure(figsize=(6, 5))
     sns.heatmap(df_cm, annot=True, fmt="d", cmap="Blues")
     plt.ylabel("Verdadeiro")
@@ -101,30 +258,29 @@ def main() -> None:
     base_dir = os.path.dirname(__file__)
     dirs = ensure_dirs(base_dir)
 
-    assignments_path = os.path.join(dirs["outputs"], "cluster_assignments.csv")
-    df = load_assignments(assignments_path)
+    parser = argparse.ArgumentParser(description="Avaliar a clusterização contra label_true")
+    parser.add_argument("--input", default=None, help="Assignments (padrão: outputs/cluster_assignments.parquet, .arrow ou .csv)")
+    parser.add_argument("--chunksize", type=int, default=1_000_000, help="Linhas por chunk (memória constante)")
+    args = parser.parse_args()
 
-    # Codificar rótulos verdadeiros e preditos
-    y_true_enc, inv_true = encode_labels(df["label_true"])  # e.g., bom/alerta/critico
-    y_pred_enc = df["cluster_id"].to_numpy().astype(int)
+    assignments_path = args.input or find_dataset(dirs["outputs"], "cluster_assignments")
+    check_assignments(assignments_path)
 
-    # Mapeamento ótimo
-    y_pred_mapped, mapping = optimal_label_mapping(y_true_enc, y_pred_enc)
+    # Uma passada: só a contingência rótulo × cluster fica em memória
+    chunks = iter_dataset_chunks(assignments_path, args.chunksize, columns=["label_true", "cluster_id"])
+    table, class_names = contingency_from_chunks(chunks)
 
-    # Métricas
-    metrics = compute_metrics(y_true_enc, y_pred_mapped)
+    metrics, cm, _mapping = evaluate_contingency(table, class_names)
 
     # Matriz de confusão com rótulos legíveis
-    labels_true_sorted = [inv_true[i] for i in sorted(inv_true.keys())]
-    cm = confusion_matrix(y_true_enc, y_pred_mapped, labels=sorted(inv_true.keys()))
-    save_confusion(cm, labels_true_sorted, labels_true_sorted, dirs["outputs"]) 
+    save_confusion(cm, class_names, class_names, dirs["outputs"])
 
     # Salvar métricas
     metrics_path = os.path.join(dirs["outputs"], "eval_metrics.json")
     with open(metrics_path, "w", encoding="utf-8") as f:
         json.dump(metrics, f, ensure_ascii=False, indent=2)
 
-    print(f"[OK] Avaliação concluída. Métricas em: {metrics_path}")
+    print(f"[OK] Avaliação concluída ({int(table.sum())} linhas). Métricas em: {metrics_path}")
 
 
 if __name__ == "__main__":
@@ -1,105 +1,231 @@
 #!/usr/bin/env python3
 import argparse
 import os
-from datetime import datetime, timedelta
-from typing import Tuple
+import time
+from typing import Iterator
 
 import numpy as np
 import pandas as pd
 
+from data_sources import SENSOR_FEATURE_MAP, SENSOR_ID_SUFFIX
+from dataset_io import DatasetWriter, add_format_arg, infer_format, with_format, write_dataset
+
+LABELS = ["bom", "alerta", "critico"]
+# Proporções alvo por severidade (bom/alerta/crítico)
+PROPORTIONS = np.array([0.6, 0.25, 0.15])
+
+# Parâmetros por severidade alinhados ao domínio do projeto, na ordem de LABELS
+# Temperatura (°C): ideal 18-25, alerta 10-30, crítico fora disso
+TEMP_PARAMS = np.array([(22.0, 1.5), (27.0, 2.5), (35.0, 3.5)])
+# Umidade (%): ideal 30-70, alerta 20-80, crítico fora disso
+HUM_PARAMS = np.array([(55.0, 7.0), (75.0, 6.0), (15.0, 8.0)])
+# Vibração digital (0/1): baixa incidência em bom, maior em alerta/crítico
+VIB_P = np.array([0.03, 0.15, 0.45])
+# Luminosidade analógica (0-4095): ideal 300-3500; alerta nas bordas; crítico fora
+LUM_PARAMS = np.array([(1800.0, 500.0), (3800.0, 300.0), (4200.0, 250.0)])
+
+FEATURE_COLS = ["temperatura_c", "umidade_pct", "vibracao_digital", "luminosidade_analogica"]
+FAULT_LABEL = "falha"
+
+START_TIME = np.datetime64("2024-01-01T00:00:00", "s")
+
+
+def _clip_domain(temp: np.ndarray, hum: np.ndarray, lum: np.ndarray):
+    # Recortes de domínio
+    return np.clip(temp, -20, 80), np.clip(hum, 0, 100), np.clip(lum, 0, 4095).astype(np.int64)
+
 
 def build_synthetic_dataset(n_samples: int, random_state: int) -> pd.DataFrame:
+    """Dataset pequeno de um dispositivo, com as proporções exatas por severidade, embaralhado."""
     rng = np.random.default_rng(random_state)
 
-    # Proporções alvo por severidade (bom/alerta/crítico)
-    proportions = np.array([0.6, 0.25, 0.15])
-    counts = (proportions * n_samples).astype(int)
+    counts = (PROPORTIONS * n_samples).astype(int)
     counts[0] += n_samples - counts.sum()  # ajustar total
 
-    # Parâmetros por severidade alinhados ao domínio do projeto
-    # Temperatura (°C): ideal 18-25, alerta 10-30, crítico fora disso
-    temp_params = {
-        "bom": (22.0, 1.5),
-        "alerta": (27.0, 2.5),
-        "critico": (35.0, 3.5),
-    }
-    # Umidade (%): ideal 30-70, alerta 20-80, crítico fora disso
-    hum_params = {
-        "bom": (55.0, 7.0),
-        "alerta": (75.0, 6.0),
-        "critico": (15.0, 8.0),
-    }
-    # Vibração digital (0/1): baixa incidência em bom, maior em alerta/crítico
-    vib_p = {
-        "bom": 0.03,
-        "alerta": 0.15,
-        "critico": 0.45,
-    }
-    # Luminosidade analógica (0-4095): ideal 300-3500; alerta nas bordas; crítico fora
-    lum_params = {
-        "bom": (1800.0, 500.0),
-        "alerta": (3800.0, 300.0),
-        "critico": (4200.0, 250.0),
-    }
-
-    labels_order = ["bom", "alerta", "critico"]
-    parts = []
-
-    for label, k in zip(labels_order, counts):
-        temp = rng.normal(*temp_params[label], size=k)
-        hum = rng.normal(*hum_params[label], size=k)
-        vib = rng.binomial(n=1, p=vib_p[label], size=k).astype(int)
-        lum = np.clip(rng.normal(*lum_params[label], size=k), 0, 4095).astype(int)
-
-        part = pd.DataFrame(
-            {
-                "temperatura_c": temp,
-                "umidade_pct": hum,
-                "vibracao_digital": vib,
-                "luminosidade_analogica": lum,
-                "label_true": label,
-            }
-        )
-        parts.append(part)
-
-    df = pd.concat(parts, axis=0, ignore_index=True)
+    temp, hum, vib, lum = [], [], [], []
+    for i, k in enumerate(counts):
+        temp.append(rng.normal(*TEMP_PARAMS[i], size=k))
+        hum.append(rng.normal(*HUM_PARAMS[i], size=k))
+        vib.append(rng.binomial(n=1, p=VIB_P[i], size=k).astype(int))
+        lum.append(rng.normal(*LUM_PARAMS[i], size=k))
+    labels = np.repeat(np.array(LABELS, dtype=object), counts)
 
-    # Embaralhar
-    df = df.sample(frac=1.0, random_state=random_state).reset_index(drop=True)
+    # Embaralhar (mesma permutação de df.sample(frac=1.0, random_state=random_state))
+    order = np.random.RandomState(random_state).permutation(n_samples)
+    temp, hum, lum = _clip_domain(np.concatenate(temp)[order], np.concatenate(hum)[order], np.concatenate(lum)[order])
 
     # Timestamp incremental (minutos)
-    start_time = datetime(2024, 1, 1, 0, 0, 0)
-    df.insert(
-        0,
-        "timestamp",
-        [start_time + timedelta(minutes=i) for i in range(len(df))],
+    return pd.DataFrame(
+        {
+            "timestamp": START_TIME + np.arange(n_samples) * np.timedelta64(1, "m"),
+            "temperatura_c": temp,
+            "umidade_pct": hum,
+            "vibracao_digital": np.concatenate(vib)[order],
+            "luminosidade_analogica": lum,
+            "label_true": labels[order],
+        }
     )
 
-    # Recortes de domínio
-    df["temperatura_c"] = df["temperatura_c"].clip(-20, 80)
-    df["umidade_pct"] = df["umidade_pct"].clip(0, 100)
 
-    return df
+def device_ids(n_devices: int) -> list:
+    return [f"ESP32_{i + 1:03d}" for i in range(n_devices)]
+
+
+def iter_synthetic_chunks(
+    n_samples: int,
+    random_state: int = 42,
+    chunk_rows: int = 1_000_000,
+    n_devices: int = 1,
+    interval_s: float = 60.0,
+    drift: float = 0.0,
+    missing_rate: float = 0.0,
+    fault_rate: float = 0.0,
+    layout: str = "wide",
+) -> Iterator[pd.DataFrame]:
+    """
+    Gera `n_samples` linhas largas (instantes × dispositivos) em chunks de `chunk_rows`.
+
+    Cada instante tem uma linha por dispositivo; a severidade é sorteada por linha
+    com `PROPORTIONS`. Efeitos opcionais:
+    - `drift`: cada dispositivo recebe uma deriva de temperatura (°C/dia) e umidade
+      (2× em %/dia) sorteada com desvio `drift`
+    - `missing_rate`: fração de amostras perdidas (linha inteira no layout largo,
+      leitura individual no longo)
+    - `fault_rate`: fração de linhas com um sensor em falha — DHT22 travado no valor
+      padrão do firmware (25 °C / 60 %), vibração presa em 1 ou LDR em 0/4095;
+      no largo `label_true` vira "falha", no longo a leitura sai com `quality = 'error'`
+
+    `layout="long"` emite o formato de `sensor_readings` (sensor_id, timestamp,
+    sensor_value, quality), com os sensor_id de initial_data.sql. Mesma semente e
+    mesmo `chunk_rows` → mesmos dados.
+    """
+    if layout not in ("wide", "long"):
+        raise ValueError(f"Layout inválido: {layout}. Use 'wide' ou 'long'")
+    devices = device_ids(n_devices)
+    sensor_types = list(SENSOR_FEATURE_MAP)
+    sensor_ids = [f"{dev}_{SENSOR_ID_SUFFIX[t]}" for dev in devices for t in sensor_types]
+    step = np.timedelta64(int(round(interval_s * 1000)), "ms")
+
+    rng0 = np.random.default_rng(random_state)
+    drift_temp = rng0.normal(0.0, drift, size=n_devices) if drift else np.zeros(n_devices)
+    drift_hum = rng0.normal(0.0, 2.0 * drift, size=n_devices) if drift else np.zeros(n_devices)
+
+    for chunk_index, start in enumerate(range(0, n_samples, chunk_rows)):
+        rng = np.random.default_rng([random_state, chunk_index])
+        rows = np.arange(start, min(start + chunk_rows, n_samples))
+        size = len(rows)
+        instant, dev = np.divmod(rows, n_devices)
+
+        label_idx = rng.choice(len(LABELS), size=size, p=PROPORTIONS)
+        temp = rng.normal(TEMP_PARAMS[label_idx, 0], TEMP_PARAMS[label_idx, 1])
+        hum = rng.normal(HUM_PARAMS[label_idx, 0], HUM_PARAMS[label_idx, 1])
+        vib = (rng.random(size) < VIB_P[label_idx]).astype(np.int64)
+        lum = rng.normal(LUM_PARAMS[label_idx, 0], LUM_PARAMS[label_idx, 1])
+        if drift:
+            days = instant * (interval_s / 86400.0)
+            temp += drift_temp[dev] * days
+            hum += drift_hum[dev] * days
+        temp, hum, lum = _clip_domain(temp, hum, lum)
+        values = np.column_stack([temp, hum, vib, lum])
+
+        faulty = np.zeros((size, 4), dtype=bool)
+        if fault_rate:
+            rows_f = np.flatnonzero(rng.random(size) < fault_rate)
+            kind = rng.integers(0, 3, size=len(rows_f))
+            dht = rows_f[kind == 0]
+            values[dht, 0], values[dht, 1] = 25.0, 60.0
+            faulty[dht, :2] = True
+            stuck = rows_f[kind == 1]
+            values[stuck, 2] = 1
+            faulty[stuck, 2] = True
+            ldr = rows_f[kind == 2]
+            values[ldr, 3] = rng.choice([0, 4095], size=len(ldr))
+            faulty[ldr, 3] = True
+
+        timestamps = START_TIME + instant * step
+        if layout == "wide":
+            keep = rng.random(size) >= missing_rate if missing_rate else slice(None)
+            label_codes = np.where(faulty.any(axis=1), len(LABELS), label_idx) if fault_rate else label_idx
+            labels = pd.Categorical.from_codes(label_codes, categories=LABELS + ([FAULT_LABEL] if fault_rate else []))
+            df = pd.DataFrame(values[keep], columns=FEATURE_COLS)
+            df.insert(0, "timestamp", timestamps[keep])
+            if n_devices > 1:
+                df.insert(1, "device_id", pd.Categorical.from_codes(dev[keep], categories=devices))
+            df["label_true"] = labels[keep]
+            yield df
+        else:
+            # Uma linha por sensor, as 4 leituras de cada instante/dispositivo lado a lado
+            codes = dev[:, None] * len(sensor_types) + np.arange(len(sensor_types))
+            keep = (rng.random((size, 4)) >= missing_rate).ravel() if missing_rate else slice(None)
+            yield pd.DataFrame(
+                {
+                    "sensor_id": pd.Categorical.from_codes(codes.ravel()[keep], categories=sensor_ids),
+                    "timestamp": np.repeat(timestamps, 4)[keep],
+                    "sensor_value": values.ravel()[keep],
+                    "quality": pd.Categorical.from_codes(faulty.ravel()[keep].astype(np.int8), categories=["good", "error"]),
+                }
+            )
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Gerar dataset sintético alinhado ao ESP32")
-    parser.add_argument("--n-samples", type=int, default=3000, help="Número de amostras a gerar")
+    parser.add_argument("--n-samples", type=int, default=3000, help="Número de amostras (linhas largas, somando dispositivos)")
     parser.add_argument("--random-state", type=int, default=42, help="Semente aleatória")
     parser.add_argument(
         "--output",
         type=str,
-        default=os.path.join(os.path.dirname(__file__), "data", "sensors.csv"),
-        help="Caminho do CSV de saída",
+        default=None,
+        help="Caminho de saída (padrão: data/sensors.<formato>)",
+    )
+    add_format_arg(parser, default=None, help_text="Formato do dataset; padrão parquet ou o da extensão de --output")
+    parser.add_argument("--devices", type=int, default=1, help="Número de dispositivos (coluna device_id quando > 1)")
+    parser.add_argument("--interval-s", type=float, default=60.0, help="Intervalo entre amostras de cada dispositivo (s)")
+    parser.add_argument("--drift", type=float, default=0.0, help="Desvio da deriva por dispositivo (°C/dia; umidade 2×)")
+    parser.add_argument("--missing-rate", type=float, default=0.0, help="Fração de amostras perdidas")
+    parser.add_argument("--fault-rate", type=float, default=0.0, help="Fração de linhas com sensor em falha")
+    parser.add_argument("--layout", choices=["wide", "long"], default="wide", help="wide: colunas do modelo; long: formato de sensor_readings")
+    parser.add_argument(
+        "--chunk-rows",
+        type=int,
+        default=0,
+        help="Gerar e gravar em chunks de N linhas (0 = automático: chunks de 1M só quando há dispositivos/efeitos/layout longo)",
     )
     args = parser.parse_args()
 
-    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    fmt = args.format or (infer_format(args.output) if args.output else "parquet")
+    default_name = "sensors.csv" if args.layout == "wide" else "sensor_readings.csv"
+    output = with_format(args.output or os.path.join(os.path.dirname(__file__), "data", default_name), fmt)
 
-    df = build_synthetic_dataset(n_samples=args.n_samples, random_state=args.random_state)
-    df.to_csv(args.output, index=False)
+    t0 = time.perf_counter()
+    simple = (
+        args.chunk_rows == 0
+        and args.devices == 1
+        and args.layout == "wide"
+        and not (args.drift or args.missing_rate or args.fault_rate)
+    )
+    if simple:
+        df = build_synthetic_dataset(n_samples=args.n_samples, random_state=args.random_state)
+        write_dataset(df, output, fmt)
+        rows = len(df)
+    else:
+        chunks = iter_synthetic_chunks(
+            args.n_samples,
+            random_state=args.random_state,
+            chunk_rows=args.chunk_rows or 1_000_000,
+            n_devices=args.devices,
+            interval_s=args.interval_s,
+            drift=args.drift,
+            missing_rate=args.missing_rate,
+            fault_rate=args.fault_rate,
+            layout=args.layout,
+        )
+        with DatasetWriter(output, fmt) as writer:
+            for chunk in chunks:
+                writer.write(chunk)
+        rows = writer.rows
+    elapsed = time.perf_counter() - t0
 
-    print(f"[OK] Gerado: {args.output} — {len(df)} linhas")
+    print(f"[OK] Gerado: {output} — {rows} linhas ({rows / max(elapsed, 1e-9):,.0f} linhas/s)")
 
 
 if __name__ == "__main__":
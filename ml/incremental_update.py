@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+import argparse
+import copy
+import json
+import os
+import sys
+from typing import Any, Dict, Iterable, List, Optional
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from cluster_model import map_centroids_to_severity
+from compiled_model import COMPILED_MODEL_FILE, CompiledModel
+from data_sources import add_db_args, connect, db_filters_from_args, iter_wide_chunks
+from dataset_io import iter_dataset_chunks
+from model_registry import activate, current_version, new_version_name, publish_version, resolve_artifacts_dir, version_dir
+
+EXIT_REFIT_NEEDED = 3
+
+
+class DriftAccumulator:
+    """Compara os dados novos com o modelo de partida (congelado) ao longo dos chunks."""
+
+    def __init__(self, scaler, centroids: np.ndarray, baseline: Dict[str, Any]) -> None:
+        self.mean = scaler.mean_.copy()
+        self.scale = scaler.scale_.copy()
+        self.centroids = centroids.copy()
+        self.baseline = baseline
+        self.n = 0
+        self.sum_x = np.zeros_like(self.mean)
+        self.sum_sq_dist = 0.0
+        self.n_far = 0
+
+    def update(self, X: np.ndarray) -> None:
+        X_scaled = (X - self.mean) / self.scale
+        d2 = ((X_scaled[:, None, :] - self.centroids[None, :, :]) ** 2).sum(axis=2).min(axis=1)
+        self.n += len(X)
+        self.sum_x += X.sum(axis=0)
+        self.sum_sq_dist += float(d2.sum())
+        p95 = self.baseline.get("distance_p95")
+        if p95:
+            self.n_far += int((np.sqrt(d2) > p95).sum())
+
+    def report(self) -> Dict[str, Any]:
+        if self.n == 0:
+            return {"n_new": 0}
+        mean_shift = np.abs(self.sum_x / self.n - self.mean) / self.scale
+        report: Dict[str, Any] = {
+            "n_new": self.n,
+            "inertia_per_sample": self.sum_sq_dist / self.n,
+            "max_mean_shift_std": float(mean_shift.max()),
+        }
+        base_inertia = self.baseline.get("inertia_per_sample")
+        if base_inertia:
+            report["inertia_ratio"] = report["inertia_per_sample"] / base_inertia
+        if self.baseline.get("distance_p95"):
+            report["frac_beyond_p95"] = self.n_far / self.n
+        return report
+
+
+def is_drift(report: Dict[str, Any], max_inertia_ratio: float, max_mean_shift: float, max_frac_beyond_p95: float) -> List[str]:
+    reasons = []
+    if report.get("inertia_ratio", 0.0) > max_inertia_ratio:
+        reasons.append(f"inércia/amostra {report['inertia_ratio']:.2f}x a do treino (> {max_inertia_ratio})")
+    if report.get("max_mean_shift_std", 0.0) > max_mean_shift:
+        reasons.append(f"média deslocou {report['max_mean_shift_std']:.2f} desvios (> {max_mean_shift})")
+    if report.get("frac_beyond_p95", 0.0) > max_frac_beyond_p95:
+        reasons.append(f"{report['frac_beyond_p95']:.1%} dos pontos além do p95 de distância do treino (> {max_frac_beyond_p95:.0%})")
+    return reasons
+
+
+def minibatch_update(centroids: np.ndarray, counts: np.ndarray, X_scaled: np.ndarray) -> None:
+    """
+    Atualiza centróides in-place com a regra do MiniBatchKMeans.partial_fit:
+    cada centróide anda em direção à média dos pontos atribuídos com taxa
+    1/contagem acumulada, então o histórico pesa pelo número de leituras já vistas.
+    """
+    labels = ((X_scaled[:, None, :] - centroids[None, :, :]) ** 2).sum(axis=2).argmin(axis=1)
+    batch_counts = np.bincount(labels, minlength=len(centroids))
+    sums = np.zeros_like(centroids)
+    np.add.at(sums, labels, X_scaled)
+    seen = batch_counts > 0
+    counts[seen] += batch_counts[seen]
+    centroids[seen] += (sums[seen] - batch_counts[seen, None] * centroids[seen]) / counts[seen, None]
+
+
+def load_current(artifacts_dir: str):
+    artifacts_dir = resolve_artifacts_dir(artifacts_dir)
+    scaler = joblib.load(os.path.join(artifacts_dir, "scaler.pkl"))
+    model = joblib.load(os.path.join(artifacts_dir, "kmeans.pkl"))
+    with open(os.path.join(artifacts_dir, "metadata.json"), "r", encoding="utf-8") as f:
+        metadata = json.load(f)
+    return scaler, model, metadata
+
+
+def run_incremental_update(
+    input_csv: Optional[str],
+    artifacts_dir: str,
+    chunksize: int = 100_000,
+    max_inertia_ratio: float = 1.5,
+    max_mean_shift: float = 0.5,
+    max_frac_beyond_p95: float = 0.15,
+    chunks: Optional[Iterable[pd.DataFrame]] = None,
+) -> Dict[str, Any]:
+    """`chunks` substitui a leitura de `input_csv` (ex.: chunks largos vindos do banco)."""
+    scaler, model, metadata = load_current(artifacts_dir)
+    feature_cols: List[str] = metadata["feature_cols"]
+    old_severity = {int(k): v for k, v in metadata["severity_map"].items()}
+    training = metadata.get("training", {})
+    k = model.cluster_centers_.shape[0]
+
+    if "cluster_counts" in training:
+        counts = np.asarray(training["cluster_counts"], dtype=np.float64)
+    else:
+        # Artefatos antigos não guardam o tamanho dos clusters: divide o histórico igualmente
+        counts = np.full(k, float(scaler.n_samples_seen_) / k)
+        print("[WARN] metadata sem 'training.cluster_counts'; assumindo clusters de mesmo tamanho", file=sys.stderr)
+    if "inertia_per_sample" not in training:
+        print("[WARN] metadata sem estatísticas de treino; drift avaliado só pelo deslocamento das médias", file=sys.stderr)
+
+    drift = DriftAccumulator(scaler, model.cluster_centers_, training)
+    new_scaler = copy.deepcopy(scaler)
+    # Centróides mantidos na escala original; a padronização muda a cada partial_fit do scaler
+    centroids_raw = model.cluster_centers_ * scaler.scale_ + scaler.mean_
+
+    if chunks is None:
+        chunks = iter_dataset_chunks(input_csv, chunksize, columns=feature_cols)
+    for chunk in chunks:
+        X = chunk[feature_cols].to_numpy(dtype=np.float64)
+        drift.update(X)
+        new_scaler.partial_fit(X)
+        centroids_scaled = (centroids_raw - new_scaler.mean_) / new_scaler.scale_
+        minibatch_update(centroids_scaled, counts, new_scaler.transform(X))
+        centroids_raw = centroids_scaled * new_scaler.scale_ + new_scaler.mean_
+
+    centroids_scaled = (centroids_raw - new_scaler.mean_) / new_scaler.scale_
+    new_severity = map_centroids_to_severity(centroids_scaled, feature_cols)
+    remapped = {cid: [old_severity.get(cid), sev] for cid, sev in new_severity.items() if old_severity.get(cid) != sev}
+
+    report = drift.report()
+    reasons = is_drift(report, max_inertia_ratio, max_mean_shift, max_frac_beyond_p95)
+
+    new_model = copy.deepcopy(model)
+    new_model.cluster_centers_ = centroids_scaled
+
+    return {
+        "scaler": new_scaler,
+        "model": new_model,
+        "feature_cols": feature_cols,
+        "severity_map": new_severity,
+        "severity_remapped": remapped,
+        "cluster_counts": counts,
+        "drift": report,
+        "drift_reasons": reasons,
+        "metadata": metadata,
+    }
+
+
+def save_version(update: Dict[str, Any], artifacts_dir: str, version: Optional[str] = None) -> str:
+    """Publica a atualização como versão do registro (sem ativar) e devolve o nome."""
+    parent = update["metadata"].get("version", "inicial")
+    version = version or new_version_name("incr")
+    scaler, model = update["scaler"], update["model"]
+
+    metadata = dict(update["metadata"])
+    training = dict(metadata.get("training", {}))
+    training["n_samples"] = int(scaler.n_samples_seen_)
+    training["cluster_counts"] = [int(round(c)) for c in update["cluster_counts"]]
+    if "inertia_per_sample" not in training and "inertia_per_sample" in update["drift"]:
+        # Sem referência do treino: a inércia do primeiro lote incremental vira a referência
+        training["inertia_per_sample"] = update["drift"]["inertia_per_sample"]
+    metadata.update(
+        {
+            "version": version,
+            "parent_version": parent,
+            "update": "incremental",
+            "severity_map": {int(k): v for k, v in update["severity_map"].items()},
+            "severity_remapped": {str(k): v for k, v in update["severity_remapped"].items()},
+            "drift": update["drift"],
+            "training": training,
+        }
+    )
+
+    def write_files(out_dir: str) -> None:
+        joblib.dump(scaler, os.path.join(out_dir, "scaler.pkl"))
+        joblib.dump(model, os.path.join(out_dir, "kmeans.pkl"))
+        CompiledModel.from_estimators(scaler, model, update["feature_cols"], update["severity_map"]).save(
+            os.path.join(out_dir, COMPILED_MODEL_FILE)
+        )
+        with open(os.path.join(out_dir, "metadata.json"), "w", encoding="utf-8") as f:
+            json.dump(metadata, f, ensure_ascii=False, indent=2)
+
+    return publish_version(artifacts_dir, write_files, version=version, parent_version=current_version(artifacts_dir) or parent)
+
+
+def promote(version: str, artifacts_dir: str) -> None:
+    # Troca atômica do ponteiro CURRENT; consumidores com ModelHandle passam a usar a versão sem reiniciar
+    activate(artifacts_dir, version)
+
+
+def main() -> None:
+    base_dir = os.path.dirname(__file__)
+    parser = argparse.ArgumentParser(description="Atualização incremental do KMeans com dados novos")
+    parser.add_argument("--input", default=None, help="Leituras novas em CSV, Parquet ou Arrow (colunas do modelo)")
+    parser.add_argument("--artifacts", default=os.path.join(base_dir, "artifacts"), help="Diretório dos artefatos atuais")
+    parser.add_argument("--chunksize", type=int, default=100_000, help="Linhas por chunk")
+    parser.add_argument("--max-inertia-ratio", type=float, default=1.5, help="Drift: inércia/amostra nova vs treino")
+    parser.add_argument("--max-mean-shift", type=float, default=0.5, help="Drift: deslocamento máximo da média (em desvios)")
+    parser.add_argument("--max-frac-beyond-p95", type=float, default=0.15, help="Drift: fração máxima de pontos além do p95 do treino")
+    parser.add_argument("--promote", action="store_true", help="Tornar a nova versão a atual (artifacts/)")
+    parser.add_argument("--force", action="store_true", help="Salvar mesmo com drift detectado")
+    add_db_args(parser)
+    args = parser.parse_args()
+    if bool(args.input) == bool(args.db):
+        parser.error("informe --input ou --db (com --since para pegar só as leituras novas)")
+
+    conn = connect(args.db) if args.db else None
+    try:
+        chunks = None
+        if conn is not None:
+            chunks = iter_wide_chunks(conn, bucket=args.bucket, batch_rows=args.db_batch_rows, **db_filters_from_args(args))
+        update = run_incremental_update(
+            args.input,
+            args.artifacts,
+            chunksize=args.chunksize,
+            max_inertia_ratio=args.max_inertia_ratio,
+            max_mean_shift=args.max_mean_shift,
+            max_frac_beyond_p95=args.max_frac_beyond_p95,
+            chunks=chunks,
+        )
+    finally:
+        if conn is not None:
+            conn.close()
+
+    print(f"[INFO] Drift: {json.dumps(update['drift'], ensure_ascii=False)}")
+    if update["severity_remapped"]:
+        print(f"[WARN] Ordem de risco dos clusters mudou: {update['severity_remapped']}")
+    if update["drift_reasons"]:
+        print("[WARN] Drift detectado: " + "; ".join(update["drift_reasons"]))
+        if not args.force:
+            print("[WARN] Refit completo recomendado: python cluster_model.py (use --force para salvar mesmo assim)")
+            sys.exit(EXIT_REFIT_NEEDED)
+
+    version = save_version(update, args.artifacts)
+    print(f"[OK] Nova versão salva em: {version_dir(args.artifacts, version)}")
+    if args.promote:
+        promote(version, args.artifacts)
+        print(f"[OK] Versão {version} promovida (artifacts/CURRENT)")
+
+
+if __name__ == "__main__":
+    main()
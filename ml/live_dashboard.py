@@ -1,13 +1,16 @@
 #!/usr/bin/env python3
 import os
-import time
-from datetime import datetime
+import sys
 
-import pandas as pd
-import plotly.express as px
 import streamlit as st
 
+from log_tail import CsvTailReader
+
 BASE_DIR = os.path.dirname(__file__)
+# Camada de gráficos compartilhada com data/dashboard.py
+sys.path.insert(0, os.path.join(BASE_DIR, "..", "data"))
+from chart_render import category_traces, drawn_points, reduction_note, sync_figure  # noqa: E402
+
 LOG_PATH = os.path.join(BASE_DIR, "outputs", "serial_predictions.csv")
 
 # Colunas originais (sem ML)
@@ -20,80 +23,83 @@ SENSOR_COLS = [
 ]
 # Colunas de predição
 PRED_COLS = ["severity", "cluster_id"]
+SEVERITY_ORDER = ["bom", "alerta", "critico", "critico+", "critico++"]
 
 st.set_page_config(page_title="Predições em Tempo Real", layout="wide")
 st.title("Predições em Tempo Real - Clusterização (KMeans)")
 
-placeholder_meta = st.empty()
-col1_area = st.empty()
-col2_area = st.empty()
-plot_area = st.empty()
-
-def load_data(path: str) -> pd.DataFrame:
-    if not os.path.exists(path):
-        return pd.DataFrame()
-    try:
-        df = pd.read_csv(path)
-    except Exception:
-        return pd.DataFrame()
-    # Tipagem e ordenação
-    if "ts" in df.columns:
-        df["ts_dt"] = pd.to_datetime(df["ts"], unit="ms", errors="coerce")
-    else:
-        df["ts_dt"] = pd.to_datetime("now")
-    return df
-
 refresh_sec = st.sidebar.slider("Refresh (s)", 0.5, 5.0, 1.0)
-max_points = st.sidebar.number_input("Máx. pontos no gráfico", min_value=50, max_value=5000, value=1000, step=50)
-
-last_size = 0
-
-while True:
-    df = load_data(LOG_PATH)
-
-    if df.empty:
-        placeholder_meta.info("Aguardando dados... Rode o stream_serial_predict.py para gerar serial_predictions.csv")
-        time.sleep(refresh_sec)
-        continue
-
-    # Limitar pontos
-    if len(df) > max_points:
-        df_view = df.tail(int(max_points)).copy()
-    else:
-        df_view = df.copy()
+max_points = st.sidebar.number_input(
+    "Janela do gráfico (linhas recentes)", min_value=50, max_value=200_000, value=1000, step=50
+)
+
+# Leitor incremental guardado na sessão: um rerun do Streamlit (ex.: mudar o slider) não relê o log
+if "tail_reader" not in st.session_state:
+    st.session_state["tail_reader"] = CsvTailReader(LOG_PATH, max_points=int(max_points))
+reader: CsvTailReader = st.session_state["tail_reader"]
+reader.resize(int(max_points))
+
+
+@st.fragment(run_every=refresh_sec)
+def live_view() -> None:
+    # Só as linhas anexadas desde o último refresh são lidas e parseadas
+    new_rows = reader.poll()
+
+    if reader.total == 0:
+        st.info("Aguardando dados... Rode o stream_serial_predict.py para gerar serial_predictions.csv")
+        return
+
+    # Janela recente (ring buffer); a figura só é recalculada quando chegam linhas
+    cached = st.session_state.get("live_view")
+    if new_rows or cached is None or cached["max_points"] != reader.max_points:
+        df_view = reader.frame()
+        fig = cached["fig"] if cached else None
+        if "severity" in df_view.columns:
+            traces = category_traces(df_view["ts_dt"].to_numpy(), df_view["severity"], order=SEVERITY_ORDER)
+            fig = sync_figure(
+                fig,
+                traces,
+                uirevision="severidade",
+                title="Severidade ao longo do tempo",
+                height=420,
+                xaxis_title="ts_dt",
+                yaxis=dict(title="severity", type="category"),
+            )
+        cached = {"df": df_view, "fig": fig, "max_points": reader.max_points}
+        st.session_state["live_view"] = cached
+    df_view, fig = cached["df"], cached["fig"]
 
     # Apenas colunas originais dos sensores para exibição principal + predições
     sensor_cols_present = [c for c in SENSOR_COLS if c in df_view.columns]
     pred_cols_present = [c for c in PRED_COLS if c in df_view.columns]
     display_cols = sensor_cols_present + pred_cols_present
-    df_display = df_view[display_cols].copy()
-
-    # Métricas
-    total = len(df)
-    last_row = df.iloc[-1]
-    severity_counts = df["severity"].value_counts().to_dict() if "severity" in df.columns else {}
-
-    with placeholder_meta.container():
-        st.markdown(f"**Total de leituras**: {total}")
-        last_sev = last_row.get("severity", "n/a")
-        last_cluster = last_row.get("cluster_id", "n/a")
-        st.markdown(f"**Última severidade**: {last_sev} | **Cluster**: {last_cluster} | **Horário**: {last_row.get('ts_dt')}")
-        if severity_counts:
-            st.write({k: int(v) for k, v in severity_counts.items()})
-
-    # Gráfico temporal da severidade
-    if "severity" in df_view.columns and "ts_dt" in df_view.columns:
-        df_view["count"] = 1
-        fig = px.scatter(df_view, x="ts_dt", y="severity", color="severity", title="Severidade ao longo do tempo", height=420)
-        plot_area.plotly_chart(fig, use_container_width=True, key=f"plot-{int(time.time()*1000)}")
+    df_display = df_view[display_cols]
+
+    # Métricas acumuladas pelo leitor (sem value_counts sobre o log inteiro)
+    total = reader.total
+    last_row = df_view.iloc[-1]
+    severity_counts = dict(reader.counts)
+
+    st.markdown(f"**Total de leituras**: {total}")
+    last_sev = last_row.get("severity", "n/a")
+    last_cluster = last_row.get("cluster_id", "n/a")
+    st.markdown(f"**Última severidade**: {last_sev} | **Cluster**: {last_cluster} | **Horário**: {last_row.get('ts_dt')}")
+    if severity_counts:
+        st.write({k: int(v) for k, v in severity_counts.items()})
 
     # Duas colunas: tabela sensores+predições + resumo último com predição
-    with col1_area.container():
-        st.subheader("Janela recente (sensores + predição)")
-        st.dataframe(df_display.tail(50))
-    with col2_area.container():
-        st.subheader("Último registro")
-        last_summary = {c: last_row.get(c, None) for c in display_cols}
-        st.json(last_summary)
-
-    time.sleep(refresh_sec)
+    st.subheader("Janela recente (sensores + predição)")
+    st.dataframe(df_display.tail(50))
+    st.subheader("Último registro")
+    last_summary = {c: last_row.get(c, None) for c in display_cols}
+    st.json(last_summary)
+
+    # Gráfico temporal da severidade: chave fixa + uirevision mantêm zoom/pan entre refreshes
+    if fig is not None:
+        note = reduction_note(len(df_view), drawn_points(fig))
+        if note:
+            st.caption(note)
+        st.plotly_chart(fig, use_container_width=True, key="severity-plot")
+
+
+live_view()
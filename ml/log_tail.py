@@ -0,0 +1,193 @@
+import glob
+import io
+import os
+import re
+from collections import Counter, deque
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+
+class CsvTailReader:
+    """
+    Acompanha um CSV que cresce por append (log do `PredictionLogWriter`), como `tail -f`.
+
+    Guarda o offset em bytes e, a cada `poll()`, lê só o que foi anexado desde a
+    última chamada (no máximo `max_read_bytes` por vez, para a primeira leitura
+    de um log grande não travar a tela). Uma linha ainda sem `\\n` fica para o
+    próximo poll. Mantém:
+
+    - `counts`: contagem acumulada por severidade (Counter)
+    - `total`: leituras vistas
+    - `recent`: as últimas `max_points` linhas (deque com tamanho fixo)
+
+    Rotação (o arquivo ativo foi renomeado para um segmento
+    `<stem>.<data>[-n].csv`, nomes do `PredictionLogWriter`): o restante do
+    arquivo antigo é lido pelo descritor ainda aberto, depois os segmentos
+    rotacionados depois dele e por fim o novo arquivo ativo a partir do
+    cabeçalho; as contagens continuam. Recriação (outro inode, mas o antigo
+    não está entre os segmentos: apagado e criado de novo, como no
+    `simulate_live.py`) e truncamento (mesmo inode, tamanho menor que o
+    offset): o log foi reescrito, então o estado é zerado e a leitura recomeça
+    do início do arquivo novo.
+    """
+
+    def __init__(self, path: str, max_points: int = 1000, max_read_bytes: int = 8 << 20) -> None:
+        self.path = path
+        self.max_read_bytes = max_read_bytes
+        self.recent: deque = deque(maxlen=max(1, int(max_points)))
+        self.counts: Counter = Counter()
+        self.total = 0
+        self.columns: Optional[List[str]] = None
+        self.last_row: Dict[str, Any] = {}
+        self.rotations = 0
+        self.truncations = 0
+        self.recreations = 0
+        self._fh = None
+        self._inode = None
+        self._offset = 0
+        self._partial = b""
+
+    @property
+    def max_points(self) -> int:
+        return self.recent.maxlen
+
+    def resize(self, max_points: int) -> None:
+        max_points = max(1, int(max_points))
+        if max_points != self.recent.maxlen:
+            self.recent = deque(self.recent, maxlen=max_points)
+
+    def _open(self, path: Optional[str] = None) -> bool:
+        try:
+            fh = open(path or self.path, "rb")
+        except FileNotFoundError:
+            return False
+        self._fh = fh
+        self._inode = os.fstat(fh.fileno()).st_ino
+        self._offset = 0
+        self._partial = b""
+        self.columns = None
+        return True
+
+    def _close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def reset(self) -> None:
+        self._close()
+        self.recent.clear()
+        self.counts.clear()
+        self.total = 0
+        self.last_row = {}
+
+    def _read_new(self, budget: int) -> bytes:
+        self._fh.seek(self._offset)
+        data = self._fh.read(budget)
+        self._offset += len(data)
+        return data
+
+    def _drain(self) -> int:
+        """Lê o arquivo aberto até o EOF (inclusive a última linha sem `\\n`) e o fecha."""
+        added = 0
+        while True:
+            data = self._read_new(self.max_read_bytes)
+            added += self._consume(data, final=not data)
+            if not data:
+                break
+        self._close()
+        return added
+
+    def _segments_after(self, inode: int) -> Optional[List[str]]:
+        """Segmentos rotacionados depois do que tem `inode`, em ordem de rotação; None se ele não é um segmento."""
+        stem, ext = os.path.splitext(self.path)
+        pattern = re.compile(re.escape(os.path.basename(stem)) + r"\.(\d{8}-\d{6})(?:-(\d+))?" + re.escape(ext) + "$")
+        segments = []
+        for path in glob.glob(glob.escape(stem) + ".*" + ext):
+            match = pattern.match(os.path.basename(path))
+            if match:
+                try:
+                    segments.append(((match.group(1), int(match.group(2) or 0)), os.stat(path).st_ino, path))
+                except FileNotFoundError:
+                    continue
+        segments.sort()
+        inodes = [ino for _key, ino, _path in segments]
+        if inode not in inodes:
+            return None
+        return [path for _key, _ino, path in segments[inodes.index(inode) + 1 :]]
+
+    def poll(self) -> int:
+        """Lê as linhas novas e devolve quantas foram incorporadas."""
+        if self._fh is None and not self._open():
+            return 0
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            st = None
+
+        added = 0
+        if st is None or st.st_ino != self._inode:
+            segments = self._segments_after(self._inode)
+            if segments is None:
+                # Apagado/recriado (não rotacionado): log novo, contagens do zero
+                self.recreations += 1
+                self.reset()
+            else:
+                # Rotacionado: termina o arquivo antigo (até o EOF), os segmentos
+                # rotacionados entre dois polls e só então passa para o novo
+                added += self._drain()
+                self.rotations += 1
+                for segment in segments:
+                    if self._open(segment):
+                        added += self._drain()
+                        self.rotations += 1
+            if st is None or not self._open():
+                return added
+        elif st.st_size < self._offset:
+            self.truncations += 1
+            self.reset()
+            if not self._open():
+                return 0
+
+        added += self._consume(self._read_new(self.max_read_bytes))
+        return added
+
+    def _consume(self, data: bytes, final: bool = False) -> int:
+        data = self._partial + data
+        cut = len(data) if final else data.rfind(b"\n") + 1
+        self._partial = data[cut:]
+        data = data[:cut]
+        if self.columns is None:
+            newline = data.find(b"\n")
+            if newline < 0:
+                # Cabeçalho ainda incompleto
+                self._partial = data + self._partial
+                return 0
+            self.columns = data[:newline].decode("utf-8").strip().split(",")
+            data = data[newline + 1 :]
+        if not data.strip():
+            return 0
+
+        chunk = pd.read_csv(io.BytesIO(data), names=self.columns, header=None, on_bad_lines="skip")
+        if chunk.empty:
+            return 0
+        if "severity" in chunk.columns:
+            self.counts.update(chunk["severity"].astype(str).value_counts().to_dict())
+        self.total += len(chunk)
+        # Só as últimas max_points linhas do chunk entram no buffer
+        tail = chunk.tail(self.recent.maxlen)
+        self.recent.extend(tail.itertuples(index=False, name=None))
+        self.last_row = dict(zip(self.columns, self.recent[-1]))
+        return len(chunk)
+
+    def frame(self) -> pd.DataFrame:
+        """Janela recente como DataFrame (custo proporcional a `max_points`, não ao log)."""
+        df = pd.DataFrame(list(self.recent), columns=self.columns or [])
+        if "ts" in df.columns:
+            df["ts_dt"] = pd.to_datetime(df["ts"], unit="ms", errors="coerce")
+        else:
+            df["ts_dt"] = pd.Timestamp.now()
+        return df
+
+    def close(self) -> None:
+        self._close()
@@ -0,0 +1,250 @@
+import csv
+import os
+import time
+from datetime import date, datetime
+from typing import Any, List, Optional, Sequence
+
+FORMAT_EXTENSIONS = {
+    "csv": ".csv",
+    "parquet": ".parquet",
+    "arrow": ".arrow",
+}
+
+
+class PredictionLogWriter:
+    """
+    Escritor de log de predições que mantém o arquivo aberto.
+
+    As linhas ficam em buffer e são gravadas quando o buffer atinge `flush_rows`,
+    quando passa `flush_interval` segundos desde o último flush ou no `close()`.
+    O arquivo ativo é rotacionado por tamanho (`rotate_bytes`) e/ou por data
+    (`rotate_daily`); o arquivo rotacionado recebe o horário de abertura no nome
+    e o caminho ativo continua o mesmo (o dashboard segue lendo o mesmo arquivo).
+
+    Em `parquet`/`arrow` cada flush vira um row group/record batch; o segmento só
+    fica legível por outros processos depois de rotacionado ou fechado.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        columns: Sequence[str],
+        fmt: str = "csv",
+        flush_rows: int = 256,
+        flush_interval: float = 1.0,
+        rotate_bytes: Optional[int] = None,
+        rotate_daily: bool = False,
+        overwrite: bool = False,
+    ) -> None:
+        if fmt not in FORMAT_EXTENSIONS:
+            raise ValueError(f"Formato de log inválido: {fmt}. Use um de {sorted(FORMAT_EXTENSIONS)}")
+        if fmt != "csv":
+            stem, _ext = os.path.splitext(path)
+            path = stem + FORMAT_EXTENSIONS[fmt]
+
+        self.path = path
+        self.columns: List[str] = list(columns)
+        self.fmt = fmt
+        self.flush_rows = max(1, int(flush_rows))
+        self.flush_interval = float(flush_interval)
+        self.rotate_bytes = rotate_bytes
+        self.rotate_daily = rotate_daily
+
+        self._buffer: List[Sequence[Any]] = []
+        self._text_rows = 0
+        self._last_flush = time.monotonic()
+        self._fh = None
+        self._csv = None
+        self._arrow_writer = None
+        self._arrow_sink = None
+        self._arrow_schema = None
+        self._opened_at = datetime.now()
+        self._opened_date: date = self._opened_at.date()
+        self.rows_written = 0
+        self.flushes = 0
+
+        dir_name = os.path.dirname(self.path)
+        if dir_name:
+            os.makedirs(dir_name, exist_ok=True)
+        if overwrite and os.path.exists(self.path):
+            os.remove(self.path)
+        self._open(append=True)
+
+    def _open(self, append: bool) -> None:
+        self._opened_at = datetime.now()
+        self._opened_date = self._opened_at.date()
+        if self.fmt == "csv":
+            self._open_csv(append)
+        else:
+            # Arquivos colunares não aceitam append: um arquivo existente vira segmento
+            if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+                self._move_aside(self._existing_started_at())
+            # O writer Arrow/Parquet é criado no primeiro flush, quando o schema é conhecido
+            self._arrow_writer = None
+
+    def _open_csv(self, append: bool) -> None:
+        header = ",".join(self.columns)
+        if append and os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            with open(self.path, "r", encoding="utf-8", errors="ignore") as fh:
+                first_line = fh.readline().strip()
+            if first_line != header:
+                # Cabeçalho diferente (ex.: colunas mudaram): preserva o arquivo antigo
+                self._move_aside(self._existing_started_at())
+        is_new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self._fh = open(self.path, "a", newline="", encoding="utf-8", buffering=1 << 16)
+        # "\n" como nos demais CSVs do repositório (o dialeto padrão usa "\r\n")
+        self._csv = csv.writer(self._fh, lineterminator="\n")
+        if is_new:
+            self._csv.writerow(self.columns)
+            self._fh.flush()
+
+    def _existing_started_at(self) -> datetime:
+        return datetime.fromtimestamp(os.path.getmtime(self.path))
+
+    def _rotated_path(self, started_at: datetime) -> str:
+        stem, ext = os.path.splitext(self.path)
+        candidate = f"{stem}.{started_at.strftime('%Y%m%d-%H%M%S')}{ext}"
+        n = 1
+        while os.path.exists(candidate):
+            candidate = f"{stem}.{started_at.strftime('%Y%m%d-%H%M%S')}-{n}{ext}"
+            n += 1
+        return candidate
+
+    def _move_aside(self, started_at: datetime) -> str:
+        target = self._rotated_path(started_at)
+        os.replace(self.path, target)
+        return target
+
+    def write(self, row: Sequence[Any]) -> None:
+        if self.rotate_daily and date.today() != self._opened_date:
+            self.rotate()
+        self._buffer.append(row)
+        if len(self._buffer) >= self.flush_rows:
+            self.flush()
+        elif time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def write_many(self, rows: Sequence[Sequence[Any]]) -> None:
+        if self.rotate_daily and date.today() != self._opened_date:
+            self.rotate()
+        self._buffer.extend(rows)
+        if len(self._buffer) >= self.flush_rows or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def write_text(self, text: str, n_rows: int) -> None:
+        """
+        Grava linhas CSV já formatadas, terminadas em "\\n" (ex.: um bloco de
+        `DataFrame.to_csv`), sem passar pelo `csv.writer` linha a linha. Mesma
+        política de flush/rotação.
+        """
+        if self.fmt != "csv":
+            raise ValueError("write_text só vale para o formato csv")
+        if self.rotate_daily and date.today() != self._opened_date:
+            self.rotate()
+        if self._buffer:
+            # Mantém a ordem com o que entrou por write()/write_many()
+            self._csv.writerows(self._buffer)
+            self._text_rows += len(self._buffer)
+            self._buffer = []
+        self._fh.write(text)
+        self._text_rows += n_rows
+        if self._text_rows >= self.flush_rows or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def maybe_flush(self) -> None:
+        """Flush por tempo para períodos ociosos (sem novas linhas)."""
+        if (self._buffer or self._text_rows) and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        self._last_flush = time.monotonic()
+        if not self._buffer and not self._text_rows:
+            return
+        rows, self._buffer = self._buffer, []
+        n_rows = len(rows) + self._text_rows
+        self._text_rows = 0
+        if self.fmt == "csv":
+            self._csv.writerows(rows)
+            self._fh.flush()
+            size = self._fh.tell()
+        else:
+            size = self._write_arrow(rows)
+        self.rows_written += n_rows
+        self.flushes += 1
+        if self.rotate_bytes and size >= self.rotate_bytes:
+            self.rotate()
+
+    def _write_arrow(self, rows: List[Sequence[Any]]) -> int:
+        import pyarrow as pa
+
+        data = {col: list(values) for col, values in zip(self.columns, zip(*rows))}
+        if self._arrow_schema is None:
+            self._arrow_schema = pa.table(data).schema
+        table = pa.table(data, schema=self._arrow_schema)
+        if self._arrow_writer is None:
+            self._arrow_sink = pa.OSFile(self.path, "wb")
+            if self.fmt == "parquet":
+                import pyarrow.parquet as pq
+
+                self._arrow_writer = pq.ParquetWriter(self._arrow_sink, self._arrow_schema)
+            else:
+                self._arrow_writer = pa.ipc.new_file(self._arrow_sink, self._arrow_schema)
+        self._arrow_writer.write_table(table)
+        return self._arrow_sink.tell()
+
+    def _close_file(self) -> None:
+        if self.fmt == "csv":
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+                self._csv = None
+        elif self._arrow_writer is not None:
+            self._arrow_writer.close()
+            self._arrow_sink.close()
+            self._arrow_writer = None
+            self._arrow_sink = None
+
+    def rotate(self) -> Optional[str]:
+        self.flush()
+        started_at = self._opened_at
+        self._close_file()
+        rotated = None
+        if os.path.exists(self.path):
+            rotated = self._move_aside(started_at)
+        self._open(append=False)
+        return rotated
+
+    def close(self) -> None:
+        try:
+            self.flush()
+        finally:
+            self._close_file()
+
+    def __enter__(self) -> "PredictionLogWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def add_log_writer_args(parser) -> None:
+    """Opções de CLI compartilhadas pelos scripts que gravam log de predições."""
+    parser.add_argument("--log-format", choices=sorted(FORMAT_EXTENSIONS), default="csv", help="Formato do log")
+    parser.add_argument("--flush-rows", type=int, default=256, help="Linhas em buffer antes de gravar")
+    parser.add_argument("--flush-interval", type=float, default=1.0, help="Intervalo máximo entre gravações (s)")
+    parser.add_argument("--rotate-mb", type=float, default=None, help="Rotacionar o log ao atingir N MB")
+    parser.add_argument("--rotate-daily", action="store_true", help="Rotacionar o log na virada do dia")
+
+
+def writer_from_args(args, path: str, columns: Sequence[str], overwrite: bool = False) -> PredictionLogWriter:
+    rotate_bytes = int(args.rotate_mb * 1024 * 1024) if args.rotate_mb else None
+    return PredictionLogWriter(
+        path,
+        columns,
+        fmt=args.log_format,
+        flush_rows=args.flush_rows,
+        flush_interval=args.flush_interval,
+        rotate_bytes=rotate_bytes,
+        rotate_daily=args.rotate_daily,
+        overwrite=overwrite,
+    )
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from compiled_model import COMPILED_MODEL_FILE, CompiledModel, compile_from_pickles
+
+VERSIONS_DIR = "versions"
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+ARTIFACT_FILES = ["scaler.pkl", "kmeans.pkl", "metadata.json", COMPILED_MODEL_FILE]
+
+
+def new_version_name(prefix: str) -> str:
+    return datetime.now().strftime(f"{prefix}-%Y%m%d-%H%M%S-%f")
+
+
+def version_dir(artifacts_dir: str, version: str) -> str:
+    return os.path.join(artifacts_dir, VERSIONS_DIR, version)
+
+
+def sha256_file(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_atomic(path: str, text: str) -> None:
+    tmp = f"{path}.tmp.{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def publish_version(
+    artifacts_dir: str,
+    write_files: Callable[[str], None],
+    version: Optional[str] = None,
+    prefix: str = "fit",
+    parent_version: Optional[str] = None,
+) -> str:
+    """
+    Cria `versions/<versão>/` de forma atômica e devolve o nome da versão.
+
+    `write_files(dir)` grava os artefatos num diretório temporário; depois vêm o
+    `manifest.json` (sha256 e tamanho de cada arquivo) e um rename para o nome
+    final, então leitores nunca veem uma versão pela metade.
+    """
+    version = version or new_version_name(prefix)
+    final_dir = version_dir(artifacts_dir, version)
+    if os.path.exists(final_dir):
+        raise FileExistsError(f"Versão já existe: {final_dir}")
+    staging = os.path.join(artifacts_dir, VERSIONS_DIR, f".{version}.tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    try:
+        write_files(staging)
+        files = {
+            name: {"sha256": sha256_file(os.path.join(staging, name)), "bytes": os.path.getsize(os.path.join(staging, name))}
+            for name in sorted(os.listdir(staging))
+        }
+        manifest = {
+            "version": version,
+            "parent_version": parent_version,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "files": files,
+        }
+        with open(os.path.join(staging, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(staging, final_dir)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return version
+
+
+def read_manifest(artifacts_dir: str, version: str) -> Dict[str, Any]:
+    with open(os.path.join(version_dir(artifacts_dir, version), MANIFEST_FILE), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def verify_version(artifacts_dir: str, version: str, files: Optional[List[str]] = None) -> None:
+    """Confere o sha256 dos arquivos da versão (todos ou só `files`); ValueError se algo não bater."""
+    manifest = read_manifest(artifacts_dir, version)
+    base = version_dir(artifacts_dir, version)
+    for name in files or list(manifest["files"]):
+        expected = manifest["files"].get(name)
+        if expected is None:
+            raise ValueError(f"Arquivo {name!r} fora do manifest da versão {version}")
+        actual = sha256_file(os.path.join(base, name))
+        if actual != expected["sha256"]:
+            raise ValueError(f"Checksum inválido em {version}/{name}: {actual} != {expected['sha256']}")
+
+
+def current_version(artifacts_dir: str) -> Optional[str]:
+    try:
+        with open(os.path.join(artifacts_dir, CURRENT_FILE), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def resolve_artifacts_dir(artifacts_dir: str) -> str:
+    """Diretório da versão atual; sem `CURRENT` (artefatos antigos), o próprio `artifacts_dir`."""
+    version = current_version(artifacts_dir)
+    return version_dir(artifacts_dir, version) if version else artifacts_dir
+
+
+def activate(artifacts_dir: str, version: str, mirror: bool = True) -> None:
+    """
+    Torna `version` a atual: confere os checksums e troca o ponteiro `CURRENT`
+    com um único `os.replace`. Com `mirror`, copia os arquivos também para a raiz
+    de `artifacts/` (caminho antigo usado por scripts que não leem o registro).
+    """
+    verify_version(artifacts_dir, version)
+    base = version_dir(artifacts_dir, version)
+    _write_atomic(os.path.join(artifacts_dir, CURRENT_FILE), version + "\n")
+    if mirror:
+        for name in ARTIFACT_FILES:
+            src = os.path.join(base, name)
+            if os.path.exists(src):
+                tmp = os.path.join(artifacts_dir, f".{name}.tmp")
+                shutil.copyfile(src, tmp)
+                os.replace(tmp, os.path.join(artifacts_dir, name))
+
+
+def list_versions(artifacts_dir: str) -> List[Dict[str, Any]]:
+    root = os.path.join(artifacts_dir, VERSIONS_DIR)
+    if not os.path.isdir(root):
+        return []
+    manifests = []
+    for name in os.listdir(root):
+        if not name.startswith(".") and os.path.exists(os.path.join(root, name, MANIFEST_FILE)):
+            manifests.append(read_manifest(artifacts_dir, name))
+    return sorted(manifests, key=lambda m: (m["created_at"], m["version"]))
+
+
+def prune_versions(artifacts_dir: str, keep: int) -> List[str]:
+    """Remove as versões mais antigas, mantendo as `keep` mais novas e sempre a atual."""
+    current = current_version(artifacts_dir)
+    versions = [m["version"] for m in list_versions(artifacts_dir)]
+    removed = [v for v in versions[: max(len(versions) - keep, 0)] if v != current]
+    for version in removed:
+        shutil.rmtree(version_dir(artifacts_dir, version))
+    return removed
+
+
+def import_legacy(artifacts_dir: str, version: Optional[str] = None) -> str:
+    """Registra os artefatos soltos em `artifacts/` (formato antigo) como uma versão."""
+
+    def copy_files(out_dir: str) -> None:
+        for name in ARTIFACT_FILES:
+            src = os.path.join(artifacts_dir, name)
+            if os.path.exists(src):
+                shutil.copyfile(src, os.path.join(out_dir, name))
+
+    return publish_version(artifacts_dir, copy_files, version=version, prefix="legacy")
+
+
+def load_version_model(artifacts_dir: str, version: Optional[str]) -> CompiledModel:
+    """Modelo compilado de uma versão (checksum conferido) ou, sem versão, dos artefatos soltos."""
+    base = version_dir(artifacts_dir, version) if version else artifacts_dir
+    compiled_path = os.path.join(base, COMPILED_MODEL_FILE)
+    if version:
+        verify_version(artifacts_dir, version, [COMPILED_MODEL_FILE] if os.path.exists(compiled_path) else None)
+    if os.path.exists(compiled_path):
+        return CompiledModel.load(compiled_path)
+    return compile_from_pickles(base)
+
+
+class ModelHandle:
+    """
+    Referência trocável ao modelo atual, para quem pontua em lotes.
+
+    `get()` devolve o modelo em uso e, no máximo a cada `check_interval` s, olha o
+    `CURRENT` (um stat e, se mudou, a leitura de uma linha). Uma versão nova é
+    carregada e conferida em uma thread separada; só depois a referência é trocada,
+    então o lote em andamento termina com o modelo que pegou e nenhum lote espera
+    pelo carregamento. Versões com outras features são recusadas com aviso.
+    `check_interval=None` desliga a troca.
+    """
+
+    def __init__(self, artifacts_dir: str, check_interval: Optional[float] = 1.0, background: bool = True) -> None:
+        self.artifacts_dir = artifacts_dir
+        self.check_interval = check_interval
+        self.background = background
+        self.version = current_version(artifacts_dir)
+        self._model = load_version_model(artifacts_dir, self.version)
+        self.swaps = 0
+        self._pointer_stat = self._stat_pointer()
+        self._next_check = time.monotonic() + (check_interval or 0.0)
+        self._loading: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def feature_cols(self) -> List[str]:
+        return self._model.feature_cols
+
+    def _stat_pointer(self):
+        try:
+            st = os.stat(os.path.join(self.artifacts_dir, CURRENT_FILE))
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def get(self) -> CompiledModel:
+        if self.check_interval is not None and time.monotonic() >= self._next_check:
+            self._next_check = time.monotonic() + self.check_interval
+            self._poll()
+        return self._model
+
+    def _poll(self) -> None:
+        pointer_stat = self._stat_pointer()
+        if pointer_stat == self._pointer_stat:
+            return
+        version = current_version(self.artifacts_dir)
+        if version is None or version == self.version:
+            self._pointer_stat = pointer_stat
+            return
+        with self._lock:
+            if self._loading is not None and self._loading.is_alive():
+                return
+            self._pointer_stat = pointer_stat
+            if self.background:
+                self._loading = threading.Thread(target=self._load, args=(version,), name="model-reload", daemon=True)
+                self._loading.start()
+            else:
+                self._load(version)
+
+    def _load(self, version: str) -> None:
+        try:
+            model = load_version_model(self.artifacts_dir, version)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[WARN] Versão {version} não carregada, mantendo {self.version}: {e}", file=sys.stderr)
+            return
+        if model.feature_cols != self._model.feature_cols:
+            print(f"[WARN] Versão {version} usa outras features {model.feature_cols}; mantendo {self.version}", file=sys.stderr)
+            return
+        previous = self.version
+        # Atribuição de referência é atômica: quem já chamou get() segue com o modelo anterior
+        self._model, self.version = model, version
+        self.swaps += 1
+        print(f"[INFO] Modelo trocado: {previous} → {version}", file=sys.stderr)
+
+    def wait_reload(self, timeout: Optional[float] = None) -> None:
+        loading = self._loading
+        if loading is not None:
+            loading.join(timeout)
+
+
+def add_hot_reload_args(parser) -> None:
+    parser.add_argument(
+        "--reload-interval",
+        type=float,
+        default=1.0,
+        help="Verificar a cada N s se há nova versão em artifacts/CURRENT e trocar o modelo sem parar (0 = desligado)",
+    )
+
+
+def main() -> None:
+    base_dir = os.path.dirname(__file__)
+    parser = argparse.ArgumentParser(description="Registro local de versões do modelo")
+    parser.add_argument("--artifacts", default=os.path.join(base_dir, "artifacts"), help="Diretório dos artefatos")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="Listar versões (* = atual)")
+    p_activate = sub.add_parser("activate", help="Tornar uma versão a atual (também serve de rollback)")
+    p_activate.add_argument("version")
+    p_verify = sub.add_parser("verify", help="Conferir checksums (padrão: versão atual)")
+    p_verify.add_argument("version", nargs="?")
+    p_import = sub.add_parser("import-legacy", help="Registrar os artefatos soltos de artifacts/ como versão e ativá-la")
+    p_import.add_argument("--version", default=None)
+    p_prune = sub.add_parser("prune", help="Apagar versões antigas (a atual nunca é apagada)")
+    p_prune.add_argument("--keep", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == "list":
+        current = current_version(args.artifacts)
+        for m in list_versions(args.artifacts):
+            mark = "*" if m["version"] == current else " "
+            print(f"{mark} {m['version']}\t{m['created_at']}\tparent={m.get('parent_version')}")
+    elif args.command == "activate":
+        activate(args.artifacts, args.version)
+        print(f"[OK] Versão atual: {args.version}")
+    elif args.command == "verify":
+        version = args.version or current_version(args.artifacts)
+        if version is None:
+            parser.error("não há versão atual (artifacts/CURRENT); rode import-legacy")
+        verify_version(args.artifacts, version)
+        print(f"[OK] Checksums conferem: {version}")
+    elif args.command == "import-legacy":
+        version = import_legacy(args.artifacts, args.version)
+        activate(args.artifacts, version, mirror=False)
+        print(f"[OK] Artefatos registrados como {version} (atual)")
+    else:
+        removed = prune_versions(args.artifacts, args.keep)
+        print(f"[OK] {len(removed)} versão(ões) removida(s)")
+
+
+if __name__ == "__main__":
+    main()
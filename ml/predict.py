@@ -1,60 +1,150 @@
 #!/usr/bin/env python3
 import argparse
-import json
 import os
-from typing import Dict, List
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, Optional
 
-import joblib
-import numpy as np
 import pandas as pd
 
+from compiled_model import CompiledModel, load_scorer
+from dataset_io import DATASET_FORMATS, DatasetWriter, dataset_columns, iter_dataset_chunks, read_dataset, write_dataset
+from model_registry import ModelHandle, add_hot_reload_args
+from profiling import add_profiling_args, print_snapshot, profiling_from_args, span, timed_iter
 
-def load_artifacts(base_dir: str):
-    artifacts_dir = os.path.join(base_dir, "artifacts")
-    scaler = joblib.load(os.path.join(artifacts_dir, "scaler.pkl"))
-    model = joblib.load(os.path.join(artifacts_dir, "kmeans.pkl"))
-    with open(os.path.join(artifacts_dir, "metadata.json"), "r", encoding="utf-8") as f:
-        metadata = json.load(f)
-    feature_cols: List[str] = metadata["feature_cols"]
-    severity_map: Dict[int, str] = {int(k): v for k, v in metadata["severity_map"].items()}
-    return scaler, model, feature_cols, severity_map
+_WORKER_HANDLE: Optional[ModelHandle] = None
 
 
-def run_predict(input_csv: str, output_csv: str, base_dir: str) -> str:
-    scaler, model, feature_cols, severity_map = load_artifacts(base_dir)
-
-    df = pd.read_csv(input_csv)
-    missing = [c for c in feature_cols if c not in df.columns]
+def check_columns(input_path: str, feature_cols) -> None:
+    columns = dataset_columns(input_path)
+    missing = [c for c in feature_cols if c not in columns]
     if missing:
-        raise ValueError(f"Colunas ausentes no CSV de entrada: {missing}")
+        raise ValueError(f"Colunas ausentes no arquivo de entrada: {missing}")
+
+
+def run_predict(input_csv: str, output_csv: str, base_dir: str, fmt: Optional[str] = None) -> str:
+    scorer = load_scorer(base_dir)
+    feature_cols = scorer.feature_cols
 
-    X = df[feature_cols].to_numpy()
-    X_scaled = scaler.transform(X)
+    check_columns(input_csv, feature_cols)
+    with span("parse"):
+        df = read_dataset(input_csv)
+
+    with span("scale"):
+        X = scorer.transform(df[feature_cols].to_numpy())
+    with span("predict"):
+        labels = scorer.predict_scaled(X)
 
-    labels = model.predict(X_scaled)
     df_out = df.copy()
     df_out["cluster_id"] = labels
-    df_out["severity"] = df_out["cluster_id"].map(severity_map)
+    df_out["severity"] = df_out["cluster_id"].map(scorer.severity_map)
+
+    with span("write"):
+        return write_dataset(df_out, output_csv, fmt)
+
+
+def score_chunk(chunk: pd.DataFrame, scorer: Optional[CompiledModel] = None) -> pd.DataFrame:
+    scorer = scorer if scorer is not None else _WORKER_HANDLE.get()
+    with span("scale"):
+        X = scorer.transform(chunk[scorer.feature_cols].to_numpy())
+    with span("predict"):
+        labels = scorer.predict_scaled(X)
+    # Sem df.copy(): o chunk é descartável
+    chunk["cluster_id"] = labels
+    chunk["severity"] = scorer.severity(labels)
+    return chunk
+
+
+def _init_worker(artifacts_dir: str, reload_interval: Optional[float]) -> None:
+    global _WORKER_HANDLE
+    _WORKER_HANDLE = ModelHandle(artifacts_dir, check_interval=reload_interval)
 
-    os.makedirs(os.path.dirname(output_csv), exist_ok=True)
-    df_out.to_csv(output_csv, index=False)
-    return output_csv
+
+def _score_chunks(chunks: Iterator[pd.DataFrame], handle: ModelHandle, workers: int) -> Iterator[pd.DataFrame]:
+    if workers <= 1:
+        for chunk in chunks:
+            # Modelo pego uma vez por chunk: uma troca de versão vale a partir do chunk seguinte
+            yield score_chunk(chunk, handle.get())
+        return
+    # No máximo 2 chunks em voo por worker, saída na ordem de entrada; cada worker troca de versão sozinho
+    initargs = (handle.artifacts_dir, handle.check_interval)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+        in_flight = deque()
+        for chunk in chunks:
+            in_flight.append(pool.submit(score_chunk, chunk))
+            if len(in_flight) >= workers * 2:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+
+def run_predict_chunked(
+    input_csv: str,
+    output_path: str,
+    base_dir: str,
+    chunksize: int = 100_000,
+    fmt: Optional[str] = None,
+    workers: int = 1,
+    reload_interval: Optional[float] = None,
+) -> str:
+    """
+    Predição em memória limitada: lê `chunksize` linhas por vez, prediz o
+    chunk vetorizado e anexa à saída (CSV, Parquet ou Arrow).
+
+    Com `reload_interval`, uma nova versão ativada no registro durante a execução
+    passa a valer a partir do próximo chunk, sem reiniciar.
+    """
+    handle = ModelHandle(os.path.join(base_dir, "artifacts"), check_interval=reload_interval)
+    scorer = handle.get()
+    feature_cols = scorer.feature_cols
+
+    check_columns(input_csv, feature_cols)
+    # Com --workers > 1 escala/predição rodam nos processos filhos: aqui só entram parse e write
+    chunks = timed_iter("parse", iter_dataset_chunks(input_csv, chunksize))
+
+    # Severidade com dicionário fixo, na mesma ordem em todos os chunks
+    categories = {"severity": sorted(set(scorer.severity_map.values()))}
+    with DatasetWriter(output_path, fmt, categories=categories) as writer:
+        for scored in _score_chunks(chunks, handle, workers):
+            with span("write"):
+                writer.write(scored)
+    rows = writer.rows
+
+    swaps = f", {handle.swaps} troca(s) de versão" if handle.swaps else ""
+    print(f"[INFO] {rows} linhas preditas em chunks de {chunksize} (versão {handle.version or 'sem registro'}{swaps})")
+    return output_path
 
 
 def main() -> None:
     base_dir = os.path.dirname(__file__)
 
     parser = argparse.ArgumentParser(description="Predição de severidade via KMeans treinado")
-    parser.add_argument("--input", required=True, help="CSV de entrada para predição")
+    parser.add_argument("--input", required=True, help="Arquivo de entrada para predição (CSV, Parquet ou Arrow)")
     parser.add_argument(
         "--output",
         required=False,
         default=os.path.join(base_dir, "outputs", "predictions.csv"),
-        help="CSV de saída com predições",
+        help="Arquivo de saída com predições (formato pela extensão ou --format)",
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=0,
+        help="Processar em chunks de N linhas (memória limitada; 0 = carregar o arquivo inteiro)",
     )
+    parser.add_argument("--format", choices=DATASET_FORMATS, default=None, help="Formato de saída (padrão: pela extensão de --output)")
+    parser.add_argument("--workers", type=int, default=1, help="Processos para pontuar chunks em paralelo (saída ordenada)")
+    add_hot_reload_args(parser)
+    add_profiling_args(parser)
     args = parser.parse_args()
+    profiling_from_args(args)
 
-    out = run_predict(args.input, args.output, base_dir)
+    if args.chunksize > 0:
+        reload_interval = args.reload_interval if args.reload_interval > 0 else None
+        out = run_predict_chunked(args.input, args.output, base_dir, args.chunksize, args.format, args.workers, reload_interval)
+    else:
+        out = run_predict(args.input, args.output, base_dir, args.format)
+    print_snapshot()
     print(f"[OK] Predição salva em: {out}")
 
 
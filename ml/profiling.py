@@ -0,0 +1,178 @@
+"""
+Spans cronometrados nos caminhos quentes do scoring (parse, escala, predição, escrita).
+
+Desligado por padrão: `span(nome)` devolve sempre o mesmo contexto vazio e o
+custo é um teste de flag por chamada. Ligado, cada span soma duração
+(`perf_counter`) em um registro por nome: contagem, total, máximo e as últimas
+`RECENT_SAMPLES` durações para p50/p95.
+
+Liga/desliga em tempo de execução sem reiniciar:
+- `--profile-spans` começa ligado
+- SIGUSR1 alterna ligado/desligado; SIGUSR2 imprime o resumo no stderr
+
+    kill -USR1 <pid>   # liga
+    kill -USR2 <pid>   # resumo
+"""
+import signal
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from typing import Deque, Dict, Iterable, Iterator, TypeVar
+
+RECENT_SAMPLES = 1024
+
+T = TypeVar("T")
+
+_enabled = False
+_lock = threading.Lock()
+_NOOP = nullcontext()
+
+
+class _SpanStats:
+    __slots__ = ("count", "total", "max", "recent")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent: Deque[float] = deque(maxlen=RECENT_SAMPLES)
+
+
+_spans: Dict[str, _SpanStats] = {}
+
+
+def record(name: str, seconds: float) -> None:
+    with _lock:
+        stats = _spans.get(name)
+        if stats is None:
+            stats = _spans[name] = _SpanStats()
+        stats.count += 1
+        stats.total += seconds
+        if seconds > stats.max:
+            stats.max = seconds
+        stats.recent.append(seconds)
+
+
+class _Span:
+    __slots__ = ("name", "t0")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __enter__(self) -> "_Span":
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        record(self.name, time.perf_counter() - self.t0)
+
+
+def span(name: str):
+    """Contexto que cronometra o bloco quando o profiling está ligado."""
+    return _Span(name) if _enabled else _NOOP
+
+
+def timed_iter(name: str, iterable: Iterable[T]) -> Iterator[T]:
+    """Cronometra cada `next()` de um iterador (ex.: leitura de chunks)."""
+    it = iter(iterable)
+    while True:
+        with span(name):
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+        yield item
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable() -> None:
+    global _enabled
+    _enabled = True
+
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+
+
+def toggle() -> bool:
+    global _enabled
+    _enabled = not _enabled
+    return _enabled
+
+
+def reset() -> None:
+    with _lock:
+        _spans.clear()
+
+
+def snapshot() -> Dict[str, Dict[str, float]]:
+    """Resumo por span em ms: count, total_ms, mean_ms, p50_ms, p95_ms, max_ms."""
+    with _lock:
+        items = [(name, s.count, s.total, s.max, sorted(s.recent)) for name, s in _spans.items()]
+    out = {}
+    for name, count, total, peak, recent in items:
+        def pct(q: float) -> float:
+            return recent[min(len(recent) - 1, int(q * len(recent)))] * 1000 if recent else 0.0
+
+        out[name] = {
+            "count": count,
+            "total_ms": round(total * 1000, 3),
+            "mean_ms": round(total * 1000 / count, 4) if count else 0.0,
+            "p50_ms": round(pct(0.50), 4),
+            "p95_ms": round(pct(0.95), 4),
+            "max_ms": round(peak * 1000, 4),
+        }
+    return out
+
+
+def format_snapshot() -> str:
+    lines = [f"{'span':<12} {'n':>9} {'total ms':>11} {'média ms':>10} {'p50 ms':>9} {'p95 ms':>9} {'máx ms':>9}"]
+    for name, s in snapshot().items():
+        lines.append(
+            f"{name:<12} {s['count']:>9} {s['total_ms']:>11.1f} {s['mean_ms']:>10.4f} "
+            f"{s['p50_ms']:>9.4f} {s['p95_ms']:>9.4f} {s['max_ms']:>9.4f}"
+        )
+    return "\n".join(lines)
+
+
+def print_snapshot(prefix: str = "[PROF]") -> None:
+    if _spans:
+        print(f"{prefix} spans (ligado={_enabled})\n{format_snapshot()}", file=sys.stderr)
+
+
+def install_signal_handlers() -> bool:
+    """SIGUSR1 alterna o profiling, SIGUSR2 imprime o resumo. Só na thread principal e em POSIX."""
+    if not hasattr(signal, "SIGUSR1") or threading.current_thread() is not threading.main_thread():
+        return False
+
+    def on_toggle(signum, frame) -> None:
+        state = "ligado" if toggle() else "desligado"
+        print(f"[INFO] Profiling de spans {state} (SIGUSR1)", file=sys.stderr)
+
+    def on_dump(signum, frame) -> None:
+        print_snapshot()
+
+    signal.signal(signal.SIGUSR1, on_toggle)
+    signal.signal(signal.SIGUSR2, on_dump)
+    return True
+
+
+def add_profiling_args(parser) -> None:
+    """Opções de CLI compartilhadas pelos scripts com spans."""
+    parser.add_argument(
+        "--profile-spans",
+        action="store_true",
+        help="Cronometrar parse/escala/predição/escrita desde o início (SIGUSR1 alterna, SIGUSR2 imprime)",
+    )
+
+
+def profiling_from_args(args) -> None:
+    if args.profile_spans:
+        enable()
+    install_signal_handlers()
@@ -1,33 +1,394 @@
 #!/usr/bin/env python3
 import argparse
 import os
+import sys
+import threading
 import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
 import pandas as pd
 
+from data_sources import FEATURE_COLS, SENSOR_FEATURE_MAP, SENSOR_ID_SUFFIX
+from dataset_io import read_dataset
+from generate_data import device_ids
+from log_writer import add_log_writer_args, writer_from_args
+
+PROFILES = ["steady", "poisson", "burst"]
+
+
+def base_offsets(n: int, repeat: int, rate: float, speed: float, timestamps: Optional[np.ndarray]) -> np.ndarray:
+    """
+    Instante (s desde o início) de cada linha de um dispositivo, antes do perfil.
+
+    - `speed` > 0: segue os timestamps do arquivo divididos por `speed` (1 = tempo real)
+    - `rate` > 0: `rate` linhas/s espaçadas igualmente
+    - nenhum dos dois: tudo em t=0 (o mais rápido possível)
+    """
+    total = n * repeat
+    if speed and timestamps is not None:
+        ms = timestamps.astype("datetime64[ms]").astype(np.int64)
+        rel = np.maximum.accumulate(ms - ms[0]) / 1000.0 / speed
+        step = float(np.median(np.diff(rel))) if n > 1 else 1.0 / speed
+        period = rel[-1] + step
+        return (np.tile(rel, repeat) + np.repeat(np.arange(repeat) * period, n)).astype(np.float64)
+    if rate:
+        return np.arange(total, dtype=np.float64) / rate
+    return np.zeros(total, dtype=np.float64)
+
+
+def apply_profile(offsets: np.ndarray, profile: str, rng: np.random.Generator, burst_size: int, jitter_s: float) -> np.ndarray:
+    """
+    Aplica o perfil de tráfego mantendo a taxa média.
+
+    - steady: como veio de `base_offsets`
+    - poisson: chegadas com intervalos exponenciais de mesma média
+    - burst: blocos de `burst_size` linhas liberados juntos no instante da primeira
+    Depois, `jitter_s` soma ruído gaussiano a cada linha (a ordem por dispositivo é mantida).
+    """
+    n = len(offsets)
+    out = offsets
+    if n > 1 and profile == "poisson":
+        mean_dt = (offsets[-1] - offsets[0]) / (n - 1)
+        out = offsets[0] + np.concatenate([[0.0], np.cumsum(rng.exponential(mean_dt, n - 1))])
+    elif profile == "burst" and burst_size > 1:
+        out = offsets[(np.arange(n) // burst_size) * burst_size]
+    if jitter_s > 0:
+        out = np.maximum.accumulate(np.maximum(out + rng.normal(0.0, jitter_s, n), 0.0))
+    return out
+
+
+def build_schedule(
+    df: pd.DataFrame,
+    n_devices: int,
+    repeat: int,
+    rate: float,
+    speed: float,
+    profile: str,
+    burst_size: int,
+    jitter_s: float,
+    seed: int,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Agenda de todos os dispositivos intercalada no tempo: (instantes, linha do
+    arquivo, índice do dispositivo), ordenados pelo instante. Cada dispositivo
+    reproduz o arquivo inteiro com fase e sorteios próprios.
+    """
+    n = len(df)
+    timestamps = df["timestamp"].to_numpy() if "timestamp" in df.columns else None
+    base = base_offsets(n, repeat, rate, speed, timestamps)
+    mean_dt = (base[-1] - base[0]) / (len(base) - 1) if len(base) > 1 else 0.0
+    rng = np.random.default_rng(seed)
+    offsets = []
+    for d in range(n_devices):
+        # Dispositivos defasados dentro de um intervalo médio, como placas ligadas em momentos diferentes
+        phase = rng.uniform(0.0, mean_dt) if d and mean_dt else 0.0
+        offsets.append(apply_profile(base, profile, rng, burst_size, jitter_s) + phase)
+    offsets = np.concatenate(offsets)
+    rows = np.tile(np.arange(n * repeat) % n, n_devices)
+    devices = np.repeat(np.arange(n_devices), n * repeat)
+    order = np.argsort(offsets, kind="stable")
+    return offsets[order], rows[order], devices[order]
+
+
+class CsvTarget:
+    """Log CSV acompanhado pelo live_dashboard: blocos formatados de uma vez e gravados pelo `PredictionLogWriter`."""
+
+    name = "csv"
+
+    def __init__(self, args, path: str, columns: Sequence[str]) -> None:
+        self.columns = list(columns)
+        self.log = writer_from_args(args, path, self.columns, overwrite=True)
+        self.sent = 0
+
+    def prepare(self, frame: pd.DataFrame):
+        if self.log.fmt != "csv":
+            rows = list(frame[self.columns].itertuples(index=False, name=None))
+            return rows, np.arange(1, len(rows) + 1)
+        lines = frame[self.columns].to_csv(header=False, index=False, lineterminator="\n").split("\n")[:-1]
+        return lines, np.arange(1, len(lines) + 1)
+
+    def send(self, units) -> None:
+        if self.log.fmt == "csv":
+            self.log.write_text("\n".join(units) + "\n", len(units))
+        else:
+            self.log.write_many(units)
+        self.sent += len(units)
+
+    def tick(self) -> None:
+        self.log.maybe_flush()
+
+    def close(self) -> None:
+        self.log.close()
+
+    def summary(self) -> str:
+        return f"{self.sent} linhas em {self.log.path} ({self.log.flushes} gravações)"
+
+
+class PtyTarget:
+    """
+    Dispositivo serial falso (pty): escreve as features como o firmware, uma
+    leitura por linha, no lado mestre; o caminho do lado escravo pode ser aberto
+    pelo `stream_serial_predict.py --port`. Sem leitor, o buffer do pty enche e
+    a escrita bloqueia (o atraso aparece no relatório).
+    """
+
+    name = "pty"
+
+    def __init__(self, columns: Sequence[str], link: Optional[str] = None) -> None:
+        import pty
+        import tty
+
+        self.columns = [c for c in FEATURE_COLS if c in columns]
+        self._master_fd, self._slave_fd = pty.openpty()
+        tty.setraw(self._slave_fd)
+        self.path = os.ttyname(self._slave_fd)
+        self.link = link
+        if link:
+            if os.path.lexists(link):
+                os.remove(link)
+            os.symlink(self.path, link)
+        self.sent = 0
+        print(f"[INFO] Serial falsa em {self.path}" + (f" (link {link})" if link else ""), flush=True)
+
+    def prepare(self, frame: pd.DataFrame):
+        lines = frame[self.columns].to_csv(header=False, index=False, lineterminator="\n").split("\n")[:-1]
+        return lines, np.arange(1, len(lines) + 1)
+
+    def send(self, units) -> None:
+        data = ("\n".join(units) + "\n").encode("utf-8")
+        while data:
+            written = os.write(self._master_fd, data)
+            data = data[written:]
+        self.sent += len(units)
+
+    def tick(self) -> None:
+        pass
+
+    def _pending(self) -> int:
+        import fcntl
+        import struct
+        import termios
+
+        waiting = fcntl.ioctl(self._slave_fd, termios.FIONREAD, struct.pack("i", 0))
+        return struct.unpack("i", waiting)[0]
+
+    def close(self, drain_s: float = 5.0) -> None:
+        # Dá tempo ao leitor de consumir o que ainda está no buffer do pty antes de fechar
+        deadline = time.monotonic() + drain_s
+        while self._pending() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        for fd in (self._master_fd, self._slave_fd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        if self.link and os.path.islink(self.link):
+            os.remove(self.link)
+
+    def summary(self) -> str:
+        return f"{self.sent} linhas em {self.path}"
+
+
+class HttpTarget:
+    """
+    POST no `/data` do servidor de ingestão: uma requisição por sensor, como o
+    firmware. Os JSONs são gerados em bloco (`to_json(lines=True)`) e enviados
+    por `workers` threads com uma `requests.Session` de conexões reaproveitadas;
+    no máximo `workers * 4` requisições pendentes (o excesso vira atraso).
+    """
+
+    name = "http"
+
+    def __init__(self, url: str, workers: int = 8, timeout: float = 5.0) -> None:
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=workers))
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=workers))
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="replay-http")
+        self._slots = threading.BoundedSemaphore(workers * 4)
+        self._lock = threading.Lock()
+        self.status: Counter = Counter()
+        self.latencies: List[float] = []
+        self.sent = 0
+
+    def prepare(self, frame: pd.DataFrame):
+        parts = []
+        for sensor_type, col in SENSOR_FEATURE_MAP.items():
+            if col not in frame.columns:
+                continue
+            parts.append(
+                pd.DataFrame(
+                    {
+                        "row": np.arange(len(frame)),
+                        "sensor_id": frame["device"].astype(str) + "_" + SENSOR_ID_SUFFIX[sensor_type],
+                        "device_id": frame["device"].astype(str),
+                        "sensor_type": sensor_type,
+                        "sensor_value": frame[col].astype(np.float64),
+                        "timestamp": frame["ts"],
+                        "quality": frame["quality"].astype(str) if "quality" in frame.columns else "good",
+                    }
+                )
+            )
+        long_df = pd.concat(parts, ignore_index=True).dropna(subset=["sensor_value"])
+        long_df = long_df.sort_values("row", kind="stable")
+        bounds = np.cumsum(np.bincount(long_df["row"].to_numpy(), minlength=len(frame)))
+        payloads = long_df.drop(columns="row").to_json(orient="records", lines=True).splitlines()
+        return payloads, bounds
+
+    def _post(self, body: str) -> None:
+        t0 = time.perf_counter()
+        try:
+            resp = self.session.post(self.url, data=body, headers={"Content-Type": "application/json"}, timeout=self.timeout)
+            key = resp.status_code
+        except Exception as exc:
+            key = type(exc).__name__
+        finally:
+            self._slots.release()
+        with self._lock:
+            self.status[key] += 1
+            self.latencies.append(time.perf_counter() - t0)
+
+    def send(self, units) -> None:
+        for body in units:
+            self._slots.acquire()
+            self._executor.submit(self._post, body)
+        self.sent += len(units)
+
+    def tick(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        self.session.close()
+
+    def summary(self) -> str:
+        lat = np.asarray(self.latencies) * 1000.0
+        pct = f", latência p50 {np.percentile(lat, 50):.1f} ms / p99 {np.percentile(lat, 99):.1f} ms" if len(lat) else ""
+        status = ", ".join(f"{k}: {v}" for k, v in sorted(self.status.items(), key=lambda kv: str(kv[0])))
+        return f"{self.sent} requisições para {self.url} ({status}){pct}"
+
+
+def make_target(spec: str, args, columns: Sequence[str]):
+    """`http(s)://...` → HttpTarget; `pty` ou `pty:LINK` → PtyTarget; `csv:CAMINHO` ou caminho → CsvTarget."""
+    if spec.startswith(("http://", "https://")):
+        return HttpTarget(spec, workers=args.http_workers, timeout=args.http_timeout)
+    if spec == "pty" or spec.startswith("pty:"):
+        return PtyTarget(columns, link=spec[4:] or None)
+    return CsvTarget(args, spec[4:] if spec.startswith("csv:") else spec, columns)
+
+
+def replay(df: pd.DataFrame, targets: List, schedule, device_names: Sequence[str], chunk_rows: int, tick_s: float, stats_interval: float) -> dict:
+    """
+    Envia a agenda em tempo real: formata blocos de `chunk_rows` linhas de uma
+    vez e, a cada passo, entrega a cada alvo tudo o que já venceu numa única
+    escrita. Atrasado em relação à agenda, envia o acumulado (sem dormir).
+    """
+    offsets, rows, devices = schedule
+    device_names = np.asarray(device_names, dtype=object)
+    t0 = time.perf_counter()
+    t0_ms = int(time.time() * 1000)
+    max_lag = 0.0
+    sends = 0
+    next_stats = stats_interval
+    total = len(offsets)
+    for a in range(0, total, chunk_rows):
+        b = min(a + chunk_rows, total)
+        frame = df.take(rows[a:b]).reset_index(drop=True)
+        frame["ts"] = t0_ms + np.round(offsets[a:b] * 1000).astype(np.int64)
+        frame["device"] = device_names[devices[a:b]]
+        prepared = [t.prepare(frame) for t in targets]
+        i = a
+        while i < b:
+            now = time.perf_counter() - t0
+            if offsets[i] > now:
+                for t in targets:
+                    t.tick()
+                time.sleep(min(offsets[i] - now, tick_s))
+                continue
+            j = min(int(np.searchsorted(offsets, now, side="right")), b)
+            max_lag = max(max_lag, now - offsets[i])
+            for t, (units, bounds) in zip(targets, prepared):
+                lo = bounds[i - a - 1] if i > a else 0
+                t.send(units[lo : bounds[j - a - 1]])
+            sends += 1
+            i = j
+            if stats_interval and now >= next_stats:
+                print(f"[INFO] {i}/{total} linhas, {i / max(now, 1e-9):.0f} linhas/s, atraso máx {max_lag * 1000:.0f} ms", file=sys.stderr)
+                next_stats = now + stats_interval
+    elapsed = time.perf_counter() - t0
+    return {"rows": total, "elapsed_s": elapsed, "rows_per_s": total / elapsed if elapsed else float("inf"), "max_lag_s": max_lag, "sends": sends}
+
 
 def main() -> None:
     base_dir = os.path.dirname(__file__)
-    parser = argparse.ArgumentParser(description="Simular streaming para o live_dashboard")
-    parser.add_argument("--source", default=os.path.join(base_dir, "outputs", "predictions.csv"), help="CSV de origem (com severity)")
-    parser.add_argument("--target", default=os.path.join(base_dir, "outputs", "serial_predictions.csv"), help="CSV de destino (lido pelo dashboard)")
-    parser.add_argument("--delay", type=float, default=0.5, help="Intervalo entre linhas (s)")
+    parser = argparse.ArgumentParser(description="Reproduzir leituras em tempo real (log do live_dashboard, /data do servidor ou serial falsa)")
+    parser.add_argument("--source", default=os.path.join(base_dir, "outputs", "predictions.csv"), help="Arquivo de origem (CSV, Parquet ou Arrow)")
+    parser.add_argument(
+        "--target",
+        nargs="+",
+        default=[os.path.join(base_dir, "outputs", "serial_predictions.csv")],
+        help="Destino(s): caminho ou csv:CAMINHO (log do dashboard), http://host:8000/data (servidor), pty ou pty:LINK (serial falsa)",
+    )
+    pace = parser.add_mutually_exclusive_group()
+    pace.add_argument("--rate", type=float, default=None, help="Linhas/s por dispositivo (0 = o mais rápido possível)")
+    pace.add_argument("--speed", type=float, default=None, help="Multiplicador dos timestamps do arquivo (1 = tempo real, 60 = 1 min/s)")
+    pace.add_argument("--delay", type=float, default=None, help="Intervalo entre linhas (s); o mesmo que --rate 1/delay")
+    parser.add_argument("--profile", choices=PROFILES, default="steady", help="Perfil de tráfego")
+    parser.add_argument("--burst-size", type=int, default=50, help="Linhas por rajada no perfil burst")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Desvio padrão do ruído de tempo por linha (ms)")
+    parser.add_argument("--devices", type=int, default=1, help="Dispositivos simultâneos (cada um reproduz o arquivo, ESP32_001...)")
+    parser.add_argument("--repeat", type=int, default=1, help="Repetir o arquivo N vezes")
+    parser.add_argument("--seed", type=int, default=42, help="Semente dos perfis aleatórios")
+    parser.add_argument("--chunk-rows", type=int, default=50_000, help="Linhas formatadas por bloco")
+    parser.add_argument("--tick-ms", type=float, default=10.0, help="Espera máxima entre verificações da agenda (ms)")
+    parser.add_argument("--http-workers", type=int, default=8, help="Requisições HTTP simultâneas")
+    parser.add_argument("--http-timeout", type=float, default=5.0, help="Timeout de cada POST (s)")
+    parser.add_argument("--stats-interval", type=float, default=0.0, help="Imprimir progresso a cada N s (0 = só no fim)")
+    add_log_writer_args(parser)
     args = parser.parse_args()
 
-    df = pd.read_csv(args.source)
-    cols = list(df.columns) + ["ts"]
+    if args.delay is not None:
+        rate, speed = (1.0 / args.delay if args.delay > 0 else 0.0), 0.0
+    elif args.speed is not None:
+        rate, speed = 0.0, args.speed
+    else:
+        rate, speed = (args.rate if args.rate is not None else 2.0), 0.0
 
-    os.makedirs(os.path.dirname(args.target), exist_ok=True)
-    with open(args.target, "w", encoding="utf-8") as f:
-        f.write(",".join(cols) + "\n")
+    df = read_dataset(args.source)
+    if df.empty:
+        raise SystemExit(f"[WARN] Arquivo vazio: {args.source}")
+    if speed and "timestamp" not in df.columns:
+        raise SystemExit("[WARN] --speed requer a coluna timestamp no arquivo de origem")
+    columns = list(df.columns) + ["ts", "device"]
+    names = device_ids(args.devices)
+    schedule = build_schedule(df, args.devices, args.repeat, rate, speed, args.profile, args.burst_size, args.jitter_ms / 1000.0, args.seed)
+    planned = schedule[0][-1]
+    print(f"[INFO] {len(schedule[0])} linhas, {args.devices} dispositivo(s), perfil {args.profile}, duração prevista {planned:.1f} s")
 
-    for _, row in df.iterrows():
-        ts = int(time.time() * 1000)
-        values = [str(row[c]) for c in df.columns] + [str(ts)]
-        with open(args.target, "a", encoding="utf-8") as f:
-            f.write(",".join(values) + "\n")
-        time.sleep(args.delay)
+    targets = [make_target(spec, args, columns) for spec in args.target]
+    try:
+        result = replay(df, targets, schedule, names, args.chunk_rows, args.tick_ms / 1000.0, args.stats_interval)
+    except KeyboardInterrupt:
+        result = None
+        print("\n[INFO] Interrompido")
+    finally:
+        for t in targets:
+            t.close()
 
-    print(f"[OK] Simulação concluída. Arquivo: {args.target}")
+    if result:
+        print(
+            f"[OK] Simulação concluída: {result['rows']} linhas em {result['elapsed_s']:.2f} s "
+            f"({result['rows_per_s']:.0f} linhas/s, atraso máx {result['max_lag_s'] * 1000:.0f} ms)"
+        )
+    for t in targets:
+        print(f"[OK] {t.name}: {t.summary()}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,250 @@
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+OVERFLOW_POLICIES = ("block", "drop-oldest", "drop-newest")
+
+_STOP = object()
+
+
+@dataclass
+class Reading:
+    line: str
+    source: str
+    t_read: float  # time.perf_counter() no momento da leitura
+    t_enqueued: float = 0.0
+
+
+@dataclass
+class ScoredReading:
+    reading: Reading
+    values: List[float]
+    label: int
+    severity: str
+    ts: int
+    t_enqueued: float = 0.0
+
+
+class StageStats:
+    """Contadores de um estágio: vazão, descartes, profundidade da fila e latência."""
+
+    def __init__(self, name: str, window: int = 2048) -> None:
+        self.name = name
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.blocked_s = 0.0
+        self.max_queue_depth = 0
+        self.queue_depth = 0
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._latency_max = 0.0
+        self._lock = threading.Lock()
+
+    def observe_depth(self, depth: int) -> None:
+        self.queue_depth = depth
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+
+    def record(self, latencies: List[float]) -> None:
+        with self._lock:
+            self.processed += len(latencies)
+            self._latencies.extend(latencies)
+            if latencies:
+                self._latency_max = max(self._latency_max, max(latencies))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            lat = sorted(self._latencies)
+        snap: Dict[str, Any] = {
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+        }
+        if self.blocked_s:
+            snap["blocked_s"] = round(self.blocked_s, 3)
+        if lat:
+            snap["latency_ms"] = {
+                "p50": round(lat[len(lat) // 2] * 1000, 3),
+                "p95": round(lat[min(len(lat) - 1, int(len(lat) * 0.95))] * 1000, 3),
+                "max": round(self._latency_max * 1000, 3),
+            }
+        return snap
+
+
+class StreamPipeline:
+    """
+    Pipeline leitor → fila limitada → worker de scoring → fila → sink.
+
+    Cada estágio roda na sua thread, de modo que gravação em disco ou print lento
+    não atrasa a leitura da Serial. Quando uma fila enche, `overflow` decide:
+    `block` aplica backpressure no estágio anterior (nada é descartado pelo
+    programa), `drop-oldest`/`drop-newest` descartam e contam explicitamente.
+    """
+
+    def __init__(
+        self,
+        read_line: Callable[[], Optional[Reading]],
+        score_batch: Callable[[List[Reading], StageStats], List[ScoredReading]],
+        sink: Callable[[List[ScoredReading]], None],
+        on_idle: Optional[Callable[[], None]] = None,
+        queue_size: int = 10000,
+        batch_size: int = 64,
+        overflow: str = "block",
+    ) -> None:
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Política de overflow inválida: {overflow}. Use um de {OVERFLOW_POLICIES}")
+        self.read_line = read_line
+        self.score_batch = score_batch
+        self.sink = sink
+        self.on_idle = on_idle
+        self.batch_size = max(1, int(batch_size))
+        self.overflow = overflow
+
+        self.raw_queue: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size)
+        self.out_queue: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size)
+        self.reader_stats = StageStats("reader")
+        self.scorer_stats = StageStats("scorer")
+        self.sink_stats = StageStats("sink")
+        self.end_to_end = StageStats("end_to_end")
+
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def _put(self, q: "queue.Queue[Any]", item: Any, stats: StageStats) -> None:
+        if self.overflow == "block":
+            try:
+                q.put_nowait(item)
+            except queue.Full:
+                t0 = time.perf_counter()
+                q.put(item)
+                stats.blocked_s += time.perf_counter() - t0
+        elif self.overflow == "drop-newest":
+            try:
+                q.put_nowait(item)
+            except queue.Full:
+                stats.dropped += 1
+        else:
+            while True:
+                try:
+                    q.put_nowait(item)
+                    break
+                except queue.Full:
+                    try:
+                        q.get_nowait()
+                        stats.dropped += 1
+                    except queue.Empty:
+                        pass
+        stats.observe_depth(q.qsize())
+
+    def _drain(self, q: "queue.Queue[Any]", first: Any) -> List[Any]:
+        batch = [first]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(q.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _reader_loop(self) -> None:
+        try:
+            while not self._stop.is_set():
+                try:
+                    reading = self.read_line()
+                except EOFError:
+                    # Fonte esgotada (ex.: todas as portas fechadas)
+                    break
+                if reading is None:
+                    continue
+                reading.t_enqueued = time.perf_counter()
+                self.reader_stats.processed += 1
+                self._put(self.raw_queue, reading, self.reader_stats)
+        finally:
+            self.raw_queue.put(_STOP)
+
+    def _scorer_loop(self) -> None:
+        done = False
+        while not done:
+            first = self.raw_queue.get()
+            batch = self._drain(self.raw_queue, first)
+            if _STOP in batch:
+                done = True
+                batch = [r for r in batch if r is not _STOP]
+            if not batch:
+                continue
+            try:
+                scored = self.score_batch(batch, self.scorer_stats)
+            except Exception as e:
+                self.scorer_stats.errors += len(batch)
+                print(f"[WARN] Falha no scoring ({len(batch)} linhas): {e}", file=sys.stderr)
+                continue
+            now = time.perf_counter()
+            # Só as linhas pontuadas: as rejeitadas já entraram em `errors` no score_batch
+            self.scorer_stats.record([now - item.reading.t_enqueued for item in scored])
+            self.scorer_stats.observe_depth(self.raw_queue.qsize())
+            for item in scored:
+                item.t_enqueued = now
+                self._put(self.out_queue, item, self.scorer_stats)
+        self.out_queue.put(_STOP)
+
+    def _sink_loop(self) -> None:
+        done = False
+        while not done:
+            try:
+                first = self.out_queue.get(timeout=0.5)
+            except queue.Empty:
+                if self.on_idle is not None:
+                    self.on_idle()
+                continue
+            batch = self._drain(self.out_queue, first)
+            if _STOP in batch:
+                done = True
+                batch = [r for r in batch if r is not _STOP]
+            if not batch:
+                continue
+            try:
+                self.sink(batch)
+            except Exception as e:
+                self.sink_stats.errors += len(batch)
+                print(f"[WARN] Falha no sink ({len(batch)} linhas): {e}", file=sys.stderr)
+                continue
+            now = time.perf_counter()
+            self.sink_stats.record([now - s.t_enqueued for s in batch])
+            self.sink_stats.observe_depth(self.out_queue.qsize())
+            self.end_to_end.record([now - s.reading.t_read for s in batch])
+
+    def start(self) -> "StreamPipeline":
+        for name, target in (
+            ("reader", self._reader_loop),
+            ("scorer", self._scorer_loop),
+            ("sink", self._sink_loop),
+        ):
+            t = threading.Thread(target=target, name=f"stream-{name}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self) -> None:
+        """Para a leitura; scorer e sink esvaziam as filas antes de encerrar."""
+        self._stop.set()
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for t in self._threads:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            t.join(remaining)
+        return not any(t.is_alive() for t in self._threads)
+
+    def is_alive(self) -> bool:
+        return any(t.is_alive() for t in self._threads)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            s.name: s.snapshot()
+            for s in (self.reader_stats, self.scorer_stats, self.sink_stats, self.end_to_end)
+        }
@@ -1,96 +1,155 @@
 #!/usr/bin/env python3
 import argparse
-import csv
 import json
 import os
 import sys
 import time
-from typing import Dict, List
+from typing import List, Union
 
-import joblib
 import numpy as np
-import pandas as pd
-import serial
 
+from compiled_model import CompiledModel
+from log_writer import add_log_writer_args, writer_from_args
+from stream_pipeline import OVERFLOW_POLICIES, Reading, ScoredReading, StageStats, StreamPipeline
+from model_registry import ModelHandle, add_hot_reload_args
+from profiling import add_profiling_args, print_snapshot, profiling_from_args, span
+from stream_sources import MultiSourceReader, add_source_args, build_sources
 
-def load_artifacts(base_dir: str):
-    artifacts_dir = os.path.join(base_dir, "artifacts")
-    scaler = joblib.load(os.path.join(artifacts_dir, "scaler.pkl"))
-    model = joblib.load(os.path.join(artifacts_dir, "kmeans.pkl"))
-    with open(os.path.join(artifacts_dir, "metadata.json"), "r", encoding="utf-8") as f:
-        metadata = json.load(f)
-    feature_cols: List[str] = metadata["feature_cols"]
-    severity_map: Dict[int, str] = {int(k): v for k, v in metadata["severity_map"].items()}
-    return scaler, model, feature_cols, severity_map
 
-
-def open_serial(port: str, baud: int, timeout: float) -> serial.Serial:
-    return serial.Serial(port=port, baudrate=baud, timeout=timeout)
-
-
-def parse_line_to_features(line: str, feature_cols: List[str]) -> pd.DataFrame:
-    # Espera linha CSV com cabeçalho previamente enviado pelo firmware ou com as colunas na mesma ordem de feature_cols
-    # Se houver cabeçalho explícito na stream, detectar e usar DictReader; senão, confiar na ordem
+def parse_line_to_values(line: str, feature_cols: List[str]) -> List[float]:
+    # Espera linha CSV com as colunas na mesma ordem de feature_cols
     parts = [p.strip() for p in line.strip().split(",")]
     if len(parts) != len(feature_cols):
         raise ValueError(f"Número de colunas incompatível. Esperado {len(feature_cols)}, recebido {len(parts)}. Linha: {line!r}")
-    data = {c: [float(v)] for c, v in zip(feature_cols, parts)}
-    return pd.DataFrame(data)
+    return [float(v) for v in parts]
+
+
+def make_batch_scorer(model: Union[CompiledModel, ModelHandle]):
+    # Com ModelHandle o modelo é pego uma vez por lote: a troca de versão nunca divide um lote
+    get_model = model.get if isinstance(model, ModelHandle) else (lambda: model)
+    feature_cols = model.feature_cols
+
+    def score_batch(batch: List[Reading], stats: StageStats) -> List[ScoredReading]:
+        valid: List[Reading] = []
+        rows: List[List[float]] = []
+        with span("parse"):
+            for reading in batch:
+                try:
+                    rows.append(parse_line_to_values(reading.line, feature_cols))
+                    valid.append(reading)
+                except ValueError as e:
+                    stats.errors += 1
+                    print(f"[WARN] Linha inválida: {reading.line!r} — {e}", file=sys.stderr)
+        if not rows:
+            return []
+
+        # Um único transform/predict por lote em vez de um por linha
+        current = get_model()
+        with span("scale"):
+            X = current.transform(np.asarray(rows, dtype=float))
+        with span("predict"):
+            labels = current.predict_scaled(X)
+            severities = current.severity(labels)
+        ts = int(time.time() * 1000)
+        return [
+            ScoredReading(
+                reading=reading,
+                values=values,
+                label=int(label),
+                severity=severity,
+                ts=ts,
+            )
+            for reading, values, label, severity in zip(valid, rows, labels, severities)
+        ]
+
+    return score_batch
+
+
+def make_sink(log, quiet: bool, show_source: bool = False):
+    def format_line(s: ScoredReading) -> str:
+        tag = f"[{s.reading.source}]\t" if show_source else ""
+        return f"{s.severity}\t(label={s.label})\t{tag}{s.reading.line}\n"
+
+    def sink(batch: List[ScoredReading]) -> None:
+        with span("write"):
+            log.write_many([[*s.values, s.label, s.severity, s.ts, s.reading.source] for s in batch])
+        if not quiet:
+            sys.stdout.write("".join(format_line(s) for s in batch))
+            sys.stdout.flush()
+
+    return sink
+
+
+def print_stats(pipeline: StreamPipeline) -> None:
+    print(f"[STATS] {json.dumps(pipeline.stats(), ensure_ascii=False)}", file=sys.stderr)
+    print_snapshot()
 
 
 def main() -> None:
     base_dir = os.path.dirname(__file__)
 
     parser = argparse.ArgumentParser(description="Predição em tempo real via Serial")
-    parser.add_argument("--port", required=True, help="Porta serial (ex.: /dev/ttyUSB0, /dev/ttyACM0)")
-    parser.add_argument("--baud", type=int, default=115200, help="Baud rate")
+    add_source_args(parser)
     parser.add_argument("--timeout", type=float, default=1.0, help="Timeout de leitura (s)")
     parser.add_argument("--log", default=os.path.join(base_dir, "outputs", "serial_predictions.csv"), help="Arquivo CSV para log das predições")
+    parser.add_argument("--queue-size", type=int, default=10000, help="Capacidade de cada fila do pipeline")
+    parser.add_argument("--batch-size", type=int, default=64, help="Máximo de linhas por lote de scoring")
+    parser.add_argument(
+        "--overflow",
+        choices=OVERFLOW_POLICIES,
+        default="block",
+        help="Fila cheia: backpressure (block) ou descarte contabilizado (drop-oldest/drop-newest)",
+    )
+    parser.add_argument("--stats-interval", type=float, default=0.0, help="Imprimir contadores do pipeline a cada N s (0 = só no fim)")
+    parser.add_argument("--quiet", action="store_true", help="Não imprimir cada predição no terminal")
+    add_log_writer_args(parser)
+    add_hot_reload_args(parser)
+    add_profiling_args(parser)
     args = parser.parse_args()
-
-    scaler, model, feature_cols, severity_map = load_artifacts(base_dir)
-
-    os.makedirs(os.path.dirname(args.log), exist_ok=True)
-    if not os.path.exists(args.log):
-        with open(args.log, "w", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow([*feature_cols, "cluster_id", "severity", "ts"])
-
-    print(f"[INFO] Abrindo {args.port} @ {args.baud}...")
-    ser = open_serial(args.port, args.baud, args.timeout)
-    print("[INFO] Lendo linhas. Ctrl+C para sair.")
+    if not (args.port or args.replay or args.pty_replay or args.stdin):
+        parser.error("informe ao menos uma fonte: --port, --replay, --pty-replay ou --stdin")
+
+    # Nova versão ativada (cluster_model.py, incremental_update.py --promote, model_registry.py activate)
+    # é carregada em segundo plano e entra no próximo lote, sem parar a leitura
+    model = ModelHandle(os.path.join(base_dir, "artifacts"), check_interval=args.reload_interval or None)
+    profiling_from_args(args)
+    feature_cols = model.feature_cols
+    print(f"[INFO] Modelo: versão {model.version or 'sem registro'}")
+
+    # Um único modelo em memória atende todas as portas; o log combinado identifica a origem em "device"
+    log = writer_from_args(args, args.log, [*feature_cols, "cluster_id", "severity", "ts", "device"])
+
+    sources, fakes = build_sources(args, feature_cols)
+    reader = MultiSourceReader(sources, timeout=args.timeout)
+    print(f"[INFO] Lendo linhas de {len(sources)} fonte(s). Ctrl+C para sair.")
+
+    pipeline = StreamPipeline(
+        read_line=reader.read_line,
+        score_batch=make_batch_scorer(model),
+        sink=make_sink(log, args.quiet, show_source=len(sources) > 1),
+        on_idle=log.maybe_flush,
+        queue_size=args.queue_size,
+        batch_size=args.batch_size,
+        overflow=args.overflow,
+    ).start()
 
     try:
-        while True:
-            raw = ser.readline().decode("utf-8", errors="ignore")
-            if not raw:
-                continue
-            line = raw.strip()
-            if not line:
-                continue
-
-            try:
-                df = parse_line_to_features(line, feature_cols)
-                X = df[feature_cols].to_numpy()
-                X_scaled = scaler.transform(X)
-                label = int(model.predict(X_scaled)[0])
-                severity = severity_map.get(label, str(label))
-
-                ts = int(time.time() * 1000)
-                with open(args.log, "a", newline="", encoding="utf-8") as f:
-                    writer = csv.writer(f)
-                    writer.writerow([*(df.iloc[0][feature_cols].tolist()), label, severity, ts])
-
-                print(f"{severity}\t(label={label})\t{line}")
-            except Exception as e:
-                print(f"[WARN] Linha inválida: {line!r} — {e}", file=sys.stderr)
+        next_stats = time.monotonic() + args.stats_interval
+        while pipeline.is_alive():
+            pipeline.join(timeout=0.5)
+            if args.stats_interval > 0 and time.monotonic() >= next_stats:
+                print_stats(pipeline)
+                next_stats = time.monotonic() + args.stats_interval
     except KeyboardInterrupt:
         print("\n[INFO] Encerrado pelo usuário.")
     finally:
-        try:
-            ser.close()
-        except Exception:
-            pass
+        pipeline.stop()
+        pipeline.join(timeout=args.timeout + 5.0)
+        log.close()
+        reader.close()
+        for fake in fakes:
+            fake.close()
+        print_stats(pipeline)
 
 
 if __name__ == "__main__":
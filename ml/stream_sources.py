@@ -0,0 +1,338 @@
+import csv
+import os
+import selectors
+import sys
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Iterator, List, Optional, Sequence, Tuple
+
+from stream_pipeline import Reading
+
+
+def parse_port_spec(spec: str) -> Tuple[str, str]:
+    """`bancada1=/dev/ttyUSB0` → ("bancada1", "/dev/ttyUSB0"); sem alias o nome é a própria porta."""
+    if "=" in spec:
+        name, port = spec.split("=", 1)
+        return name.strip(), port.strip()
+    return spec, spec
+
+
+class SerialSource:
+    """Porta serial em modo não bloqueante, para uso com o seletor."""
+
+    def __init__(self, name: str, port: str, baud: int, exhausted: Optional[Callable[[], bool]] = None) -> None:
+        import serial
+
+        self.name = name
+        self.port = port
+        self.ser = serial.Serial(port=port, baudrate=baud, timeout=0)
+        self._exhausted = exhausted
+
+    def fileno(self) -> int:
+        return self.ser.fileno()
+
+    def read_available(self) -> bytes:
+        return self.ser.read(self.ser.in_waiting or 1)
+
+    def pending(self) -> bool:
+        return bool(self.ser.in_waiting)
+
+    def exhausted(self) -> bool:
+        # Portas reais nunca "terminam"; o dispositivo falso informa quando esgotou o arquivo
+        return self._exhausted is not None and self._exhausted()
+
+    def close(self) -> None:
+        try:
+            self.ser.close()
+        except Exception:
+            pass
+
+
+def iter_replay_lines(path: str, feature_cols: Optional[Sequence[str]] = None) -> Iterator[str]:
+    """
+    Linhas a reproduzir a partir de um arquivo.
+
+    Se o arquivo tiver cabeçalho com todas as `feature_cols` (ex.: `data/sensors.csv`,
+    `outputs/predictions.csv`), emite só essas colunas na ordem do modelo, como o
+    firmware envia; caso contrário, repete as linhas do arquivo como estão.
+    """
+    with open(path, "r", encoding="utf-8", errors="ignore") as fh:
+        first = fh.readline()
+        header = [c.strip() for c in first.strip().split(",")]
+        if feature_cols and all(c in header for c in feature_cols):
+            idx = [header.index(c) for c in feature_cols]
+            for row in csv.reader(fh):
+                if row:
+                    yield ",".join(row[i] for i in idx)
+        else:
+            if first.strip():
+                yield first.strip()
+            for line in fh:
+                line = line.strip()
+                if line:
+                    yield line
+
+
+def feed_lines(fd: int, lines: Iterator[str], rate: Optional[float], close_fd: bool = True) -> None:
+    """Escreve `lines` em `fd` a `rate` linhas/s (None ou 0 = o mais rápido possível)."""
+    try:
+        if not rate:
+            chunk: List[str] = []
+            for line in lines:
+                chunk.append(line)
+                if len(chunk) >= 512:
+                    os.write(fd, ("\n".join(chunk) + "\n").encode("utf-8"))
+                    chunk = []
+            if chunk:
+                os.write(fd, ("\n".join(chunk) + "\n").encode("utf-8"))
+            return
+        interval = 1.0 / rate
+        t0 = time.perf_counter()
+        for i, line in enumerate(lines):
+            delay = t0 + i * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            os.write(fd, (line + "\n").encode("utf-8"))
+    except OSError:
+        # Leitor fechou o outro lado
+        pass
+    finally:
+        if close_fd:
+            os.close(fd)
+
+
+class ReplaySource:
+    """Reproduz um arquivo como se fosse uma porta serial, via pipe (POSIX)."""
+
+    def __init__(self, name: str, path: str, rate: Optional[float] = None, feature_cols: Optional[Sequence[str]] = None) -> None:
+        self.name = name
+        self._read_fd, write_fd = os.pipe()
+        self._feeder = threading.Thread(
+            target=feed_lines,
+            args=(write_fd, iter_replay_lines(path, feature_cols), rate),
+            name=f"replay-{name}",
+            daemon=True,
+        )
+        self._feeder.start()
+
+    def fileno(self) -> int:
+        return self._read_fd
+
+    def read_available(self) -> bytes:
+        data = os.read(self._read_fd, 65536)
+        if not data:
+            raise EOFError("fim da reprodução")
+        return data
+
+    def pending(self) -> bool:
+        return True
+
+    def exhausted(self) -> bool:
+        return False
+
+    def close(self) -> None:
+        try:
+            os.close(self._read_fd)
+        except OSError:
+            pass
+
+
+class StdinSource:
+    """Lê linhas da entrada padrão (ex.: `cat leituras.csv | python stream_serial_predict.py --stdin`)."""
+
+    def __init__(self, name: str = "stdin") -> None:
+        self.name = name
+        self._fd = sys.stdin.fileno()
+
+    def fileno(self) -> int:
+        return self._fd
+
+    def read_available(self) -> bytes:
+        data = os.read(self._fd, 65536)
+        if not data:
+            raise EOFError("fim da entrada padrão")
+        return data
+
+    def pending(self) -> bool:
+        return True
+
+    def exhausted(self) -> bool:
+        return False
+
+    def close(self) -> None:
+        pass
+
+
+class FakeSerialDevice:
+    """
+    Dispositivo serial falso sobre um pseudo-terminal (POSIX).
+
+    Uma thread escreve as linhas do arquivo no lado mestre; `path` é o lado
+    escravo (ex.: /dev/pts/5), que pode ser aberto como uma porta serial comum
+    por este processo (`SerialSource`) ou por outro.
+    """
+
+    def __init__(self, path: str, rate: Optional[float] = None, feature_cols: Optional[Sequence[str]] = None) -> None:
+        import pty
+        import tty
+
+        self._master_fd, self._slave_fd = pty.openpty()
+        # Modo raw: sem eco nem tradução de fim de linha no lado escravo
+        tty.setraw(self._slave_fd)
+        self.path = os.ttyname(self._slave_fd)
+        self._feeder = threading.Thread(
+            target=feed_lines,
+            args=(self._master_fd, iter_replay_lines(path, feature_cols), rate, False),
+            name="fake-serial",
+            daemon=True,
+        )
+
+    def start(self) -> "FakeSerialDevice":
+        self._feeder.start()
+        return self
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        self._feeder.join(timeout)
+        return not self._feeder.is_alive()
+
+    def finished(self) -> bool:
+        """Arquivo todo escrito e já consumido pelo lado escravo."""
+        import fcntl
+        import struct
+        import termios
+
+        if self._feeder.is_alive():
+            return False
+        waiting = fcntl.ioctl(self._slave_fd, termios.FIONREAD, struct.pack("i", 0))
+        return struct.unpack("i", waiting)[0] == 0
+
+    def close(self) -> None:
+        for fd in (self._master_fd, self._slave_fd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+class MultiSourceReader:
+    """
+    Lê linhas de várias fontes em uma única thread.
+
+    Em POSIX usa `selectors` sobre os descritores das fontes; quando alguma fonte
+    não expõe `fileno()` (ex.: Serial no Windows) cai para polling de `pending()`.
+    Cada linha sai como `Reading` marcada com o nome da fonte. Quando todas as
+    fontes terminam, `read_line()` levanta `EOFError`.
+    """
+
+    def __init__(self, sources: Sequence, timeout: float = 1.0) -> None:
+        self.sources = list(sources)
+        self.timeout = timeout
+        self._buffers = {id(src): bytearray() for src in self.sources}
+        self._pending: Deque[Reading] = deque()
+        self._active = list(self.sources)
+        self._selector: Optional[selectors.BaseSelector] = None
+        try:
+            selector = selectors.DefaultSelector()
+            for src in self.sources:
+                selector.register(src.fileno(), selectors.EVENT_READ, src)
+            self._selector = selector
+        except (AttributeError, OSError, ValueError):
+            self._selector = None
+
+    def _drop(self, src, reason: str) -> None:
+        print(f"[INFO] Fonte {src.name} encerrada: {reason}", file=sys.stderr)
+        # Última linha sem quebra de linha no fim da fonte
+        self._consume(src, b"\n")
+        if self._selector is not None:
+            try:
+                self._selector.unregister(src.fileno())
+            except (KeyError, ValueError, OSError):
+                pass
+        if src in self._active:
+            self._active.remove(src)
+        src.close()
+
+    def _consume(self, src, chunk: bytes) -> None:
+        buf = self._buffers[id(src)]
+        buf.extend(chunk)
+        if b"\n" not in chunk:
+            return
+        *lines, rest = bytes(buf).split(b"\n")
+        buf[:] = rest
+        t_read = time.perf_counter()
+        for raw in lines:
+            line = raw.decode("utf-8", errors="ignore").strip()
+            if line:
+                self._pending.append(Reading(line=line, source=src.name, t_read=t_read))
+
+    def _ready_sources(self) -> List:
+        if self._selector is not None:
+            return [key.data for key, _ in self._selector.select(self.timeout)]
+        ready = [src for src in self._active if src.pending()]
+        if not ready:
+            time.sleep(min(self.timeout, 0.01))
+        return ready
+
+    def read_line(self) -> Optional[Reading]:
+        if self._pending:
+            return self._pending.popleft()
+        if not self._active:
+            raise EOFError
+        for src in self._ready_sources():
+            try:
+                chunk = src.read_available()
+            except Exception as e:
+                self._drop(src, str(e))
+                continue
+            if chunk:
+                self._consume(src, chunk)
+        for src in list(self._active):
+            if src.exhausted():
+                self._drop(src, "dispositivo esgotado")
+        return self._pending.popleft() if self._pending else None
+
+    def close(self) -> None:
+        for src in list(self._active):
+            src.close()
+        self._active = []
+        if self._selector is not None:
+            self._selector.close()
+
+
+def add_source_args(parser) -> None:
+    """Opções de CLI das fontes de linhas (portas reais, replay, pty, stdin)."""
+    parser.add_argument(
+        "--port",
+        nargs="+",
+        default=[],
+        help="Uma ou mais portas seriais (ex.: /dev/ttyUSB0 /dev/ttyACM0); aceita alias no formato nome=/dev/ttyUSB0",
+    )
+    parser.add_argument("--baud", type=int, default=115200, help="Baud rate")
+    parser.add_argument("--replay", nargs="+", default=[], help="Reproduzir arquivo(s) CSV como fonte (sem hardware)")
+    parser.add_argument("--pty-replay", nargs="+", default=[], help="Reproduzir arquivo(s) por um dispositivo serial falso (pty)")
+    parser.add_argument("--replay-rate", type=float, default=0.0, help="Linhas/s de cada replay (0 = máximo)")
+    parser.add_argument("--stdin", action="store_true", help="Ler linhas da entrada padrão")
+
+
+def build_sources(args, feature_cols: Sequence[str]) -> Tuple[List, List[FakeSerialDevice]]:
+    sources: List = []
+    fakes: List[FakeSerialDevice] = []
+    rate = args.replay_rate or None
+    for spec in args.port:
+        name, port = parse_port_spec(spec)
+        print(f"[INFO] Abrindo {port} @ {args.baud} como {name}...")
+        sources.append(SerialSource(name, port, args.baud))
+    for spec in args.replay:
+        name, path = parse_port_spec(spec)
+        print(f"[INFO] Reproduzindo {path} como {name} ({rate or 'máx.'} linhas/s)...")
+        sources.append(ReplaySource(name, path, rate=rate, feature_cols=feature_cols))
+    for spec in args.pty_replay:
+        name, path = parse_port_spec(spec)
+        fake = FakeSerialDevice(path, rate=rate, feature_cols=feature_cols)
+        print(f"[INFO] Dispositivo falso {fake.path} reproduzindo {path}...")
+        sources.append(SerialSource(name if name != path else fake.path, fake.path, args.baud, exhausted=fake.finished))
+        fakes.append(fake.start())
+    if args.stdin:
+        sources.append(StdinSource())
+    return sources, fakes
@@ -26,10 +26,47 @@ SENSOR_CONFIG = {
         "vibration": (0, 1),
         "luminosity": (0, 4095)
     }
+    # Faixa ideal dos alertas de não conformidade: IDEAL_RANGES em data/conformity.py
 }
 
 # === CONFIGURAÇÕES DE QUERY ===
 QUERY_CONFIG = {
     "default_limit": 100,
-    "max_limit": 1000
-} 
\ No newline at end of file
+    "max_limit": 1000,
+    "default_bucket_s": 60,  # Balde padrão de /sensors/aggregate (segundos)
+    "gzip_min_bytes": 1024  # Respostas JSON menores que isso não são comprimidas
+}
+
+# === PROFILING DE REQUISIÇÕES ===
+PROFILING_CONFIG = {
+    "enabled": False,  # Amostragem por taxa; alternável por POST /admin/profiling ou SIGUSR1
+    "sample_rate": 0.01,  # Fração das requisições perfiladas quando ligado
+    "header": "X-Profile",  # Força o perfil de uma requisição com valor 1/true (ou o admin_token, se definido)
+    "dir": "profiles",  # Relativo a este diretório; arquivos .prof (cProfile)
+    "keep": 50,  # Quantidade de arquivos mantidos (os mais antigos são apagados)
+    "admin_token": None  # Se definido, exigido em X-Admin-Token e como valor de X-Profile; sem ele, /admin/profiling só aceita localhost
+}
+
+# === PRODUÇÃO (launcher.py) ===
+LAUNCHER_CONFIG = {
+    "workers": 4,  # Processos atendendo no mesmo socket
+    "backlog": 1024,  # Fila de conexões do socket compartilhado (segura os POSTs durante o reload)
+    "ready_timeout_s": 30,  # Tempo máximo para um worker novo ficar pronto (import + pool + catálogo)
+    "graceful_timeout_s": 30,  # Tempo para um worker antigo terminar as requisições em andamento
+    "probe_path": "/health"  # Requisição de teste usada para medir o tempo até a primeira resposta
+}
+
+# Pool de conexões e catálogo de sensores, um por worker
+POOL_CONFIG = {
+    "min": 2,
+    "max": 8,
+    "increment": 1,
+    "catalog_ttl_s": 300  # Releitura do catálogo de sensores (sensor novo fora do catálogo é buscado na hora)
+}
+
+# === IDEMPOTÊNCIA DO /data (dedup.py) ===
+DEDUP_CONFIG = {
+    "window_s": 600,  # Reenvios dentro da janela são respondidos sem ir ao banco
+    "max_per_device": 4096,  # Chaves guardadas por dispositivo (as mais antigas saem primeiro)
+    "max_devices": 10000  # Fora da janela/limites, o índice único de message_id barra o duplicado
+}
@@ -0,0 +1,86 @@
+"""
+Janela de deduplicação do POST /data (em memória, por processo).
+
+O firmware reenvia a mesma medição em novas tentativas e para vários servidores
+(`serverURLs` em src/main.cpp), sempre com o mesmo `boot_id` + `seq`. As chaves
+já gravadas ficam aqui por `window_s` segundos, no máximo `max_per_device` por
+dispositivo e `max_devices` dispositivos (os mais antigos saem primeiro): um
+reenvio dentro da janela é respondido sem tocar no banco. Fora da janela, ou
+quando outro worker gravou, quem barra é o índice único `message_id` (ORA-00001).
+"""
+import threading
+import time
+from collections import Counter, OrderedDict
+
+
+def chave_mensagem(data, sensor_id, device_id):
+    """
+    Chave de idempotência da leitura: `message_id` do cliente ou
+    `device_id:boot_id:seq:sensor_id`; None quando o envio não traz nenhum dos dois.
+    Levanta ValueError com `seq` não inteiro.
+    """
+    message_id = data.get('message_id')
+    if message_id not in (None, ''):
+        return str(message_id)[:100]
+    seq = data.get('seq')
+    if seq is None:
+        return None
+    if isinstance(seq, bool) or not isinstance(seq, (int, str)) or not str(seq).isdigit():
+        raise ValueError("seq deve ser um inteiro não negativo")
+    boot_id = data.get('boot_id', '')
+    return f"{device_id or ''}:{boot_id}:{int(seq)}:{sensor_id}"[:100]
+
+
+class JanelaDedup:
+    """Chaves gravadas por dispositivo, com validade fixa e tamanho limitado (thread-safe)."""
+
+    def __init__(self, window_s=600, max_per_device=4096, max_devices=10000):
+        self.window_s = window_s
+        self.max_per_device = max_per_device
+        self.max_devices = max_devices
+        self.stats = Counter()
+        self._devices = OrderedDict()  # dispositivo → OrderedDict(chave → expira_em), ordem de chegada
+        self._lock = threading.Lock()
+
+    def _purgar(self, chaves, agora):
+        # Validade fixa: a ordem de inserção é a ordem de expiração
+        while chaves:
+            chave, expira_em = next(iter(chaves.items()))
+            if expira_em > agora:
+                break
+            chaves.popitem(last=False)
+            self.stats["expired"] += 1
+
+    def contem(self, device, chave):
+        agora = time.monotonic()
+        with self._lock:
+            chaves = self._devices.get(device)
+            if chaves is None:
+                return False
+            self._purgar(chaves, agora)
+            if chave in chaves:
+                self.stats["duplicate"] += 1
+                return True
+            return False
+
+    def registrar(self, device, chave):
+        agora = time.monotonic()
+        with self._lock:
+            chaves = self._devices.get(device)
+            if chaves is None:
+                chaves = self._devices[device] = OrderedDict()
+                while len(self._devices) > self.max_devices:
+                    self._devices.popitem(last=False)
+                    self.stats["evicted_device"] += 1
+            else:
+                self._devices.move_to_end(device)
+                self._purgar(chaves, agora)
+            chaves.pop(chave, None)
+            chaves[chave] = agora + self.window_s
+            while len(chaves) > self.max_per_device:
+                chaves.popitem(last=False)
+                self.stats["evicted"] += 1
+            self.stats["registered"] += 1
+
+    def __len__(self):
+        return sum(len(c) for c in self._devices.values())
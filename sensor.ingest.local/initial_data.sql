@@ -66,6 +66,7 @@ CREATE TABLE sensor_readings (
     sensor_value NUMBER(15,6) NOT NULL,
     quality VARCHAR2(20) DEFAULT 'good' CHECK (quality IN ('good', 'warning', 'error')),
     raw_value NUMBER(15,6),
+    message_id VARCHAR2(100),  -- Chave de idempotência do envio (NULL em leituras sem seq/message_id)
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -130,6 +131,8 @@ CREATE INDEX idx_sensors_status ON sensors(status);
 CREATE INDEX idx_readings_sensor_timestamp ON sensor_readings(sensor_id, timestamp DESC);
 CREATE INDEX idx_readings_timestamp ON sensor_readings(timestamp DESC);
 CREATE INDEX idx_readings_quality ON sensor_readings(quality);
+-- Reenvio da mesma mensagem falha com ORA-00001 (NULLs não entram no índice)
+CREATE UNIQUE INDEX uq_readings_message_id ON sensor_readings(message_id);
 
 -- Índices para ALERTS
 CREATE INDEX idx_alerts_sensor_triggered ON alerts(sensor_id, triggered_at DESC);
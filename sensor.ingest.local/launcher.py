@@ -0,0 +1,327 @@
+"""
+Launcher de produção do servidor de ingestão (no lugar de `python servidor.py`).
+
+- o mestre é leve: não importa Flask, oracledb nem pandas; só abre o socket,
+  roda a checagem de schema uma vez (num processo filho) e cuida dos workers
+- N workers (fork) atendem no mesmo socket; cada um importa o `servidor`
+  depois do fork, abre o próprio pool Oracle já aquecido e carrega o catálogo
+  de sensores antes de aceitar conexões
+- SIGHUP: sobe uma geração nova (com o código atual do disco); só quando todos
+  estão prontos os antigos param de aceitar e terminam o que estão atendendo.
+  O socket nunca fecha, então os POSTs dos dispositivos esperam no backlog
+  em vez de receber conexão recusada
+- SIGTERM/SIGINT: encerramento gracioso de todos os workers
+- SIGUSR1: repassado a todos os workers, alterna o profiling por amostragem
+  em cada um (o estado é por worker; uma geração nova começa com o do config)
+
+Uso:
+    python launcher.py --workers 4
+    kill -HUP $(cat launcher.pid)    # recarregar após o deploy
+    kill -USR1 $(cat launcher.pid)   # alternar o profiling em todos os workers
+"""
+import argparse
+import http.client
+import os
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+
+from config import LAUNCHER_CONFIG, SERVER_CONFIG
+
+
+def criar_socket(host, port, backlog):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def verificar_schema(preload):
+    """Checagem/criação das tabelas uma única vez, antes dos workers."""
+    if preload:
+        import servidor
+        return servidor.executar_initial_data_se_necessario()
+    # Num filho descartável: o mestre continua sem Flask/oracledb e o SIGHUP pega código novo
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            import servidor
+            code = 0 if servidor.executar_initial_data_se_necessario() else 1
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            sys.stdout.flush()
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    return os.waitstatus_to_exitcode(status) == 0
+
+
+def aguardar_requisicoes(timeout):
+    """Espera as threads de requisição em andamento (o werkzeug as cria como daemon)."""
+    deadline = time.monotonic() + timeout
+    for thread in threading.enumerate():
+        if thread is not threading.current_thread() and "process_request_thread" in thread.name:
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+
+def rodar_worker(sock, ready_fd, geracao, graceful_timeout):
+    """Corpo do processo worker (nunca retorna)."""
+    t0 = time.monotonic()
+    code = 0
+    try:
+        # Ctrl+C chega ao grupo todo: quem coordena o encerramento é o mestre
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+
+        import servidor
+        from werkzeug.serving import make_server
+
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, servidor.alternar_profiling)
+
+        t_import = time.monotonic()
+        servidor.preparar_worker()
+        t_pronto = time.monotonic()
+
+        server = make_server(sock.getsockname()[0], sock.getsockname()[1], servidor.app, threaded=True, fd=sock.fileno())
+        sock.close()
+
+        def parar(signum, frame):
+            # shutdown() espera o loop do serve_forever: precisa de outra thread
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+        signal.signal(signal.SIGTERM, parar)
+        print(
+            f"👷 Worker {os.getpid()} (geração {geracao}) pronto em {(t_pronto - t0) * 1000:.0f} ms "
+            f"(import {(t_import - t0) * 1000:.0f} ms, pool + catálogo {(t_pronto - t_import) * 1000:.0f} ms, "
+            f"{len(servidor._catalogo['sensores'])} sensores)",
+            flush=True,
+        )
+        if ready_fd is not None:
+            os.write(ready_fd, b"1")
+            os.close(ready_fd)
+
+        server.serve_forever()
+        aguardar_requisicoes(graceful_timeout)
+        server.server_close()
+        servidor.encerrar_pool()
+        print(f"👋 Worker {os.getpid()} (geração {geracao}) encerrado", flush=True)
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code)
+
+
+class Mestre:
+    def __init__(self, args, sock):
+        self.args = args
+        self.sock = sock
+        self.geracao = 0  # última geração criada (só cresce)
+        self.geracao_ativa = 0  # geração que está atendendo (repõe os que morrem)
+        self.workers = {}  # pid → geração
+        self.recarregar_pedido = False
+        self.parar_pedido = False
+
+    # --- sinais (só marcam; o laço principal age) ---
+    def on_hup(self, signum, frame):
+        self.recarregar_pedido = True
+
+    def on_term(self, signum, frame):
+        self.parar_pedido = True
+
+    def on_usr1(self, signum, frame):
+        # Só repassa (os.kill é seguro aqui): quem alterna o profiling é cada worker
+        self.sinalizar(list(self.workers), signal.SIGUSR1)
+
+    def spawn(self, geracao, aguardar=True):
+        """Cria um worker; com `aguardar`, devolve também o fd que recebe o aviso de pronto."""
+        r, w = os.pipe() if aguardar else (None, None)
+        pid = os.fork()
+        if pid == 0:
+            if r is not None:
+                os.close(r)
+            rodar_worker(self.sock, w, geracao, self.args.graceful_timeout)
+        if w is not None:
+            os.close(w)
+        self.workers[pid] = geracao
+        return pid, r
+
+    def iniciar_geracao(self):
+        """Sobe N workers e espera todos ficarem prontos; devolve (prontos, tempo em s)."""
+        self.geracao += 1
+        t0 = time.monotonic()
+        pendentes = {}  # fd do pipe de prontidão → pid
+        for _ in range(self.args.workers):
+            pid, fd = self.spawn(self.geracao)
+            pendentes[fd] = pid
+        prontos = []
+        deadline = t0 + self.args.ready_timeout
+        while pendentes and time.monotonic() < deadline:
+            legiveis, _, _ = select.select(list(pendentes), [], [], max(0.0, deadline - time.monotonic()))
+            for fd in legiveis:
+                pid = pendentes.pop(fd)
+                if os.read(fd, 1) == b"1":
+                    prontos.append(pid)
+                os.close(fd)
+        for fd in pendentes:
+            os.close(fd)
+        falhos = [pid for pid, g in self.workers.items() if g == self.geracao and pid not in prontos]
+        for pid in falhos:
+            self.matar(pid)
+        return prontos, time.monotonic() - t0
+
+    def matar(self, pid):
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    def sinalizar(self, pids, sig):
+        for pid in pids:
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def medir_primeira_requisicao(self, t0, origem):
+        """Requisição de teste no socket compartilhado: tempo desde `t0` até a primeira resposta."""
+        host = "127.0.0.1" if self.args.host in ("0.0.0.0", "") else self.args.host
+        try:
+            conn = http.client.HTTPConnection(host, self.args.port, timeout=10)
+            conn.request("GET", LAUNCHER_CONFIG["probe_path"])
+            status = conn.getresponse().status
+            conn.close()
+        except OSError as e:
+            print(f"⚠️ Requisição de teste falhou: {e}", flush=True)
+            return None
+        elapsed = time.monotonic() - t0
+        print(f"⏱️ Primeira requisição respondida ({status}) {elapsed * 1000:.0f} ms após {origem}", flush=True)
+        return elapsed
+
+    def recarregar(self):
+        t0 = time.monotonic()
+        antigos = list(self.workers)
+        print(f"🔄 SIGHUP: subindo geração {self.geracao + 1} ({self.args.workers} workers)", flush=True)
+        prontos, duracao = self.iniciar_geracao()
+        if len(prontos) < self.args.workers:
+            # Geração nova incompleta: mantém a antiga atendendo
+            print(f"❌ Só {len(prontos)}/{self.args.workers} workers novos ficaram prontos; geração anterior mantida", flush=True)
+            self.sinalizar(prontos, signal.SIGTERM)
+            return
+        self.geracao_ativa = self.geracao
+        self.sinalizar(antigos, signal.SIGTERM)
+        print(f"✅ Geração {self.geracao} pronta em {duracao * 1000:.0f} ms; {len(antigos)} workers antigos encerrando", flush=True)
+        self.medir_primeira_requisicao(t0, "o SIGHUP")
+
+    def colher(self):
+        """Recolhe workers encerrados; repõe os da geração atual que morreram."""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            geracao = self.workers.pop(pid, None)
+            if geracao == self.geracao_ativa and not self.parar_pedido:
+                print(f"⚠️ Worker {pid} saiu (código {os.waitstatus_to_exitcode(status)}); repondo", flush=True)
+                time.sleep(0.5)  # evita laço de reinício rápido se o worker falha ao subir
+                self.spawn(self.geracao_ativa, aguardar=False)
+
+    def parar(self):
+        print(f"🛑 Encerrando {len(self.workers)} workers...", flush=True)
+        self.sinalizar(list(self.workers), signal.SIGTERM)
+        deadline = time.monotonic() + self.args.graceful_timeout + 5
+        while self.workers and time.monotonic() < deadline:
+            self.colher()
+            time.sleep(0.1)
+        self.sinalizar(list(self.workers), signal.SIGKILL)
+        self.colher()
+
+    def rodar(self, t_inicio):
+        signal.signal(signal.SIGHUP, self.on_hup)
+        signal.signal(signal.SIGTERM, self.on_term)
+        signal.signal(signal.SIGINT, self.on_term)
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, self.on_usr1)
+
+        prontos, duracao = self.iniciar_geracao()
+        if not prontos:
+            print("❌ Nenhum worker ficou pronto", flush=True)
+            self.parar()
+            return 1
+        self.geracao_ativa = self.geracao
+        print(
+            f"🚀 {len(prontos)}/{self.args.workers} workers atendendo em http://{self.args.host}:{self.args.port} "
+            f"(mestre {os.getpid()}, workers prontos em {duracao * 1000:.0f} ms)",
+            flush=True,
+        )
+        self.medir_primeira_requisicao(t_inicio, "o início do launcher")
+
+        while not self.parar_pedido:
+            if self.recarregar_pedido:
+                self.recarregar_pedido = False
+                self.recarregar()
+            self.colher()
+            time.sleep(0.2)
+        self.parar()
+        return 0
+
+
+def main():
+    t_inicio = time.monotonic()
+    parser = argparse.ArgumentParser(description="Servidor de ingestão em produção: workers pré-forkados no mesmo socket")
+    parser.add_argument("--host", default=SERVER_CONFIG["host"], help="Endereço de escuta")
+    parser.add_argument("--port", type=int, default=SERVER_CONFIG["port"], help="Porta")
+    parser.add_argument("--workers", type=int, default=LAUNCHER_CONFIG["workers"], help="Número de workers")
+    parser.add_argument("--backlog", type=int, default=LAUNCHER_CONFIG["backlog"], help="Fila de conexões do socket")
+    parser.add_argument("--ready-timeout", type=float, default=LAUNCHER_CONFIG["ready_timeout_s"], help="Tempo máximo para um worker ficar pronto (s)")
+    parser.add_argument("--graceful-timeout", type=float, default=LAUNCHER_CONFIG["graceful_timeout_s"], help="Tempo para terminar requisições em andamento (s)")
+    parser.add_argument("--skip-schema-check", action="store_true", help="Não verificar/criar as tabelas ao subir")
+    parser.add_argument(
+        "--preload",
+        action="store_true",
+        help="Importar o servidor no mestre (workers sobem mais rápido, mas o SIGHUP não recarrega o código)",
+    )
+    parser.add_argument("--pid-file", default=None, help="Gravar o PID do mestre (para kill -HUP)")
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        print("❌ O launcher usa fork (Linux/macOS). No Windows rode: python servidor.py")
+        return 1
+
+    print("🚀 Iniciando launcher do servidor de ingestão IoT...", flush=True)
+    if not args.skip_schema_check:
+        print("🔍 Verificando estrutura do banco de dados...", flush=True)
+        if not verificar_schema(args.preload):
+            print("❌ Problemas na configuração do banco. Verifique os logs.")
+            return 1
+        print("✅ Banco de dados pronto!", flush=True)
+
+    sock = criar_socket(args.host, args.port, args.backlog)
+    if args.pid_file:
+        with open(args.pid_file, "w") as f:
+            f.write(f"{os.getpid()}\n")
+    try:
+        return Mestre(args, sock).rodar(t_inicio)
+    finally:
+        sock.close()
+        if args.pid_file and os.path.exists(args.pid_file):
+            os.remove(args.pid_file)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,22 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g
+import cProfile
+import glob
+import gzip
+import os
+import random
+import re
+import signal
+import sys
+import threading
+import time
 import oracledb
-from datetime import datetime
-from config import DB_CONFIG, SERVER_CONFIG, SENSOR_CONFIG, QUERY_CONFIG
+from datetime import datetime, timedelta
+from config import DB_CONFIG, SERVER_CONFIG, SENSOR_CONFIG, QUERY_CONFIG, PROFILING_CONFIG, POOL_CONFIG, DEDUP_CONFIG
+from dedup import JanelaDedup, chave_mensagem
+
+# Análises de conformidade compartilhadas com o dashboard (data/conformity.py).
+# pandas/conformity só são importados nas rotas de análise: o worker sobe mais rápido
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data"))
 
 app = Flask(__name__)
 
@@ -11,10 +26,117 @@ DB_PASSWORD = DB_CONFIG["password"]
 DB_DSN = DB_CONFIG["dsn"]
 TABLE_NAME = DB_CONFIG["table_name"]
 
+# Reenvios do firmware (mesmo boot_id + seq) respondidos sem ir ao banco; ver dedup.py
+janela_dedup = JanelaDedup(
+    window_s=DEDUP_CONFIG["window_s"],
+    max_per_device=DEDUP_CONFIG["max_per_device"],
+    max_devices=DEDUP_CONFIG["max_devices"],
+)
+
+# *** Pool de conexões e catálogo de sensores (workers do launcher.py) ***
+# Rodando servidor.py direto, sem pool: cada requisição abre e fecha a própria conexão
+_pool = None
+_catalogo = {"sensores": {}, "carregado_em": None}
+_catalogo_lock = threading.Lock()
+
+
+def inicializar_pool():
+    """Cria o pool do processo (depois do fork) e já abre as conexões mínimas."""
+    global _pool
+    _pool = oracledb.create_pool(
+        user=DB_USER,
+        password=DB_PASSWORD,
+        dsn=DB_DSN,
+        min=POOL_CONFIG["min"],
+        max=POOL_CONFIG["max"],
+        increment=POOL_CONFIG["increment"],
+    )
+    conns = [_pool.acquire() for _ in range(POOL_CONFIG["min"])]
+    for conn in conns:
+        conn.ping()
+        conn.close()
+    return _pool
+
+
+def encerrar_pool():
+    global _pool
+    if _pool is not None:
+        _pool.close(force=True)
+        _pool = None
+
+
+def carregar_catalogo():
+    """Lê todos os sensores (tipo, faixa, precisão) para o catálogo em memória."""
+    conn, cursor = conectar_db()
+    if not (conn and cursor):
+        return False
+    try:
+        cursor.execute("""
+            SELECT s.sensor_id, s.sensor_type, st.min_value, st.max_value, st.precision_digits
+            FROM sensors s
+            JOIN sensor_types st ON s.sensor_type = st.type_id
+        """)
+        _catalogo["sensores"] = {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
+        _catalogo["carregado_em"] = time.monotonic()
+        return True
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def preparar_worker():
+    """Pool quente e catálogo carregado antes de o worker aceitar conexões."""
+    inicializar_pool()
+    carregar_catalogo()
+
+
+def obter_sensor(sensor_id):
+    """
+    (sensor_type, min_value, max_value, precision_digits) do sensor, ou None se
+    não existe. Com o catálogo carregado (workers do launcher) não vai ao banco;
+    o catálogo é relido a cada POOL_CONFIG["catalog_ttl_s"] e um sensor novo,
+    ainda fora dele, é buscado e incluído. Levanta ConnectionError sem banco.
+    """
+    carregado_em = _catalogo["carregado_em"]
+    if carregado_em is not None:
+        if time.monotonic() - carregado_em > POOL_CONFIG["catalog_ttl_s"] and _catalogo_lock.acquire(blocking=False):
+            # Uma thread recarrega; as demais seguem com o catálogo anterior
+            try:
+                if not carregar_catalogo():
+                    _catalogo["carregado_em"] = time.monotonic()
+            except oracledb.Error as error:
+                # Banco instável: segue com o catálogo anterior e tenta de novo no próximo TTL
+                print(f"⚠️ Falha ao recarregar o catálogo de sensores: {error}")
+                _catalogo["carregado_em"] = time.monotonic()
+            finally:
+                _catalogo_lock.release()
+        sensor = _catalogo["sensores"].get(sensor_id)
+        if sensor is not None:
+            return sensor
+
+    conn, cursor = conectar_db()
+    if not (conn and cursor):
+        raise ConnectionError("Erro de conexão com banco de dados")
+    try:
+        cursor.execute("""
+            SELECT s.sensor_type, st.min_value, st.max_value, st.precision_digits
+            FROM sensors s
+            JOIN sensor_types st ON s.sensor_type = st.type_id
+            WHERE s.sensor_id = :sensor_id
+        """, sensor_id=sensor_id)
+        result = cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
+    if result and carregado_em is not None:
+        _catalogo["sensores"][sensor_id] = tuple(result)
+    return result
+
+
 def conectar_db():
-    """Conecta ao banco de dados Oracle."""
+    """Conecta ao banco de dados Oracle (conexão do pool, quando existe)."""
     try:
-        conn = oracledb.connect(user=DB_USER, password=DB_PASSWORD, dsn=DB_DSN)
+        conn = _pool.acquire() if _pool is not None else oracledb.connect(user=DB_USER, password=DB_PASSWORD, dsn=DB_DSN)
         cursor = conn.cursor()
         print("Conectado ao Oracle DB com sucesso!")
         return conn, cursor
@@ -44,6 +166,7 @@ def executar_initial_data_se_necessario():
                 
                 if tabelas_existentes >= 6:
                     print("✅ Todas as tabelas já existem")
+                    garantir_coluna_message_id(cursor)
                     return True
             finally:
                 cursor.close()
@@ -151,9 +274,30 @@ def executar_initial_data_se_necessario():
         print(f"🔍 Traceback:\n{traceback.format_exc()}")
         return False
 
-def inserir_dados_sensor(sensor_id, sensor_value, timestamp_read=None, quality="good", raw_value=None):
+def garantir_coluna_message_id(cursor):
+    """Bancos criados antes da idempotência: adiciona message_id e o índice único."""
+    cursor.execute("""
+        SELECT COUNT(*) FROM user_tab_columns
+        WHERE table_name = 'SENSOR_READINGS' AND column_name = 'MESSAGE_ID'
+    """)
+    if cursor.fetchone()[0]:
+        return
+    print("🔧 Adicionando sensor_readings.message_id (idempotência do /data)...")
+    cursor.execute(f"ALTER TABLE {TABLE_NAME} ADD message_id VARCHAR2(100)")
+    cursor.execute(f"CREATE UNIQUE INDEX uq_readings_message_id ON {TABLE_NAME}(message_id)")
+
+
+def violacao_unica(error):
+    """ORA-00001: a mesma message_id já foi gravada (por outro worker ou fora da janela)."""
+    detalhe = error.args[0] if error.args else None
+    return getattr(detalhe, "code", None) == 1 or "ORA-00001" in str(error)
+
+
+def inserir_dados_sensor(sensor_id, sensor_value, timestamp_read=None, quality="good", raw_value=None, message_id=None):
     """
     Insere dados na tabela SENSOR_READINGS.
+
+    Retorna "inserida", "duplicada" (message_id já gravada) ou None em caso de erro.
     """
     conn, cursor = conectar_db()
     if conn and cursor:
@@ -161,9 +305,9 @@ def inserir_dados_sensor(sensor_id, sensor_value, timestamp_read=None, quality="
             if timestamp_read is None:
                 # Usar timestamp atual
                 cursor.execute(f"""
-                    INSERT INTO {TABLE_NAME} (sensor_id, sensor_value, quality, raw_value)
-                    VALUES (:sensor_id, :sensor_value, :quality, :raw_value)
-                """, sensor_id=sensor_id, sensor_value=sensor_value, quality=quality, raw_value=raw_value)
+                    INSERT INTO {TABLE_NAME} (sensor_id, sensor_value, quality, raw_value, message_id)
+                    VALUES (:sensor_id, :sensor_value, :quality, :raw_value, :message_id)
+                """, sensor_id=sensor_id, sensor_value=sensor_value, quality=quality, raw_value=raw_value, message_id=message_id)
             else:
                 # Processar timestamp fornecido
                 try:
@@ -181,35 +325,39 @@ def inserir_dados_sensor(sensor_id, sensor_value, timestamp_read=None, quality="
                         timestamp_dt = datetime.now()
                     
                     cursor.execute(f"""
-                        INSERT INTO {TABLE_NAME} (sensor_id, sensor_value, timestamp, quality, raw_value)
-                        VALUES (:sensor_id, :sensor_value, :timestamp, :quality, :raw_value)
+                        INSERT INTO {TABLE_NAME} (sensor_id, sensor_value, timestamp, quality, raw_value, message_id)
+                        VALUES (:sensor_id, :sensor_value, :timestamp, :quality, :raw_value, :message_id)
                     """, sensor_id=sensor_id, sensor_value=sensor_value, 
-                        timestamp=timestamp_dt, quality=quality, raw_value=raw_value)
+                        timestamp=timestamp_dt, quality=quality, raw_value=raw_value, message_id=message_id)
                         
                 except (ValueError, OSError) as e:
                     print(f"❌ Erro ao processar timestamp: {e}")
                     # Fallback para timestamp atual
                     cursor.execute(f"""
-                        INSERT INTO {TABLE_NAME} (sensor_id, sensor_value, quality, raw_value)
-                        VALUES (:sensor_id, :sensor_value, :quality, :raw_value)
-                    """, sensor_id=sensor_id, sensor_value=sensor_value, quality=quality, raw_value=raw_value)
+                        INSERT INTO {TABLE_NAME} (sensor_id, sensor_value, quality, raw_value, message_id)
+                        VALUES (:sensor_id, :sensor_value, :quality, :raw_value, :message_id)
+                    """, sensor_id=sensor_id, sensor_value=sensor_value, quality=quality, raw_value=raw_value, message_id=message_id)
             
             conn.commit()
             print(f"✅ Dados inseridos com sucesso: {sensor_id} = {sensor_value} (Q: {quality})")
-            return True
+            return "inserida"
             
         except oracledb.Error as error:
+            if message_id is not None and violacao_unica(error):
+                print(f"♻️ Reenvio já gravado (message_id {message_id}): ignorado")
+                conn.rollback()
+                return "duplicada"
             print(f"❌ Erro Oracle ao inserir dados: {error}")
             if conn:
                 print(f"🔄 Executando rollback...")
                 conn.rollback()
-            return False
+            return None
         except Exception as e:
             print(f"❌ Erro geral ao inserir dados: {e}")
             if conn:
                 print(f"🔄 Executando rollback...")
                 conn.rollback()
-            return False
+            return None
         finally:
             if cursor:
                 cursor.close()
@@ -217,60 +365,53 @@ def inserir_dados_sensor(sensor_id, sensor_value, timestamp_read=None, quality="
                 conn.close()
     else:
         print("❌ Falha na conexão com o banco de dados")
-        return False
+        return None
 
 def validate_sensor_data(sensor_id, sensor_value, timestamp=None, sensor_type=None):
     """
     Valida dados do sensor.
     """
-    # 1. Validar se sensor_id existe na tabela SENSORS
-    conn, cursor = conectar_db()
-    if conn and cursor:
-        try:
-            cursor.execute("""
-                SELECT s.sensor_type, st.min_value, st.max_value, st.precision_digits
-                FROM sensors s
-                JOIN sensor_types st ON s.sensor_type = st.type_id
-                WHERE s.sensor_id = :sensor_id
-            """, sensor_id=sensor_id)
-            
-            result = cursor.fetchone()
-            if not result:
-                return False, f"Sensor ID '{sensor_id}' não encontrado na base de dados", 400
-                
-            db_sensor_type, min_val, max_val, precision = result
-            
-            # 2. Validar tipo de sensor se fornecido
-            if sensor_type and sensor_type != db_sensor_type:
-                return False, f"Tipo de sensor incorreto. Esperado: {db_sensor_type}, recebido: {sensor_type}", 400
-            
-            # 3. Validar faixa de valores
-            if min_val is not None and max_val is not None:
-                if not (min_val <= sensor_value <= max_val):
-                    return False, f"Valor fora da faixa válida. Esperado: {min_val}-{max_val}, recebido: {sensor_value}", 400
-            
-            # 4. Validar timestamp se fornecido
-            if timestamp is not None:
-                try:
-                    if timestamp > 1e12:
-                        timestamp = timestamp / 1000
-                    timestamp_dt = datetime.fromtimestamp(timestamp)
-                    min_date = datetime(2024, 1, 1)
-                    max_date = datetime(2030, 12, 31)
-                    if not (min_date <= timestamp_dt <= max_date):
-                        return False, f"Timestamp fora do intervalo válido (2024-2030)", 400
-                except (ValueError, OSError):
-                    return False, "Timestamp inválido", 400
-            
-            return True, None, None
-            
-        finally:
-            if cursor:
-                cursor.close()
-            if conn:
-                conn.close()
-    else:
+    # 1. Validar se sensor_id existe na tabela SENSORS (catálogo em memória nos workers)
+    try:
+        result = obter_sensor(sensor_id)
+    except ConnectionError:
         return False, "Erro de conexão com banco de dados", 500
+    if not result:
+        return False, f"Sensor ID '{sensor_id}' não encontrado na base de dados", 400
+
+    db_sensor_type, min_val, max_val, precision = result
+
+    # 2. Validar tipo de sensor se fornecido
+    if sensor_type and sensor_type != db_sensor_type:
+        return False, f"Tipo de sensor incorreto. Esperado: {db_sensor_type}, recebido: {sensor_type}", 400
+
+    # 3. Validar faixa de valores
+    if min_val is not None and max_val is not None:
+        if not (min_val <= sensor_value <= max_val):
+            return False, f"Valor fora da faixa válida. Esperado: {min_val}-{max_val}, recebido: {sensor_value}", 400
+
+    # 4. Validar timestamp se fornecido
+    if timestamp is not None:
+        try:
+            if timestamp > 1e12:
+                timestamp = timestamp / 1000
+            timestamp_dt = datetime.fromtimestamp(timestamp)
+            min_date = datetime(2024, 1, 1)
+            max_date = datetime(2030, 12, 31)
+            if not (min_date <= timestamp_dt <= max_date):
+                return False, f"Timestamp fora do intervalo válido (2024-2030)", 400
+        except (ValueError, OSError):
+            return False, "Timestamp inválido", 400
+
+    return True, None, None
+
+def resposta_duplicada(sensor_id, device_id, message_id):
+    """200 para o firmware tratar o reenvio como entregue (nenhuma linha nova)."""
+    return jsonify({
+        "status": "duplicate",
+        "message": "Leitura já recebida anteriormente; nada foi gravado",
+        "data": {"sensor_id": sensor_id, "device_id": device_id, "message_id": message_id}
+    }), 200
 
 @app.route('/data', methods=['POST'])
 def receive_data():
@@ -356,7 +497,17 @@ def receive_data():
                 "details": "sensor_value deve ser numérico, timestamp deve ser numérico (opcional)"
             }), 400
 
-        # 6. Validação principal
+        # 6. Reenvio (mesmo boot_id + seq ou message_id) já gravado: responde sem tocar no banco
+        try:
+            message_id = chave_mensagem(data, sensor_id, device_id)
+        except ValueError as e:
+            return jsonify({"error": "Tipos de dados inválidos", "details": str(e)}), 400
+        dispositivo = device_id or sensor_id
+        if message_id is not None and janela_dedup.contem(dispositivo, message_id):
+            print(f"♻️ Reenvio ignorado: {message_id}")
+            return resposta_duplicada(sensor_id, device_id, message_id)
+
+        # 7. Validação principal
         print(f"🔍 Validando dados do sensor...")
         is_valid, error_msg, error_code = validate_sensor_data(
             sensor_id, sensor_value, timestamp_param, sensor_type
@@ -376,12 +527,17 @@ def receive_data():
                 }
             }), error_code
 
-        # 7. Inserir dados
+        # 8. Inserir dados
         # Log da qualidade recebida
         print(f"✅ Dados válidos: {sensor_id} = {sensor_value} (Q: {quality})")
         print(f"💾 Tentando salvar no banco...")
 
-        if inserir_dados_sensor(sensor_id, sensor_value, timestamp_param, quality, raw_value):
+        resultado = inserir_dados_sensor(sensor_id, sensor_value, timestamp_param, quality, raw_value, message_id)
+        if resultado and message_id is not None:
+            janela_dedup.registrar(dispositivo, message_id)
+        if resultado == "duplicada":
+            return resposta_duplicada(sensor_id, device_id, message_id)
+        if resultado == "inserida":
             print(f"🎉 SUCESSO! Dados salvos no banco")
             return jsonify({
                 "status": "success",
@@ -392,7 +548,8 @@ def receive_data():
                     "sensor_type": sensor_type,
                     "sensor_value": sensor_value,
                     "quality": quality,
-                    "raw_value": raw_value
+                    "raw_value": raw_value,
+                    "message_id": message_id
                 }
             }), 200
         else:
@@ -412,40 +569,80 @@ def receive_data():
             "details": "Verifique logs do servidor para mais informações"
         }), 500
 
+def parse_time_param(value):
+    """Converte ISO 8601 ou epoch (s ou ms) em datetime; ValueError se inválido."""
+    try:
+        number = float(value)
+    except ValueError:
+        return datetime.fromisoformat(value.replace("Z", ""))
+    return datetime.fromtimestamp(number / 1000 if number > 1e12 else number)
+
+
+def montar_filtros_leituras(args):
+    """
+    Condições SQL e binds comuns a /sensors e /sensors/aggregate.
+
+    Filtros: sensor_id, device_id, device_name, sensor_type (aceita lista separada
+    por vírgula), since/until (ISO 8601 ou epoch s/ms; intervalo [since, until)).
+    """
+    conditions = []
+    params = {}
+    if args.get('sensor_id'):
+        conditions.append("sr.sensor_id = :sensor_id")
+        params['sensor_id'] = args['sensor_id']
+    if args.get('device_id'):
+        conditions.append("d.device_id = :device_id")
+        params['device_id'] = args['device_id']
+    if args.get('device_name'):
+        conditions.append("d.device_name = :device_name")
+        params['device_name'] = args['device_name']
+    if args.get('sensor_type'):
+        tipos = [t.strip() for t in args['sensor_type'].split(',') if t.strip()]
+        binds = []
+        for i, tipo in enumerate(tipos):
+            binds.append(f":sensor_type_{i}")
+            params[f"sensor_type_{i}"] = tipo
+        conditions.append(f"s.sensor_type IN ({', '.join(binds)})")
+    if args.get('since'):
+        conditions.append("sr.timestamp >= :since")
+        params['since'] = parse_time_param(args['since'])
+    if args.get('until'):
+        conditions.append("sr.timestamp < :until")
+        params['until'] = parse_time_param(args['until'])
+    return conditions, params
+
+
+READINGS_FROM = """
+            FROM sensor_readings sr
+            JOIN sensors s ON sr.sensor_id = s.sensor_id
+            JOIN devices d ON s.device_id = d.device_id
+"""
+
+
 @app.route('/sensors', methods=['GET'])
 def get_sensor_data():
     """Lista as leituras dos sensores com filtros opcionais."""
+    try:
+        conditions, params = montar_filtros_leituras(request.args)
+        limit = min(int(request.args.get('limit', QUERY_CONFIG["default_limit"])), QUERY_CONFIG["max_limit"])
+    except ValueError as e:
+        return jsonify({"error": "Parâmetros inválidos", "details": str(e)}), 400
+
     conn, cursor = conectar_db()
     if not (conn and cursor):
         return jsonify({"error": "Erro de conexão com banco"}), 500
 
     try:
-        sensor_id = request.args.get('sensor_id')
-        device_id = request.args.get('device_id')
-        limit = request.args.get('limit', str(QUERY_CONFIG["default_limit"]))
-        
         query = """
             SELECT sr.reading_id, sr.sensor_id, sr.timestamp, sr.sensor_value, 
                    sr.quality, s.sensor_name, s.sensor_type, d.device_name
-            FROM sensor_readings sr
-            JOIN sensors s ON sr.sensor_id = s.sensor_id
-            JOIN devices d ON s.device_id = d.device_id
-        """
-        params = {}
-        
-        conditions = []
-        if sensor_id:
-            conditions.append("sr.sensor_id = :sensor_id")
-            params['sensor_id'] = sensor_id
-        if device_id:
-            conditions.append("d.device_id = :device_id")
-            params['device_id'] = device_id
-            
+        """ + READINGS_FROM
+
         if conditions:
             query += " WHERE " + " AND ".join(conditions)
             
         query += " ORDER BY sr.timestamp DESC FETCH FIRST :limit ROWS ONLY"
-        params['limit'] = int(limit)
+        params['limit'] = limit
 
         cursor.execute(query, params)
         
@@ -474,6 +671,350 @@ def get_sensor_data():
         if conn:
             conn.close()
 
+
+def consultar_agregado(cursor, conditions, params, bucket):
+    """
+    Executa a agregação por (bucket, tipo, dispositivo, qualidade) e devolve as
+    linhas como dicts (bucket_start em ISO 8601). As contagens n_below/n_above
+    usam a faixa ideal de data/conformity.py.
+    """
+    from conformity import IDEAL_RANGES
+
+    # Faixa ideal por tipo como CASE (os valores vêm do código, não da requisição)
+    low_cases = " ".join(f"WHEN '{tipo}' THEN {low}" for tipo, (low, _high) in IDEAL_RANGES.items())
+    high_cases = " ".join(f"WHEN '{tipo}' THEN {high}" for tipo, (_low, high) in IDEAL_RANGES.items())
+    # Bucket calculado numa subconsulta: o GROUP BY externo usa só colunas
+    # (com o bind repetido no GROUP BY o Oracle não casa as expressões)
+    inner = """
+        SELECT FLOOR(ROUND((CAST(sr.timestamp AS DATE) - DATE '1970-01-01') * 86400) / :bucket) * :bucket AS bucket_start,
+               s.sensor_type, d.device_name, sr.quality, sr.sensor_value
+    """ + READINGS_FROM
+    if conditions:
+        inner += " WHERE " + " AND ".join(conditions)
+    query = f"""
+        SELECT bucket_start, sensor_type, device_name, quality,
+               COUNT(*) AS n, AVG(sensor_value) AS avg_value,
+               MIN(sensor_value) AS min_value, MAX(sensor_value) AS max_value,
+               SUM(sensor_value) AS sum_value, SUM(sensor_value * sensor_value) AS sumsq_value,
+               SUM(CASE WHEN sensor_value < CASE sensor_type {low_cases} END THEN 1 ELSE 0 END) AS n_below,
+               SUM(CASE WHEN sensor_value > CASE sensor_type {high_cases} END THEN 1 ELSE 0 END) AS n_above
+        FROM ({inner})
+        GROUP BY bucket_start, sensor_type, device_name, quality
+        ORDER BY bucket_start
+    """
+    params = dict(params, bucket=bucket)
+    cursor.arraysize = 5000
+    cursor.execute(query, params)
+
+    columns = [desc[0].lower() for desc in cursor.description]
+    results = []
+    for row in cursor:
+        record = dict(zip(columns, row))
+        # Época sem fuso, igual às colunas TIMESTAMP da tabela
+        record['bucket_start'] = (datetime(1970, 1, 1) + timedelta(seconds=int(record['bucket_start']))).isoformat()
+        for col in ('n', 'n_below', 'n_above'):
+            record[col] = int(record[col] or 0)
+        results.append(record)
+    return results
+
+
+def ler_filtros_agregado(default_bucket):
+    """Filtros de /sensors mais `bucket` (segundos, positivo). ValueError se inválido."""
+    conditions, params = montar_filtros_leituras(request.args)
+    bucket = int(request.args.get('bucket', default_bucket))
+    if bucket <= 0:
+        raise ValueError("bucket deve ser positivo")
+    return conditions, params, bucket
+
+
+@app.route('/sensors/aggregate', methods=['GET'])
+def get_sensor_aggregate():
+    """
+    Leituras agregadas por balde de tempo, tipo de sensor, dispositivo e qualidade.
+
+    `bucket` em segundos (padrão 60). Mesmos filtros de /sensors. Cada linha traz
+    n, avg, min, max, sum e sumsq (para desvio padrão) e n_below/n_above em relação
+    à faixa ideal. O tamanho da resposta depende do período / bucket, não do
+    número de leituras.
+    """
+    try:
+        conditions, params, bucket = ler_filtros_agregado(QUERY_CONFIG["default_bucket_s"])
+    except ValueError as e:
+        return jsonify({"error": "Parâmetros inválidos", "details": str(e)}), 400
+
+    conn, cursor = conectar_db()
+    if not (conn and cursor):
+        return jsonify({"error": "Erro de conexão com banco"}), 500
+
+    try:
+        results = consultar_agregado(cursor, conditions, params, bucket)
+        return jsonify({
+            "status": "success",
+            "bucket": bucket,
+            "count": len(results),
+            "data": results
+        })
+
+    except Exception as e:
+        print(f"❌ Erro ao agregar dados: {e}")
+        return jsonify({"error": str(e)}), 500
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+
+@app.route('/analytics/conformity', methods=['GET'])
+def get_conformity():
+    """
+    Relatório de não conformidade do período (mesmos filtros de /sensors/aggregate,
+    bucket padrão de 1 h): totais por tipo, leituras fora da faixa ideal, eventos
+    de vibração, qualidade e médias por hora. Mesmo cálculo do dashboard.
+    """
+    try:
+        conditions, params, bucket = ler_filtros_agregado(3600)
+    except ValueError as e:
+        return jsonify({"error": "Parâmetros inválidos", "details": str(e)}), 400
+
+    conn, cursor = conectar_db()
+    if not (conn and cursor):
+        return jsonify({"error": "Erro de conexão com banco"}), 500
+
+    try:
+        import pandas as pd
+        from conformity import IDEAL_RANGES, build_report
+
+        agg = pd.DataFrame(consultar_agregado(cursor, conditions, params, bucket))
+        if not agg.empty:
+            agg['bucket_start'] = pd.to_datetime(agg['bucket_start'])
+        report = build_report(agg, IDEAL_RANGES)
+        return jsonify({"status": "success", "bucket": bucket, **report.to_dict()})
+
+    except Exception as e:
+        print(f"❌ Erro ao calcular conformidade: {e}")
+        return jsonify({"error": str(e)}), 500
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+
+@app.route('/sensors/watermark', methods=['GET'])
+def get_watermark():
+    """
+    Marca d'água de ingestão: maior reading_id gravado (leitura do índice da PK).
+    Caches de leitura comparam esse valor para saber se chegou dado novo.
+    """
+    conn, cursor = conectar_db()
+    if not (conn and cursor):
+        return jsonify({"error": "Erro de conexão com banco"}), 500
+
+    try:
+        cursor.execute(f"SELECT MAX(reading_id) FROM {TABLE_NAME}")
+        reading_id = cursor.fetchone()[0]
+        return jsonify({"status": "success", "reading_id": int(reading_id) if reading_id is not None else None})
+    except Exception as e:
+        print(f"❌ Erro ao consultar marca d'água: {e}")
+        return jsonify({"error": str(e)}), 500
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+
+@app.route('/devices', methods=['GET'])
+def get_devices():
+    """Lista os dispositivos cadastrados (para filtros, sem varrer as leituras)."""
+    conn, cursor = conectar_db()
+    if not (conn and cursor):
+        return jsonify({"error": "Erro de conexão com banco"}), 500
+
+    try:
+        cursor.execute("""
+            SELECT device_id, device_name, device_type, location, status, last_seen
+            FROM devices
+            ORDER BY device_name
+        """)
+        columns = [desc[0].lower() for desc in cursor.description]
+        results = []
+        for row in cursor:
+            record = dict(zip(columns, row))
+            if record.get('last_seen'):
+                record['last_seen'] = record['last_seen'].isoformat()
+            results.append(record)
+        return jsonify({"status": "success", "count": len(results), "data": results})
+    except Exception as e:
+        print(f"❌ Erro ao listar dispositivos: {e}")
+        return jsonify({"error": str(e)}), 500
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+
+# *** Profiling por amostragem ***
+# Desligado, o custo por requisição é uma leitura de cabeçalho e um teste de flag.
+# Ligado (ou com o cabeçalho X-Profile), a requisição roda sob cProfile e o
+# resultado vai para PROFILING_CONFIG["dir"] (abrir com `python -m pstats` ou snakeviz).
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), PROFILING_CONFIG["dir"])
+profiling_state = {
+    "enabled": PROFILING_CONFIG["enabled"],
+    "sample_rate": PROFILING_CONFIG["sample_rate"],
+    "profiled": 0,
+    "skipped_busy": 0,
+}
+# cProfile não perfila duas requisições ao mesmo tempo: uma por vez, as demais seguem sem perfil
+_profile_lock = threading.Lock()
+
+
+VALORES_VERDADEIROS = {"1", "true", "yes", "on", "sim"}
+ENDERECOS_LOCAIS = {"127.0.0.1", "::1", "::ffff:127.0.0.1"}
+
+
+def admin_autorizado():
+    """Com `admin_token`, exige o token em X-Admin-Token; sem ele, só aceita chamadas da própria máquina."""
+    token = PROFILING_CONFIG["admin_token"]
+    if token is not None:
+        return request.headers.get('X-Admin-Token') == token
+    return request.remote_addr in ENDERECOS_LOCAIS
+
+
+def deve_perfilar():
+    forced = request.headers.get(PROFILING_CONFIG["header"])
+    if forced is not None:
+        token = PROFILING_CONFIG["admin_token"]
+        if token is not None:
+            return forced == token
+        return forced.strip().lower() in VALORES_VERDADEIROS
+    return profiling_state["enabled"] and random.random() < profiling_state["sample_rate"]
+
+
+def rotacionar_perfis():
+    arquivos = sorted(glob.glob(os.path.join(PROFILE_DIR, "*.prof")), key=os.path.getmtime)
+    for antigo in arquivos[:-PROFILING_CONFIG["keep"]]:
+        try:
+            os.remove(antigo)
+        except OSError:
+            pass
+
+
+def finalizar_perfil():
+    perfil = g.pop("perfil", None)
+    if perfil is None:
+        return None
+    prof, inicio = perfil
+    try:
+        prof.disable()
+    finally:
+        _profile_lock.release()
+    duracao_ms = (time.perf_counter() - inicio) * 1000
+    rota = re.sub(r"[^A-Za-z0-9]+", "_", request.path).strip("_") or "root"
+    agora = time.time()
+    nome = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(agora))}-{int(agora * 1000) % 1000:03d}-{request.method}-{rota}-{duracao_ms:.0f}ms.prof"
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        prof.dump_stats(os.path.join(PROFILE_DIR, nome))
+        rotacionar_perfis()
+        profiling_state["profiled"] += 1
+    except OSError as e:
+        print(f"⚠️ Falha ao gravar perfil: {e}")
+        return None
+    return nome
+
+
+@app.before_request
+def iniciar_perfil():
+    if not deve_perfilar():
+        return None
+    if not _profile_lock.acquire(blocking=False):
+        profiling_state["skipped_busy"] += 1
+        return None
+    prof = cProfile.Profile()
+    g.perfil = (prof, time.perf_counter())
+    prof.enable()
+    return None
+
+
+@app.after_request
+def encerrar_perfil(response):
+    nome = finalizar_perfil()
+    if nome:
+        response.headers['X-Profile-File'] = nome
+    return response
+
+
+@app.teardown_request
+def liberar_perfil(exc):
+    # Exceção não tratada pula o after_request: o perfil ainda é gravado e o lock liberado
+    finalizar_perfil()
+
+
+def alternar_profiling(signum=None, frame=None):
+    profiling_state["enabled"] = not profiling_state["enabled"]
+    estado = "ligado" if profiling_state["enabled"] else "desligado"
+    print(f"🔬 Profiling por amostragem {estado} (taxa {profiling_state['sample_rate']})")
+
+
+@app.route('/admin/profiling', methods=['GET', 'POST'])
+def admin_profiling():
+    """
+    Estado do profiling (GET) ou alteração em tempo de execução (POST JSON
+    com `enabled` e/ou `sample_rate`). Lista os perfis mais recentes.
+    Sob o launcher o estado é do worker que atendeu (`worker_pid`); para todos,
+    use `kill -USR1` no mestre.
+    """
+    if not admin_autorizado():
+        return jsonify({"error": "Acesso negado: defina admin_token ou chame a partir de localhost"}), 403
+
+    if request.method == 'POST':
+        body = request.get_json(silent=True) or {}
+        try:
+            if "sample_rate" in body:
+                rate = float(body["sample_rate"])
+                if not 0.0 <= rate <= 1.0:
+                    raise ValueError("sample_rate deve estar entre 0 e 1")
+                profiling_state["sample_rate"] = rate
+            if "enabled" in body:
+                profiling_state["enabled"] = bool(body["enabled"])
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": str(e)}), 400
+        print(f"🔬 Profiling: enabled={profiling_state['enabled']} sample_rate={profiling_state['sample_rate']}")
+
+    arquivos = sorted(glob.glob(os.path.join(PROFILE_DIR, "*.prof")), key=os.path.getmtime, reverse=True)
+    return jsonify({
+        **profiling_state,
+        "worker_pid": os.getpid(),
+        "header": PROFILING_CONFIG["header"],
+        "dir": PROFILE_DIR,
+        "keep": PROFILING_CONFIG["keep"],
+        "files": [os.path.basename(a) for a in arquivos],
+    })
+
+
+@app.after_request
+def comprimir_resposta(response):
+    """Comprime respostas JSON grandes com gzip quando o cliente aceita."""
+    if (
+        response.status_code != 200
+        or response.direct_passthrough
+        or 'Content-Encoding' in response.headers
+        or response.mimetype != 'application/json'
+        or 'gzip' not in request.headers.get('Accept-Encoding', '').lower()
+    ):
+        return response
+    data = response.get_data()
+    if len(data) < QUERY_CONFIG["gzip_min_bytes"]:
+        return response
+    response.set_data(gzip.compress(data, compresslevel=5))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Content-Length'] = str(len(response.get_data()))
+    response.vary.add('Accept-Encoding')
+    return response
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Endpoint de saúde do serviço."""
@@ -487,6 +1028,7 @@ def health_check():
     return jsonify({
         "status": "ok",
         "database": db_status,
+        "dedup": {"keys": len(janela_dedup), **janela_dedup.stats},
         "timestamp": datetime.now().isoformat()
     })
 
@@ -501,5 +1043,9 @@ if __name__ == '__main__':
         print("❌ Problemas na configuração do banco. Verifique os logs.")
         exit(1)
     
+    # SIGUSR1 liga/desliga o profiling por amostragem sem reiniciar
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, alternar_profiling)
+
     # Iniciar servidor
     app.run(host=SERVER_CONFIG["host"], port=SERVER_CONFIG["port"], debug=SERVER_CONFIG["debug"]) 
\ No newline at end of file
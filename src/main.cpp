@@ -80,6 +80,11 @@ const unsigned long SEND_INTERVAL = 3000;    // Envia dados a cada 3 segundos
 unsigned long startTime;
 int measurementCount = 0;
 
+// Idempotência: boot_id aleatório por inicialização + seq por medição.
+// O servidor descarta reenvios da mesma (device_id, boot_id, seq, sensor_id)
+uint32_t bootId = 0;
+uint32_t measurementSeq = 0;
+
 // Controle de conexão e NTP
 bool wifiConnected = false;
 bool ntpSynced = false;
@@ -88,6 +93,7 @@ bool csvHeaderPrinted = false;
 // Declaração da estrutura de dados dos sensores
 struct SensorData {
   time_t timestamp;  // Alterado para time_t
+  uint32_t seq;      // Número da medição: o mesmo em todas as tentativas/servidores (dedup no servidor)
   float temperature;
   float humidity;
   int vibration;
@@ -157,6 +163,7 @@ void setup() {
   pinMode(LDR_PIN, INPUT);
   
   startTime = millis();
+  bootId = esp_random();
   
   Serial.println("=== Sistema de Monitoramento IoT Automático ===");
   Serial.println("ESP32 com 3 sensores + envio automático a cada 3s");
@@ -335,6 +342,7 @@ void setupWiFi() {
 
 SensorData readSensors() {
   SensorData data;
+  data.seq = ++measurementSeq;
   
   // Obter timestamp atual
   struct tm timeinfo;
@@ -579,6 +587,8 @@ bool sendDataToSingleServer(SensorData data, const char* serverURL) {
     jsonDoc["sensor_id"] = sensorData[i].sensorId;
     jsonDoc["device_id"] = DEVICE_ID;
     jsonDoc["timestamp"] = timestamp_ms;
+    jsonDoc["boot_id"] = bootId;
+    jsonDoc["seq"] = data.seq;
     jsonDoc["sensor_type"] = sensorData[i].sensorType;
     jsonDoc["sensor_value"] = sensorData[i].value;
     // *** AVALIAR QUALIDADE BASEADA NO VALOR ***